@@ -30,7 +30,7 @@ It only provides the method
   GET /audit
 """
 from flask import (Blueprint, request, current_app, stream_with_context)
-from .lib.utils import (send_result, send_file)
+from .lib.utils import (send_result, send_file, gzip_stream)
 from ..api.lib.prepolicy import (prepolicy, check_base_action, auditlog_age,
                                  allowed_audit_realm, hide_audit_columns)
 from ..api.auth import admin_required
@@ -105,6 +105,10 @@ def download_csv(csvfile=None):
 
     Params can be passed as key-value-pairs.
 
+    The entries are streamed, so that the audit log can be downloaded
+    regardless of its size. If the file name ends with ``.gz``, the CSV file
+    is compressed with gzip.
+
     **Example request**:
 
     .. sourcecode:: http
@@ -143,6 +147,9 @@ def download_csv(csvfile=None):
         del param["timelimit"]
     else:
         timelimit = None
-    return send_file(stream_with_context(audit.csv_generator(param=param,
-                                                             timelimit=timelimit)),
-                     csvfile)
+    output = audit.csv_generator(param=param, timelimit=timelimit)
+    content_type = 'text/csv'
+    if csvfile.endswith(".gz"):
+        output = gzip_stream(output)
+        content_type = 'application/gzip'
+    return send_file(stream_with_context(output), csvfile, content_type=content_type)
@@ -28,7 +28,7 @@ It also contains the error handlers.
 from .lib.utils import (send_error, get_all_params)
 from .container import container_blueprint
 from ..lib.container import find_container_for_token, find_container_by_serial
-from ..lib.framework import get_app_config_value
+from ..lib.framework import get_app_config_value, get_request_local_store
 from ..lib.user import get_user_from_param
 import logging
 from .lib.utils import getParam
@@ -100,6 +100,9 @@ def teardown_request(exc):
         # Also during calling webui, there is no audit_object, yet.
         pass
     call_finalizers()
+    policy_match_cache = get_request_local_store().get("policy_match_cache")
+    if policy_match_cache:
+        log.debug("Policy match cache statistics: {0!s}".format(policy_match_cache.statistics()))
     log.debug("End handling of request {!r}".format(request.full_path))
 
 
@@ -103,7 +103,7 @@ def get_module_actions(handlermodule=None):
     ret = []
     h_obj = get_handler_object(handlermodule)
     if h_obj:
-        ret = h_obj.actions
+        ret = h_obj.add_async_option(h_obj.actions)
     g.audit_object.log({"success": True})
     return send_result(ret)
 
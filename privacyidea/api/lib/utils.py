@@ -29,8 +29,9 @@ from ...lib.error import (ParameterError,
 from ...lib.log import log_with
 from privacyidea.lib import _
 from privacyidea.lib.utils import (prepare_result, get_version, to_unicode,
-                                   get_plugin_info_from_useragent)
+                                   to_bytes, get_plugin_info_from_useragent)
 import time
+import zlib
 import logging
 import json
 import jwt
@@ -193,6 +194,24 @@ def send_file(output, filename, content_type='text/csv'):
     return current_app.response_class(output, headers=headers, mimetype=content_type)
 
 
+def gzip_stream(output):
+    """
+    Compress the output on the fly in the gzip format.
+
+    :param output: iterable of the chunks of the data
+    :type output: iterable of str or bytes
+    :return: generator of the compressed chunks
+    :rtype: bytes
+    """
+    # wbits=31 writes the gzip header and trailer
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in output:
+        data = compressor.compress(to_bytes(chunk))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 def send_csv_result(obj, data_key="tokens",
                     filename="privacyidea-tokendata.csv"):
     """
@@ -32,7 +32,7 @@ from .lib.utils import (getParam,
                         send_result)
 from ..lib.log import log_with
 from ..lib.machineresolver import (get_resolver_list, save_resolver, delete_resolver,
-                           pretestresolver)
+                           pretestresolver, get_resolver_object)
 from flask import g
 import logging
 from ..api.lib.prepolicy import prepolicy, check_base_action
@@ -117,10 +117,18 @@ def get_resolver(resolver=None):
     """
     This function retrieves the definition of a single machine resolver.
 
+    If the resolver caches its results, like the LDAP machine resolver, the
+    key ``cache`` contains the numbers of cache hits and misses and the number
+    of cached entries of the process, which answers the request.
+
     :param resolver: the name of the resolver
     :return: a json result with the configuration of a specified resolver
     """
     res = get_resolver_list(filter_resolver_name=resolver)
+    for name in res:
+        cache_info = get_resolver_object(name).get_cache_info()
+        if cache_info is not None:
+            res[name]["cache"] = cache_info
 
     g.audit_object.log({"success": True,
                         "info": resolver})
@@ -70,7 +70,7 @@ from ..lib.token import (init_token, get_tokens_paginate, assign_token,
                          copy_token_user, copy_token_pin, lost_token,
                          get_serial_by_otp, get_tokens,
                          set_validity_period_end, set_validity_period_start, add_tokeninfo,
-                         delete_tokeninfo, import_token,
+                         delete_tokeninfo, import_tokens,
                          assign_tokengroup, unassign_tokengroup, set_tokengroups)
 from werkzeug.datastructures import FileStorage
 from cgi import FieldStorage
@@ -1050,16 +1050,7 @@ def loadtokens_api(filename=None):
                                                      password=aes_password, validate_mac=aes_validate_mac)
 
     # Now import the Tokens from the dictionary
-    ret = ""
-    for serial in TOKENS:
-        log.debug("importing token {0!s}".format(TOKENS[serial]))
-
-        log.info("initialize token. serial: {0!s}, realm: {1!s}".format(serial,
-                                                                        tokenrealms))
-
-        import_token(serial,
-                     TOKENS[serial],
-                     tokenrealms=tokenrealms)
+    import_tokens(TOKENS, tokenrealms=tokenrealms)
 
     g.audit_object.log({'info': "{0!s}, {1!s} (imported: {2:d})".format(file_type,
                                                                         token_file,
@@ -20,11 +20,14 @@
 import datetime
 import re
 import sys
+import time
+from collections import namedtuple
+
 import click
 import yaml
 from flask import current_app
 from flask.cli import AppGroup
-from sqlalchemy import create_engine, desc, MetaData
+from sqlalchemy import create_engine, desc, MetaData, and_, or_, false, String
 from sqlalchemy.orm import sessionmaker
 
 from privacyidea.lib.audit import getAudit
@@ -34,6 +37,136 @@ from privacyidea.lib.utils import parse_timedelta
 
 audit_cli = AppGroup("audit", help="Manage Audit log")
 
+# Number of audit entries, which are read at once when rotating with a config file
+ROTATE_CHUNKSIZE = 1000
+# Seconds between two progress reports when rotating with a config file
+ROTATE_PROGRESS_INTERVAL = 10
+
+RotateRule = namedtuple("RotateRule", ["rotate_date", "conditions", "prefilter"])
+
+# characters with a special meaning in regular expressions
+_REGEX_SPECIAL = set(".^$*+?[]()|\\")
+_REGEX_QUANTIFIERS = set("*?{")
+
+
+def _required_literals(pattern):
+    """
+    Determine the literal strings, which are contained in every string
+    matched by the regular expression *pattern*.
+
+    :param pattern: The regular expression
+    :return: A tuple of the list of literal strings and a flag, if the
+        first literal string is at the start of every matched string.
+        None, if the pattern is too complex.
+    """
+    if "|" in pattern or "(" in pattern:
+        return None
+    anchored = pattern.startswith("^")
+    at_start = anchored
+    starts_with_literal = False
+    literals = []
+    current = ""
+    i = int(anchored)
+    while i < len(pattern):
+        char = pattern[i]
+        literal = None
+        if char == "\\":
+            if i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                literal = pattern[i + 1]
+            i += 2
+        elif char in "[{":
+            # skip the character class or the quantifier
+            end = pattern.find("]" if char == "[" else "}", i + 2)
+            if end < 0:
+                return None
+            i = end + 1
+        elif char in _REGEX_SPECIAL:
+            i += 1
+        else:
+            literal = char
+            i += 1
+        if literal is not None and not (i < len(pattern) and pattern[i] in _REGEX_QUANTIFIERS):
+            if at_start:
+                starts_with_literal = True
+            current += literal
+        else:
+            if current:
+                literals.append(current)
+            current = ""
+        at_start = False
+    if current:
+        literals.append(current)
+    return literals, starts_with_literal
+
+
+def _condition_prefilter(column, regex):
+    """
+    Translate the regular expression of a rule condition into an SQL
+    criterion, which matches at least all entries matched by the regular
+    expression. Since the regular expression dialects of the databases
+    differ from python, only the literal parts of the expression are
+    checked with LIKE.
+
+    :return: SQL criterion or None
+    """
+    if not isinstance(column.type, String):
+        return None
+    required = _required_literals(regex.pattern)
+    if not required or not required[0]:
+        return None
+    literals, starts_with_literal = required
+    criteria = [column.contains(literal, autoescape=True) for literal in literals]
+    if starts_with_literal:
+        criteria[0] = column.startswith(literals[0], autoescape=True)
+    criterion = and_(*criteria)
+    if regex.search(str(None)):
+        # An empty column is checked as "None"
+        criterion = or_(criterion, column.is_(None))
+    return criterion
+
+
+def _compile_rotate_rules(yml_config):
+    """
+    Compile the rules of the rotate config file.
+
+    :param yml_config: The list of rules from the config file
+    :return: list of RotateRule
+    """
+    now = datetime.datetime.now()
+    rules = []
+    for rule in yml_config:
+        conditions = []
+        for key, value in rule.items():
+            if key == "rotate":
+                continue
+            if key not in LogEntry.__table__.columns:
+                raise click.BadParameter("Unknown audit column {0!r} in rule "
+                                         "{1!s}".format(key, rule), param_hint="'--config'")
+            conditions.append((getattr(LogEntry, key), re.compile(str(value))))
+        prefilter = [criterion for criterion in (_condition_prefilter(column, regex)
+                                                 for column, regex in conditions)
+                     if criterion is not None]
+        rules.append(RotateRule(now - datetime.timedelta(days=int(rule.get("rotate"))),
+                                conditions, prefilter))
+    return rules
+
+
+def _rotate_entry(entry, rules):
+    """
+    Check if the audit entry is to be deleted. The first rule, which
+    matches the entry, decides.
+
+    :param entry: The audit entry
+    :param rules: list of RotateRule
+    :return: True, if the entry is to be deleted
+    """
+    for rule in rules:
+        # A rule without conditions does not match any entry
+        if rule.conditions and all(regex.search(str(getattr(entry, column.key)))
+                                   for column, regex in rule.conditions):
+            return entry.date is not None and entry.date < rule.rotate_date
+    return False
+
 
 @audit_cli.command("rotate")
 @click.option('-hw', '--highwatermark', default=10000, show_default=True,
@@ -94,48 +227,45 @@ def rotate_audit(highwatermark, lowwatermark, age, config,
     # create a Session
     metadata.create_all(engine)
     if config:
-        yml_config = yaml.safe_load(config)
-        auditlogs = session.query(LogEntry).all()
-        delete_list = []
-        for log in auditlogs:
-            click.echo("investigating log entry {0!s}".format(log.id))
-            for rule in yml_config:
-                age = int(rule.get("rotate"))
-                rotate_date = datetime.datetime.now() - datetime.timedelta(days=age)
-
-                match = False
-                for key in rule.keys():
-                    if key not in ["rotate"]:
-                        search_value = str(rule.get(key))
-                        click.echo(" + searching for {0!r} in {1!s}".format(search_value,
-                                                                            getattr(LogEntry, key)))
-                        audit_value = str(getattr(log, key, ""))
-                        m = re.search(search_value, audit_value)
-                        if m:
-                            # it matches!
-                            click.echo(" + -- found {0!r}".format(audit_value))
-                            match = True
-                        else:
-                            # It does not match, we continue to next rule
-                            click.echo(" + NO MATCH - SKIPPING rest of conditions!")
-                            match = False
-                            break
-
-                if match:
-                    if log.date < rotate_date:
-                        # Delete it!
-                        click.echo(" + Deleting {0!s} due to rule {1!s}".format(log.id, rule))
-                        # Delete it
-                        delete_list.append(log.id)
-                    # skip all other rules and go to the next log entry
-                    break
+        rules = _compile_rotate_rules(yaml.safe_load(config))
+        prefilter = or_(false(), *[and_(LogEntry.date < rule.rotate_date, *rule.prefilter)
+                          for rule in rules if rule.conditions])
+        columns = {LogEntry.id, LogEntry.date}
+        for rule in rules:
+            columns.update(column for column, _ in rule.conditions)
+        columns = sorted(columns, key=lambda c: c.key)
+
+        investigated = 0
+        deleted = 0
+        last_id = 0
+        start = last_report = time.monotonic()
+        while True:
+            # Only fetch entries, that can be deleted by one of the rules.
+            # The exact rules are checked in python.
+            entries = session.query(*columns).filter(prefilter, LogEntry.id > last_id)\
+                .order_by(LogEntry.id).limit(chunksize or ROTATE_CHUNKSIZE).all()
+            if not entries:
+                break
+            last_id = entries[-1].id
+            investigated += len(entries)
+            delete_list = [entry.id for entry in entries if _rotate_entry(entry, rules)]
+            if delete_list and not dryrun:
+                delete_matching_rows(session, LogEntry.__table__,
+                                     LogEntry.id.in_(delete_list), chunksize)
+            deleted += len(delete_list)
+            if time.monotonic() - last_report >= ROTATE_PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                click.echo("Investigated {0!s} entries, {1!s} to be deleted ({2:.0f} "
+                           "entries/s).".format(investigated, deleted,
+                                                investigated / (last_report - start)))
+        duration = time.monotonic() - start
+        click.echo("Investigated {0!s} entries in {1:.1f} seconds.".format(investigated,
+                                                                           duration))
         if dryrun:
             click.echo("If you only would let me I would clean up "
-                       "{0!s} entries!".format(len(delete_list)))
+                       "{0!s} entries!".format(deleted))
         else:
-            click.echo("Cleaning up {0!s} entries.".format(len(delete_list)))
-            delete_matching_rows(session, LogEntry.__table__,
-                                 LogEntry.id.in_(delete_list), chunksize)
+            click.echo("Cleaned up {0!s} entries.".format(deleted))
     elif age:
         now = datetime.datetime.now() - datetime.timedelta(days=age)
         click.echo("Deleting entries older than {0!s}".format(now))
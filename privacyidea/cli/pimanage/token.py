@@ -19,7 +19,7 @@
 """CLI commands for managing tokens"""
 import click
 from flask.cli import AppGroup
-from privacyidea.lib.token import import_token
+from privacyidea.lib.token import import_tokens as import_token_list
 from privacyidea.lib.importotp import parseOATHcsv
 
 
@@ -38,9 +38,8 @@ def import_tokens(file, tokenrealm):
     """
     contents = file.read()
     tokens = parseOATHcsv(contents)
-    i = 0
-    for serial in tokens:
-        i += 1
-        print(u"{0!s}/{1!s} Importing token {2!s}".format(i, len(tokens), serial))
-
-        import_token(serial, tokens[serial], tokenrealms=tokenrealm)
+    print(u"Importing {0!s} tokens".format(len(tokens)))
+    # The keys of all tokens are encrypted at once
+    token_objects = import_token_list(tokens, tokenrealms=tokenrealm)
+    for i, token_object in enumerate(token_objects, 1):
+        print(u"{0!s}/{1!s} Imported token {2!s}".format(i, len(tokens), token_object.get_serial()))
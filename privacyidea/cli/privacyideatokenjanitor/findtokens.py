@@ -107,6 +107,8 @@ Actions:
 """
 
 ALLOWED_ACTIONS = ["disable", "delete", "unassign", "mark", "export", "listuser", "tokenrealms"]
+# Number of processed tokens after which the progress is written
+PROGRESS_INTERVAL = 100
 
 
 def _try_convert_to_integer(given_value_string):
@@ -264,9 +266,15 @@ def _get_tokenlist(last_auth, assigned, active, tokeninfo_key,
         filter_active = active.lower() == "true"
 
     if chunksize is not None:
+        # The existence of tokeninfo keys is checked in the database.
+        # A token without the key never matches a tokeninfo value filter.
+        if tokeninfo_value_filter and tokeninfo_key and not has_tokeninfo_key:
+            has_tokeninfo_key = tokeninfo_key
         iterable = get_tokens_paginated_generator(tokentype=tokentype,
                                                   active=filter_active,
                                                   assigned=filter_assigned,
+                                                  has_tokeninfo_key=has_tokeninfo_key,
+                                                  has_not_tokeninfo_key=has_not_tokeninfo_key,
                                                   psize=chunksize)
     else:
         iterable = [get_tokens(tokentype=tokentype,
@@ -278,8 +286,9 @@ def _get_tokenlist(last_auth, assigned, active, tokeninfo_key,
         tok_count = 0
         tok_found = 0
         for token_obj in tokenobj_list:
-            sys.stderr.write('{0} Tokens processed / {1} Tokens found\r'.format(tok_count, tok_found))
-            sys.stderr.flush()
+            if tok_count % PROGRESS_INTERVAL == 0:
+                sys.stderr.write('{0} Tokens processed / {1} Tokens found\r'.format(tok_count, tok_found))
+                sys.stderr.flush()
             tok_count += 1
             if last_auth and token_obj.check_last_auth_newer(last_auth):
                 continue
@@ -23,9 +23,14 @@
 #
 from privacyidea.lib.applications import MachineApplicationBase
 from privacyidea.lib.crypto import geturandom
-from privacyidea.lib.error import ValidateError, ParameterError
+from privacyidea.lib.error import ValidateError, ParameterError, ServerError
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
 from passlib.hash import pbkdf2_sha512
+from privacyidea.lib.framework import get_app_config_value, get_app_local_store
 from privacyidea.lib.token import get_one_token
 from privacyidea.lib.config import get_prepend_pin
 from privacyidea.lib.policy import TYPE
@@ -34,6 +39,69 @@ from privacyidea.lib.utils import get_plugin_info_from_useragent, get_computer_n
 log = logging.getLogger(__name__)
 ROUNDS = 6549
 REFILLTOKEN_LENGTH = 40
+SALT_SIZE = 10
+
+OFFLINE_HASH_WORKERS = "PI_OFFLINE_HASH_WORKERS"
+OFFLINE_HASH_TIMEOUT = "PI_OFFLINE_HASH_TIMEOUT"
+
+
+def _hash_password(password, rounds):
+    """
+    Hash a password (OTP PIN and OTP value) for offline authentication.
+    This function is also called in the worker processes.
+    """
+    return pbkdf2_sha512.using(rounds=rounds, salt_size=SALT_SIZE).hash(password)
+
+
+def get_offline_hash_pool():
+    """
+    Return the pool of processes, which hash the offline OTP values of the
+    current application. The number of processes is configured with
+    ``PI_OFFLINE_HASH_WORKERS``. If it is not set, no pool is used.
+
+    :return: a ProcessPoolExecutor or None
+    """
+    workers = int(get_app_config_value(OFFLINE_HASH_WORKERS, 0))
+    if workers < 1:
+        return None
+    store = get_app_local_store()
+    pool = store.get("offline_hash_pool")
+    if pool is None:
+        # We do not fork the (possibly multithreaded) server process
+        new_pool = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        pool = store.setdefault("offline_hash_pool", new_pool)
+        if pool is not new_pool:
+            new_pool.shutdown(wait=False)
+    return pool
+
+
+def hash_passwords(passwords, rounds=ROUNDS):
+    """
+    Hash the passwords for offline authentication. If a pool of worker
+    processes is configured, the passwords are hashed in parallel. The
+    hashing has to be finished within ``PI_OFFLINE_HASH_TIMEOUT`` seconds
+    (default 30).
+
+    :param passwords: list of passwords
+    :param rounds: Number of PBKDF2 rounds
+    :return: list of the hashes in the order of the passwords
+    """
+    pool = get_offline_hash_pool()
+    if pool is None or len(passwords) < 2:
+        return [_hash_password(password, rounds) for password in passwords]
+    timeout = float(get_app_config_value(OFFLINE_HASH_TIMEOUT, 30))
+    try:
+        return list(pool.map(_hash_password, passwords, repeat(rounds), timeout=timeout))
+    except TimeoutError:
+        log.warning("Hashing {0!s} offline OTP values took longer than {1!s} "
+                    "seconds.".format(len(passwords), timeout))
+        raise ServerError("Timeout while hashing the offline OTP values.")
+    except BrokenProcessPool as exx:
+        # A worker process died. We start a new pool with the next request.
+        log.warning("The pool for hashing offline OTP values is broken: {0!r}".format(exx))
+        get_app_local_store().pop("offline_hash_pool", None)
+        return [_hash_password(password, rounds) for password in passwords]
 
 
 class MachineApplication(MachineApplicationBase):
@@ -97,11 +165,10 @@ class MachineApplication(MachineApplicationBase):
         (res, err, otp_dict) = token_obj.get_multi_otp(count=amount, counter_index=True)
         otps = otp_dict.get("otp")
         prepend_pin = get_prepend_pin()
-        for key, otp in otps.items():
-            # Return the hash of OTP PIN and OTP values
-            otppw = otppin + otp if prepend_pin else otp + otppin
-            otps[key] = pbkdf2_sha512.using(
-                rounds=rounds, salt_size=10).hash(otppw)
+        # Return the hash of OTP PIN and OTP values
+        passwords = [otppin + otp if prepend_pin else otp + otppin
+                     for otp in otps.values()]
+        otps = dict(zip(otps.keys(), hash_passwords(passwords, rounds)))
         # We do not disable the token, so if all offline OTP values
         # are used, the token can be used to authenticate online again.
         # token_obj.enable(False)
@@ -32,18 +32,29 @@ The SQL Audit Module is configured like this:
     PI_AUDIT_SQL_URI = "sqlite://"
     PI_AUDIT_SQL_TRUNCATE = True | False
     PI_AUDIT_SQL_COLUMN_LENGTH = {"user": 60, "info": 10 ...}
+    PI_AUDIT_SQL_BUFFER_SIZE = 10000
+    PI_AUDIT_SQL_BATCH_SIZE = 100
+    PI_AUDIT_SQL_FLUSH_INTERVAL = 1
+    PI_AUDIT_SQL_BUFFER_TIMEOUT = 0
 
 If the PI_AUDIT_SQL_URI is omitted the Audit data is written to the
 token database.
 """
 
+import atexit
+import csv
+import io
 import logging
+import queue
+import threading
+import time
 from collections import OrderedDict
 from privacyidea.lib.auditmodules.base import (Audit as AuditBase, Paginate)
 from privacyidea.lib.crypto import Sign
 from privacyidea.lib.pooling import get_engine
 from privacyidea.lib.utils import censor_connect_string
 from privacyidea.lib.lifecycle import register_finalizer
+from privacyidea.lib.framework import get_app_local_store
 from privacyidea.lib.utils import truncate_comma_list, is_true
 from sqlalchemy import MetaData, cast, String
 from sqlalchemy import asc, desc, and_, or_
@@ -60,6 +71,136 @@ log = logging.getLogger(__name__)
 
 metadata = MetaData()
 
+# Number of audit entries, which are read at once during the CSV export
+EXPORT_BATCH_SIZE = 1000
+
+_writer_lock = threading.Lock()
+
+
+class AuditWriter(object):
+    """
+    Writes audit entries in a background thread.
+
+    The entries are put into a bounded queue. The background thread
+    collects up to ``batch_size`` entries or waits at most ``flush_interval``
+    seconds and writes the entries in one transaction. If signing is enabled,
+    the entries are signed within the same transaction.
+    """
+
+    def __init__(self, engine, sign_object=None, buffer_size=10000, batch_size=100,
+                 flush_interval=1, put_timeout=0):
+        self.engine = engine
+        self.sign_object = sign_object
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.session_factory = sessionmaker(bind=engine)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="audit-writer")
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def put(self, log_entry):
+        """
+        Put the log entry into the queue.
+
+        :param log_entry: the LogEntry object
+        :return: False, if the queue is full and the entry needs to be written
+            synchronously
+        """
+        try:
+            if self.put_timeout > 0:
+                self.queue.put(log_entry, timeout=self.put_timeout)
+            else:
+                self.queue.put_nowait(log_entry)
+            return True
+        except queue.Full:
+            log.warning("The audit buffer is full. Writing audit entry synchronously.")
+            return False
+
+    def _get_batch(self):
+        batch = []
+        try:
+            batch.append(self.queue.get(timeout=self.flush_interval))
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._get_batch()
+            if batch:
+                self.write(batch)
+
+    def write(self, batch):
+        """
+        Write and sign the log entries in one transaction. Entries, which can
+        not be signed, are written without a signature. If the transaction
+        fails, the entries are written one by one, so that only the invalid
+        entries are lost.
+
+        :param batch: list of LogEntry objects
+        """
+        session = self.session_factory()
+        try:
+            session.add_all(batch)
+            if self.sign_object:
+                # We need the IDs of the entries for the signature
+                session.flush()
+                for le in batch:
+                    try:
+                        le.signature = self.sign_object.sign(Audit._log_to_string(le))
+                    except Exception as exx:
+                        # in case of a Unicode Error in _log_to_string() we won't have
+                        # a signature, but the log entry is available
+                        log.error("Could not sign audit entry {0!s}: {1!r}".format(le.id, exx))
+                        log.debug("{0!s}".format(traceback.format_exc()))
+            session.commit()
+            log.debug("Wrote {0:d} audit entries.".format(len(batch)))
+            return
+        except Exception as exx:
+            session.rollback()
+            if len(batch) > 1:
+                log.warning("Could not write {0:d} audit entries: {1!r}. Writing them "
+                            "one by one.".format(len(batch), exx))
+            else:
+                log.error("Could not write audit entry: {0!r}".format(exx))
+            log.debug("{0!s}".format(traceback.format_exc()))
+        finally:
+            session.close()
+        if len(batch) > 1:
+            for le in batch:
+                # The IDs of the rolled back transaction are not valid anymore
+                le.id = None
+                self.write([le])
+
+    def flush(self):
+        """
+        Write all entries, which are currently in the queue.
+        """
+        while True:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                break
+            self.write(batch)
+
+    def stop(self):
+        """
+        Stop the background thread and write the remaining entries.
+        """
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
 
 # Define function to convert SQL DateTime objects to an ISO-format string
 # By using <https://docs.sqlalchemy.org/en/14/core/compiler.html> we can
@@ -115,9 +256,20 @@ class Audit(AuditBase):
     * ``PI_AUDIT_SQL_TRUNCATE``
     * ``PI_AUDIT_NO_SIGN``
     * ``PI_CHECK_OLD_SIGNATURES``
+    * ``PI_AUDIT_SQL_BUFFER_SIZE``
+    * ``PI_AUDIT_SQL_BATCH_SIZE``
+    * ``PI_AUDIT_SQL_FLUSH_INTERVAL``
+    * ``PI_AUDIT_SQL_BUFFER_TIMEOUT``
 
     You can use ``PI_AUDIT_NO_SIGN = True`` to avoid signing of the audit log.
 
+    If ``PI_AUDIT_SQL_BUFFER_SIZE`` is set, the audit entries are not written
+    during the request, but put into a queue of this size. A background thread
+    writes the entries in batches of ``PI_AUDIT_SQL_BATCH_SIZE`` (default 100)
+    at least every ``PI_AUDIT_SQL_FLUSH_INTERVAL`` seconds (default 1).
+    If the queue is full, the request waits up to ``PI_AUDIT_SQL_BUFFER_TIMEOUT``
+    seconds (default 0) and then writes the entry itself.
+
     If ``PI_CHECK_OLD_SIGNATURES = True`` old style signatures (text-book RSA) will
     be checked as well, otherwise they will be marked as ``FAIL``.
     """
@@ -184,6 +336,26 @@ class Audit(AuditBase):
             log.debug("Using no SQL pool_size.")
         return engine
 
+    def _get_writer(self):
+        """
+        :return: the process wide :class:`AuditWriter` or None, if the audit
+            entries are written synchronously
+        """
+        buffer_size = int(self.config.get("PI_AUDIT_SQL_BUFFER_SIZE", 0))
+        if buffer_size <= 0:
+            return None
+        app_store = get_app_local_store()
+        with _writer_lock:
+            if "audit_writer" not in app_store:
+                app_store["audit_writer"] = AuditWriter(
+                    self._create_engine(),
+                    sign_object=self.sign_object if self.sign_data else None,
+                    buffer_size=buffer_size,
+                    batch_size=int(self.config.get("PI_AUDIT_SQL_BATCH_SIZE", 100)),
+                    flush_interval=float(self.config.get("PI_AUDIT_SQL_FLUSH_INTERVAL", 1)),
+                    put_timeout=float(self.config.get("PI_AUDIT_SQL_BUFFER_TIMEOUT", 0)))
+            return app_store["audit_writer"]
+
     def _finalize_session(self):
         """ Close current session and dispose connections of db engine"""
         self.session.close()
@@ -316,6 +488,9 @@ class Audit(AuditBase):
                           duration=duration,
                           thread_id=self.audit_data.get("thread_id")
                           )
+            writer = self._get_writer()
+            if writer and writer.put(le):
+                return
             self.session.add(le)
             self.session.commit()
             # Add the signature
@@ -440,24 +615,63 @@ class Audit(AuditBase):
                     'container_type': LogEntry.container_type}
         return sortname.get(key)
 
-    def csv_generator(self, param=None, user=None, timelimit=None):
+    def csv_generator(self, param=None, user=None, timelimit=None,
+                      batch_size=EXPORT_BATCH_SIZE):
         """
         Returns the audit log as csv file.
 
+        The entries are read in batches ordered by the id, so that the memory
+        usage does not depend on the number of exported entries.
+
         :param timelimit: Limit the number of dumped entries by time
         :type timelimit: datetime.timedelta
         :param param: The request parameters
         :type param: dict
         :param user: The user, who issued the request
+        :param batch_size: The number of entries read from the database at once
+        :type batch_size: int
         :return: None. It yields results as a generator
         """
         filter_condition = self._create_filter(param,
                                                timelimit=timelimit)
-        logentries = self.session.query(LogEntry).filter(filter_condition).order_by(LogEntry.date).all()
+        output = io.StringIO()
+        writer = csv.writer(output, quotechar="'", quoting=csv.QUOTE_ALL,
+                            lineterminator="\n")
+        last_id = None
+        while True:
+            query = self.session.query(LogEntry).filter(filter_condition)
+            if last_id is not None:
+                query = query.filter(LogEntry.id > last_id)
+            logentries = query.order_by(LogEntry.id).limit(batch_size).all()
+            if not logentries:
+                break
+            existing_ids = self._get_existing_ids(logentries[0].id - 1,
+                                                  logentries[-1].id + 1,
+                                                  max_count=4 * batch_size)
+            for le in logentries:
+                is_not_missing = None
+                if existing_ids is not None:
+                    is_not_missing = le.id - 1 in existing_ids and le.id + 1 in existing_ids
+                audit_dict = self.audit_entry_to_dict(le, is_not_missing=is_not_missing)
+                writer.writerow(["{0!s}".format(x) for x in audit_dict.values()])
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+            last_id = logentries[-1].id
+            # Do not keep the exported entries in the session
+            self.session.expunge_all()
+
+    def _get_existing_ids(self, first_id, last_id, max_count):
+        """
+        Return the IDs of all audit entries between first_id and last_id.
 
-        for le in logentries:
-            audit_dict = self.audit_entry_to_dict(le)
-            yield ",".join(["'{0!s}'".format(x) for x in audit_dict.values()]) + "\n"
+        :param max_count: If the range is larger, None is returned.
+        :return: set of IDs or None
+        """
+        if last_id - first_id > max_count:
+            return None
+        return {r.id for r in self.session.query(LogEntry.id).filter(
+            LogEntry.id.between(first_id, last_id))}
 
     def get_count(self, search_dict, timedelta=None, success=None):
         # create filter condition
@@ -566,7 +780,16 @@ class Audit(AuditBase):
         self.session.query(LogEntry).delete()
         self.session.commit()
 
-    def audit_entry_to_dict(self, audit_entry):
+    def audit_entry_to_dict(self, audit_entry, is_not_missing=None):
+        """
+        Convert the LogEntry object to a dictionary and check the signature.
+
+        :param audit_entry: the LogEntry object
+        :param is_not_missing: If the caller already knows, that the entries
+            before and after this entry exist. Otherwise, this is checked in
+            the database.
+        :rtype: OrderedDict
+        """
         sig = None
         if self.sign_data:
             try:
@@ -580,8 +803,8 @@ class Audit(AuditBase):
                             'from the database, please check the encoding.')
                 log.debug('{0!s}'.format(traceback.format_exc()))
 
-        is_not_missing = self._check_missing(int(audit_entry.id))
-        # is_not_missing = True
+        if is_not_missing is None:
+            is_not_missing = self._check_missing(int(audit_entry.id))
         audit_dict = OrderedDict()
         audit_dict['number'] = audit_entry.id
         audit_dict['date'] = audit_entry.date.isoformat()
@@ -20,14 +20,215 @@
 # License along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 from ..models import AuthCache, db
+from .framework import get_app_local_store, get_app_config_value
+from .utils import to_bytes
 from sqlalchemy import and_
 from passlib.hash import argon2
+from collections import OrderedDict
+from flask import current_app
+import atexit
 import datetime
+import hashlib
+import hmac
 import logging
+import os
+import threading
+import time
 
 ROUNDS = 9
 log = logging.getLogger(__name__)
 
+AUTHCACHE_MEMORY_SIZE = "PI_AUTHCACHE_MEMORY_SIZE"
+AUTHCACHE_MEMORY_TTL = "PI_AUTHCACHE_MEMORY_TTL"
+AUTHCACHE_WRITEBACK_INTERVAL = "PI_AUTHCACHE_WRITEBACK_INTERVAL"
+
+
+class _CachedCredential(object):
+    __slots__ = ("cache_id", "first_auth", "last_auth", "auth_count", "valid_until")
+
+    def __init__(self, cache_id, first_auth, last_auth, auth_count, valid_until):
+        self.cache_id = cache_id
+        self.first_auth = first_auth
+        self.last_auth = last_auth
+        self.auth_count = auth_count
+        self.valid_until = valid_until
+
+
+class AuthCacheMemory(object):
+    """
+    In-process tier in front of the authcache table.
+
+    Credentials, which were verified against the argon2 hash in the database,
+    are remembered per (username, realm, resolver) as a keyed digest. The key
+    is random and never leaves the process. An entry is trusted for ``ttl``
+    seconds, afterwards the database is asked again.
+
+    Successful authentications from memory update ``last_auth`` and
+    ``auth_count`` in memory. The changes are written to the database in
+    batches by a background thread every ``writeback_interval`` seconds.
+    Since the authentication counter in memory is not shared between processes,
+    authentications with a maximum number of authentications are not answered
+    from memory. Before an entry in memory is used, its database row is looked
+    up, so that entries deleted by other processes are not used anymore.
+    """
+
+    def __init__(self, size, ttl=60, writeback_interval=5, app=None):
+        self.size = size
+        self.ttl = ttl
+        self.writeback_interval = writeback_interval
+        self.app = app
+        self.hits = 0
+        self.misses = 0
+        self._key = os.urandom(32)
+        # (username, realm, resolver) -> {digest: _CachedCredential}
+        self._entries = OrderedDict()
+        # cache_id -> [auth_count increment, last_auth]
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer = None
+
+    def _digest(self, password):
+        return hmac.new(self._key, to_bytes(password), hashlib.sha256).digest()
+
+    def add(self, username, realm, resolver, password, cache_id, first_auth,
+            last_auth, auth_count):
+        key = (username, realm, resolver)
+        credential = _CachedCredential(cache_id, first_auth, last_auth, auth_count,
+                                       time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries.setdefault(key, {})[self._digest(password)] = credential
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def verify(self, username, realm, resolver, password, first_auth=None,
+               last_auth=None):
+        """
+        Verify the credentials against the memory tier. The same time
+        conditions as in :func:`verify_in_cache` are applied. This needs an
+        application context to check, that the database entry still exists.
+
+        :return: True if the credentials were found and are still valid
+        """
+        key = (username, realm, resolver)
+        digest = self._digest(password)
+        with self._lock:
+            credentials = self._entries.get(key)
+            credential = credentials.get(digest) if credentials else None
+            if credential is None:
+                self.misses += 1
+                return False
+            if credential.valid_until < time.monotonic() \
+                    or (first_auth and credential.first_auth <= first_auth) \
+                    or (last_auth and credential.last_auth <= last_auth):
+                # Let the database decide and clean up
+                del credentials[digest]
+                self.misses += 1
+                return False
+            cache_id = credential.cache_id
+        if not db.session.query(AuthCache.id).filter(AuthCache.id == cache_id).first():
+            # The entry was deleted by another process
+            self.invalidate(username, realm, resolver)
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            now = datetime.datetime.utcnow()
+            credential.last_auth = now
+            credential.auth_count += 1
+            pending = self._pending.setdefault(cache_id, [0, now])
+            pending[0] += 1
+            pending[1] = now
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        self._start_writer()
+        return True
+
+    def invalidate(self, username, realm, resolver):
+        with self._lock:
+            self._entries.pop((username, realm, resolver), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def flush(self):
+        """
+        Write the pending ``last_auth`` and ``auth_count`` updates to the
+        database. This needs an application context.
+
+        :return: the number of updated authcache entries
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        for cache_id, (count, last_auth) in pending.items():
+            db.session.query(AuthCache).filter(
+                AuthCache.id == cache_id).update({"last_auth": last_auth,
+                                                  AuthCache.auth_count: AuthCache.auth_count + count},
+                                                 synchronize_session=False)
+        db.session.commit()
+        return len(pending)
+
+    def _start_writer(self):
+        if self._writer is not None or self.app is None:
+            return
+        with self._lock:
+            if self._writer is not None:
+                return
+            self._writer = threading.Thread(target=self._write_back, daemon=True,
+                                            name="authcache-writeback")
+            self._writer.start()
+            atexit.register(self.stop)
+
+    def _write_back(self):
+        while not self._stop.wait(self.writeback_interval):
+            self._flush_in_app_context()
+
+    def _flush_in_app_context(self):
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception as exx:  # pragma: no cover
+                log.warning("Could not write back the authcache: {0!r}".format(exx))
+                log.debug("Error writing back the authcache.", exc_info=True)
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+    def stop(self):
+        """
+        Stop the background writer and write the pending updates.
+        """
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._flush_in_app_context()
+
+
+def get_authcache_memory():
+    """
+    Get the in-process authcache tier of the current application.
+
+    :return: an :class:`AuthCacheMemory` object or None, if
+        ``PI_AUTHCACHE_MEMORY_SIZE`` is not set.
+    """
+    size = int(get_app_config_value(AUTHCACHE_MEMORY_SIZE, 0))
+    if size <= 0:
+        return None
+    store = get_app_local_store()
+    memory = store.get("authcache_memory")
+    if memory is None:
+        memory = AuthCacheMemory(size,
+                                 ttl=int(get_app_config_value(AUTHCACHE_MEMORY_TTL, 60)),
+                                 writeback_interval=int(get_app_config_value(AUTHCACHE_WRITEBACK_INTERVAL, 5)),
+                                 app=current_app._get_current_object())
+        memory = store.setdefault("authcache_memory", memory)
+    return memory
+
 
 def _hash_password(password):
     return argon2.using(rounds=ROUNDS).hash(password)
@@ -41,6 +242,9 @@ def add_to_cache(username, realm, resolver, password):
     log.debug('Adding record to auth cache: ({!r}, {!r}, {!r}, {!r})'.format(
         username, realm, resolver, auth_hash))
     r = record.save()
+    memory = get_authcache_memory()
+    if memory:
+        memory.add(username, realm, resolver, password, r, first_auth, first_auth, 0)
     return r
 
 
@@ -50,6 +254,7 @@ def update_cache(cache_id):
         AuthCache.id == cache_id).update({"last_auth": last_auth,
                                           AuthCache.auth_count: AuthCache.auth_count + 1})
     db.session.commit()
+    return last_auth
 
 
 def delete_from_cache(username, realm, resolver, password, last_valid_cache_time=None, max_auths=0):
@@ -65,6 +270,9 @@ def delete_from_cache(username, realm, resolver, password, last_valid_cache_time
     authentication of the entry is before this time point, it is not valid anymore.
     :param max_auths: Maximum number of allowed authentications.
     """
+    memory = get_authcache_memory()
+    if memory:
+        memory.invalidate(username, realm, resolver)
     cached_auths = db.session.query(AuthCache).filter(AuthCache.username == username,
                                                       AuthCache.realm == realm,
                                                       AuthCache.resolver == resolver).all()
@@ -100,6 +308,9 @@ def cleanup(minutes):
     :type minutes: int
     :return:
     """
+    memory = get_authcache_memory()
+    if memory:
+        memory.clear()
     cleanuptime = datetime.datetime.utcnow() - datetime.timedelta(minutes=minutes)
     r = db.session.query(AuthCache).filter(AuthCache.last_auth < cleanuptime).delete()
     db.session.commit()
@@ -125,6 +336,14 @@ def verify_in_cache(username, realm, resolver, password, first_auth=None, last_a
     :type max_auths: int
     :return: 
     """
+    memory = get_authcache_memory()
+    if memory:
+        # The number of authentications is only counted reliably in the database
+        if max_auths <= 0 and memory.verify(username, realm, resolver, password, first_auth, last_auth):
+            return True
+        # The database needs to know about all authentications from memory
+        memory.flush()
+
     conditions = []
     result = False
     conditions.append(AuthCache.username == username)
@@ -152,7 +371,11 @@ def verify_in_cache(username, realm, resolver, password, first_auth=None, last_a
 
         if result:
             # Update the last_auth and the auth_count
-            update_cache(cached_auth.id)
+            auth_count = cached_auth.auth_count
+            now = update_cache(cached_auth.id)
+            if memory:
+                memory.add(username, realm, resolver, password, cached_auth.id,
+                           cached_auth.first_auth, now, auth_count + 1)
             break
 
     if not result:
@@ -26,25 +26,40 @@ The method is tested in test_lib_challenges
 """
 
 import logging
+from datetime import datetime
+
 from .log import log_with
 from ..models import Challenge, db
+from .sqlutils import delete_chunked
+from .framework import get_app_local_store, get_app_config_value, get_app_config
+from .utils import get_module_class
+from .challengenotifiers.local_notifier import LocalChallengeNotifier
 
 log = logging.getLogger(__name__)
 
+CHALLENGE_NOTIFICATION_CLASS = "PI_CHALLENGE_NOTIFICATION_CLASS"
+CHALLENGE_NOTIFICATION_OPTION_PREFIX = "PI_CHALLENGE_NOTIFICATION_"
 
 
 @log_with(log)
-def get_challenges(serial=None, transaction_id=None, challenge=None):
+def get_challenges(serial=None, transaction_id=None, challenge=None, only_valid=False):
     """
     This returns a list of database challenge objects.
 
     :param serial: challenges for this very serial number
     :param transaction_id: challenges with this very transaction id
     :param challenge: The challenge to be found
+    :param only_valid: Only return challenges, which have not expired, yet.
+        This uses the index on the expiration column, so that old
+        challenges of a token are not read from the database.
+    :type only_valid: bool
     :return: list of objects
     """
     sql_query = Challenge.query
 
+    if only_valid:
+        sql_query = sql_query.filter(Challenge.expiration > datetime.utcnow())
+
     if serial is not None:
         # filter for serial
         sql_query = sql_query.filter(Challenge.serial == serial)
@@ -151,6 +166,39 @@ def _create_challenge_query(serial=None, transaction_id=None):
     return sql_query
 
 
+def get_challenge_count(expired=None):
+    """
+    Return the number of challenges in the database.
+
+    :param expired: If True, only count the expired challenges, if False
+        only count the valid challenges.
+    :type expired: bool or None
+    :return: number of challenges
+    :rtype: int
+    """
+    sql_query = Challenge.query
+    if expired is True:
+        sql_query = sql_query.filter(Challenge.expiration < datetime.utcnow())
+    elif expired is False:
+        sql_query = sql_query.filter(Challenge.expiration > datetime.utcnow())
+    return sql_query.count()
+
+
+def delete_expired_challenges(chunksize=1000):
+    """
+    Delete all expired challenges of all tokens. The challenges are deleted
+    in chunks of ``chunksize`` entries and each chunk is committed on its
+    own, so that the challenge table is not locked for a long time.
+
+    :param chunksize: The number of challenges to delete in one statement
+    :type chunksize: int
+    :return: The number of deleted challenges
+    :rtype: int
+    """
+    return delete_chunked(db.session, Challenge.__table__,
+                          Challenge.expiration < datetime.utcnow(), chunksize)
+
+
 def extract_answered_challenges(challenges):
     """
     Given a list of challenge objects, extract and return a list of *answered* challenge.
@@ -167,3 +215,42 @@ def extract_answered_challenges(challenges):
             if status is True:
                 answered_challenges.append(challenge)
     return answered_challenges
+
+
+def get_challenge_notifier():
+    """
+    Return the application-wide challenge notifier according to the app config's
+    ``PI_CHALLENGE_NOTIFICATION_CLASS`` option. All app config options starting
+    with ``PI_CHALLENGE_NOTIFICATION_`` are passed to the notifier.
+    If no notifier is configured, the ``LocalChallengeNotifier`` is used.
+
+    :return: a ``BaseChallengeNotifier`` object
+    """
+    store = get_app_local_store()
+    if 'challenge_notifier' not in store:
+        options = {}
+        for k, v in get_app_config().items():
+            if k.startswith(CHALLENGE_NOTIFICATION_OPTION_PREFIX) and k != CHALLENGE_NOTIFICATION_CLASS:
+                options[k[len(CHALLENGE_NOTIFICATION_OPTION_PREFIX):].lower()] = v
+        notifier = None
+        notifier_class = get_app_config_value(CHALLENGE_NOTIFICATION_CLASS)
+        if notifier_class:
+            try:
+                package_name, class_name = notifier_class.rsplit(".", 1)
+                notifier = get_module_class(package_name, class_name)(options)
+                log.info("Created a new challenge notifier: {0!r}".format(notifier))
+            except (ImportError, ValueError) as exx:
+                log.warning("Could not import challenge notifier class {0!r}: {1!r}".format(notifier_class, exx))
+        store['challenge_notifier'] = notifier or LocalChallengeNotifier(options)
+    return store['challenge_notifier']
+
+
+def notify_challenge_answer(transaction_id):
+    """
+    Wake up the requests, which wait for the answer of the challenge with the
+    given transaction ID. Call this after the answer has been committed to
+    the challenge table.
+
+    :param transaction_id: the transaction ID of the answered challenge
+    """
+    get_challenge_notifier().notify(transaction_id)
@@ -0,0 +1,90 @@
+# (c) NetKnights GmbH 2024,  https://netknights.it
+#
+# This code is free software; you can redistribute it and/or
+# modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+# as published by the Free Software Foundation; either
+# version 3 of the License, or any later version.
+#
+# This code is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU AFFERO GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+__doc__ = """A challenge notifier wakes up the requests, which wait for the answer
+of a challenge, e.g. a push token with ``push_wait``.
+"""
+
+# By default the challenge table is still read every second, to notice answers,
+# which have been received by other workers.
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+class BaseChallengeSubscription(object):
+    """
+    A subscription to the answer of one challenge. It is created by
+    ``BaseChallengeNotifier.subscribe`` and can be used as a context manager.
+    """
+    def wait(self, timeout):  # pragma: no cover
+        """
+        Block until the challenge has been answered or the timeout has passed.
+
+        :param timeout: the maximum number of seconds to wait
+        :type timeout: float
+        :return: True, if a notification has been received
+        """
+        raise NotImplementedError()
+
+    def close(self):  # pragma: no cover
+        """
+        End the subscription.
+        """
+        raise NotImplementedError()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class BaseChallengeNotifier(object):
+    """
+    A challenge notifier tells a waiting request that the challenge with a
+    given transaction ID has been answered. The answer is still read from the
+    challenge table, the notification only ends the waiting.
+
+    The option ``poll_interval`` defines the number of seconds, after which
+    the challenge table is read again, even if no notification has been
+    received. A value of 0 disables this.
+
+    The notifier is configured with a dictionary of options and is shared
+    between the threads of a process.
+    """
+    def __init__(self, options):
+        self.options = options
+        self.poll_interval = float(options.get("poll_interval", DEFAULT_POLL_INTERVAL))
+
+    def subscribe(self, transaction_id):  # pragma: no cover
+        """
+        Start waiting for the answer of the challenge with the given transaction ID.
+        The caller needs to read the challenge table after subscribing, so that
+        no answer is missed.
+
+        :param transaction_id: the transaction ID of the challenge
+        :return: a ``BaseChallengeSubscription`` object
+        """
+        raise NotImplementedError()
+
+    def notify(self, transaction_id):  # pragma: no cover
+        """
+        Notify all subscribers of the given transaction ID. This is called
+        after the answer has been written to the challenge table.
+
+        :param transaction_id: the transaction ID of the answered challenge
+        """
+        raise NotImplementedError()
@@ -0,0 +1,71 @@
+# (c) NetKnights GmbH 2024,  https://netknights.it
+#
+# This code is free software; you can redistribute it and/or
+# modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+# as published by the Free Software Foundation; either
+# version 3 of the License, or any later version.
+#
+# This code is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU AFFERO GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+__doc__ = """A challenge notifier for the threads of one process. It is used, if no
+other challenge notifier is configured.
+"""
+import threading
+
+from privacyidea.lib.challengenotifiers.base import (BaseChallengeNotifier,
+                                                     BaseChallengeSubscription)
+
+
+class LocalChallengeSubscription(BaseChallengeSubscription):
+    def __init__(self, notifier, transaction_id):
+        self.notifier = notifier
+        self.transaction_id = transaction_id
+        self.event = threading.Event()
+
+    def wait(self, timeout):
+        notified = self.event.wait(timeout)
+        self.event.clear()
+        return notified
+
+    def close(self):
+        self.notifier._unsubscribe(self)
+
+
+class LocalChallengeNotifier(BaseChallengeNotifier):
+    """
+    Keeps the subscriptions of all threads of the process in a dictionary.
+    Answers, which are received by other processes or nodes, are only noticed
+    by reading the challenge table every ``poll_interval`` seconds.
+    """
+    def __init__(self, options):
+        BaseChallengeNotifier.__init__(self, options)
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, transaction_id):
+        subscription = LocalChallengeSubscription(self, transaction_id)
+        with self._lock:
+            self._subscriptions.setdefault(transaction_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.transaction_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.transaction_id]
+
+    def notify(self, transaction_id):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(transaction_id, ()))
+        for subscription in subscriptions:
+            subscription.event.set()
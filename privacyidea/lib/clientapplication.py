@@ -23,22 +23,191 @@ Client Application information was saved during authentication requests.
 The code is tested in tests/test_lib_clientapplication.py.
 """
 
+from flask import current_app
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+import atexit
 import logging
 import datetime
+import threading
 from .log import log_with
 from ..models import ClientApplication, Subscription, db
 from privacyidea.lib.config import get_privacyidea_node
+from privacyidea.lib.framework import get_app_config_value, get_app_local_store
 from netaddr import IPAddress
 
 
 log = logging.getLogger(__name__)
 
+# Number of seconds, for which the client applications are collected in memory
+# before they are written to the database. 0 writes them immediately.
+CLIENTAPPLICATION_FLUSH_INTERVAL = "PI_CLIENTAPPLICATION_FLUSH_INTERVAL"
+FLUSH_CHUNK_SIZE = 500
+
+
+class ClientApplicationBuffer(object):
+    """
+    Collects the client applications of a process in memory and writes them
+    to the database in a background thread every ``flush_interval`` seconds.
+
+    The entries are keyed by (ip, clienttype, node), so a client which sends
+    many requests is only written once per interval with its latest
+    ``lastseen`` timestamp.
+    """
+
+    def __init__(self, flush_interval=5, app=None):
+        self.flush_interval = flush_interval
+        self.app = app
+        # (ip, clienttype, node) -> lastseen
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer = None
+
+    def add(self, ip, clienttype, node):
+        with self._lock:
+            self._pending[(ip, clienttype, node)] = datetime.datetime.now()
+        self._start_writer()
+
+    def flush(self):
+        """
+        Write the pending client applications to the database. Existing
+        entries are updated, new entries are inserted. This needs an
+        application context.
+
+        Entries, which could not be written, are put back into the buffer
+        and are written with the next flush.
+
+        :return: the number of written client applications
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        written = 0
+        keys = list(pending)
+        for i in range(0, len(keys), FLUSH_CHUNK_SIZE):
+            chunk = {key: pending[key] for key in keys[i:i + FLUSH_CHUNK_SIZE]}
+            try:
+                self._write(chunk)
+                written += len(chunk)
+            except IntegrityError as exx:
+                # Another process or node inserted one of the entries in the meantime
+                log.info("Unable to write ClientApplication entries in bulk: {0!s}".format(exx))
+                db.session.rollback()
+                written += self._write_rows(chunk)
+            except Exception as exx:
+                log.warning("Unable to write ClientApplication entries: {0!r}".format(exx))
+                log.debug("Error writing the client applications.", exc_info=True)
+                db.session.rollback()
+                self._requeue(chunk)
+        return written
+
+    def _write_rows(self, chunk):
+        written = 0
+        for (ip, clienttype, node), lastseen in chunk.items():
+            try:
+                ClientApplication(ip=ip, clienttype=clienttype, node=node,
+                                  lastseen=lastseen).save()
+                written += 1
+            except Exception as exx:
+                log.warning("Unable to write ClientApplication entry: {0!r}".format(exx))
+                log.debug("Error writing the client application.", exc_info=True)
+                db.session.rollback()
+                self._requeue({(ip, clienttype, node): lastseen})
+        return written
+
+    def _requeue(self, entries):
+        # Keep the newer timestamp, if the client was seen again in the meantime
+        with self._lock:
+            for key, lastseen in entries.items():
+                if key not in self._pending or self._pending[key] < lastseen:
+                    self._pending[key] = lastseen
+
+    @staticmethod
+    def _write(chunk):
+        ips = {key[0] for key in chunk}
+        clienttypes = {key[1] for key in chunk}
+        nodes = {key[2] for key in chunk}
+        existing = {}
+        for row in db.session.query(ClientApplication.id, ClientApplication.ip,
+                                    ClientApplication.clienttype, ClientApplication.node).filter(
+                ClientApplication.ip.in_(ips),
+                ClientApplication.clienttype.in_(clienttypes),
+                ClientApplication.node.in_(nodes)):
+            existing[(row.ip, row.clienttype, row.node)] = row.id
+        updates = []
+        inserts = []
+        for (ip, clienttype, node), lastseen in chunk.items():
+            if (ip, clienttype, node) in existing:
+                updates.append({"id": existing[(ip, clienttype, node)], "lastseen": lastseen})
+            else:
+                inserts.append({"ip": ip, "clienttype": clienttype, "node": node,
+                                "lastseen": lastseen})
+        if updates:
+            db.session.bulk_update_mappings(ClientApplication, updates)
+        if inserts:
+            db.session.bulk_insert_mappings(ClientApplication, inserts)
+        db.session.commit()
+
+    def _start_writer(self):
+        if self._writer is not None or self.app is None:
+            return
+        with self._lock:
+            if self._writer is not None:
+                return
+            self._writer = threading.Thread(target=self._write_back, daemon=True,
+                                            name="clientapplication-writeback")
+            self._writer.start()
+            atexit.register(self.stop)
+
+    def _write_back(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush_in_app_context()
+
+    def _flush_in_app_context(self):
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception as exx:  # pragma: no cover
+                log.warning("Could not write the client applications: {0!r}".format(exx))
+                log.debug("Error writing the client applications.", exc_info=True)
+                db.session.rollback()
+
+    def stop(self):
+        """
+        Stop the background writer and write the pending client applications.
+        """
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._flush_in_app_context()
+
+
+def get_clientapplication_buffer():
+    """
+    Get the client application buffer of the current application.
+
+    :return: a :class:`ClientApplicationBuffer` object or None, if
+        ``PI_CLIENTAPPLICATION_FLUSH_INTERVAL`` is not set.
+    """
+    flush_interval = int(get_app_config_value(CLIENTAPPLICATION_FLUSH_INTERVAL, 0))
+    if flush_interval <= 0:
+        return None
+    store = get_app_local_store()
+    buffer = store.get("clientapplication_buffer")
+    if buffer is None:
+        buffer = ClientApplicationBuffer(flush_interval, app=current_app._get_current_object())
+        buffer = store.setdefault("clientapplication_buffer", buffer)
+    return buffer
+
 
 @log_with(log)
 def save_clientapplication(ip, clienttype):
     """
     Save (or update) the IP and the clienttype to the database table.
+    If ``PI_CLIENTAPPLICATION_FLUSH_INTERVAL`` is set, the entry is written
+    later by the client application buffer.
 
     :param ip: The IP address of the requesting client.
     :type ip: well formatted string or IPAddress
@@ -49,6 +218,10 @@ def save_clientapplication(ip, clienttype):
     node = get_privacyidea_node()
     # Check for a valid IP address
     ip = IPAddress(ip)
+    buffer = get_clientapplication_buffer()
+    if buffer:
+        buffer.add("{0!s}".format(ip), clienttype, node)
+        return
     # TODO: resolve hostname
     app = ClientApplication(ip="{0!s}".format(ip),
                             clienttype=clienttype,
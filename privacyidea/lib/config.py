@@ -38,21 +38,26 @@ import inspect
 import threading
 import traceback
 
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
 from .log import log_with
 from ..models import (Config, db, Resolver, Realm, PRIVACYIDEA_TIMESTAMP,
+                      CONFIG_SECTIONS, get_config_timestamp_key,
                       save_config_timestamp, Policy, EventHandler, CAConnector,
                       NodeName)
-from privacyidea.lib.framework import get_request_local_store, get_app_config_value, get_app_local_store
-from privacyidea.lib.utils import to_list
+from privacyidea.lib.framework import (get_request_local_store, get_app_config_value, get_app_local_store,
+                                       get_app_config)
+from privacyidea.lib.utils import to_list, get_module_class
 from privacyidea.lib.utils.export import (register_import, register_export)
 from .crypto import encryptPassword
-from .crypto import decryptPassword
+from .crypto import decryptPasswords
 from .resolvers.UserIdResolver import UserIdResolver
 from .machines.base import BaseMachineResolver
 from .caconnectors.baseca import BaseCAConnector
 # We need these imports to return the list of CA connector types. Bummer: New import for each new Class anyway.
 from .caconnectors import localca, msca
-from .utils import reload_db, is_true
+from .utils import is_true
 import importlib
 import datetime
 
@@ -65,6 +70,9 @@ this = sys.modules[__name__]
 
 this.config = {}
 
+CONFIG_NOTIFICATION_CLASS = "PI_CONFIG_NOTIFICATION_CLASS"
+CONFIG_NOTIFICATION_OPTION_PREFIX = "PI_CONFIG_NOTIFICATION_"
+
 
 class SharedConfigClass(object):
     """
@@ -72,10 +80,18 @@ class SharedConfigClass(object):
     to store the current configuration with resolvers, realms, policies
     and event handler definitions along with the timestamp of the configuration.
 
-    The method ``_reload_from_db()`` compares this timestamp against the
-    timestamp in the database (while taking the PI_CHECK_RELOAD_CONFIG
-    setting into account). If the database timestamp is newer, the current
-    configuration is updated.
+    The method ``_reload_from_db()`` compares the timestamps of the config
+    sections against the timestamps in the database (while taking the
+    PI_CHECK_RELOAD_CONFIG setting into account). Only the sections, whose
+    timestamp in the database has changed, are read again.
+    If a config notifier is configured (PI_CONFIG_NOTIFICATION_CLASS), the
+    timestamps are only read from the database, if the notifier reports a
+    new version. PI_CHECK_RELOAD_CONFIG is ignored in this case.
+    If PI_CONFIG_RELOAD_BACKGROUND is set, an existing configuration is
+    reloaded in a background thread. Requests continue to use the old
+    configuration until the new one has been read completely. Only a request,
+    which has committed a config change itself, reads the changed sections
+    synchronously, so that it sees its own change.
 
     However, app code must not access the config stored in the shared object!
     Instead, it must use ``reload_and_clone()`` to retrieve
@@ -89,94 +105,227 @@ class SharedConfigClass(object):
         self.realm = {}
         self.default_realm = None
         self.policies = []
+        self.policy_index = None
         self.events = []
+        self.event_index = None
         self.timestamp = None
         self.caconnectors = []
+        # The config timestamps from the database, which belong to the current configuration
+        self.db_timestamps = {}
+        # The version of the config notifier, which belongs to the current configuration
+        self.notification_version = None
+        self._reload_thread = None
+
+    def _changed_sections(self, db_timestamps):
+        """
+        Compare the given config timestamps from the database with the timestamps
+        of the current configuration.
+
+        :param db_timestamps: dictionary of timestamp keys and values
+        :return: list of config sections, which need to be reloaded
+        """
+        if not self.timestamp:
+            return list(CONFIG_SECTIONS)
+        sections = [section for section in CONFIG_SECTIONS
+                    if db_timestamps.get(get_config_timestamp_key(section)) !=
+                    self.db_timestamps.get(get_config_timestamp_key(section))]
+        if not sections and \
+                db_timestamps.get(PRIVACYIDEA_TIMESTAMP) != self.db_timestamps.get(PRIVACYIDEA_TIMESTAMP):
+            # The config was changed without updating the timestamp of a section
+            sections = list(CONFIG_SECTIONS)
+        return sections
 
     def _reload_from_db(self):
         """
-        Read the timestamp from the database. If the timestamp is newer than
-        the internal timestamp, then read the complete data
+        Read the timestamps from the database. If a timestamp differs from the
+        internal timestamp, then read the data of the changed config sections.
         :return:
         """
-        check_reload_config = get_app_config_value("PI_CHECK_RELOAD_CONFIG", 0)
-        if not self.timestamp or \
-                self.timestamp + datetime.timedelta(seconds=check_reload_config) < datetime.datetime.now():
-            db_ts = Config.query.filter_by(Key=PRIVACYIDEA_TIMESTAMP).first()
-            if reload_db(self.timestamp, db_ts):
-                log.debug("Reloading shared config from database")
-                config = {}
-                resolverconfig = {}
-                realmconfig = {}
-                default_realm = None
-                policies = []
-                events = []
-                caconnectors = []
-                # Load system configuration
-                for sysconf in Config.query.all():
-                    config[sysconf.Key] = {
-                        "Value": sysconf.Value,
-                        "Type": sysconf.Type,
-                        "Description": sysconf.Description}
-                # Load resolver configuration
-                for resolver in Resolver.query.all():
-                    resolverdef = {"type": resolver.rtype,
-                                   "resolvername": resolver.name,
-                                   "censor_keys": []}
-                    data = {}
-                    for rconf in resolver.config_list:
-                        if rconf.Type == "password":
-                            value = decryptPassword(rconf.Value)
-                            resolverdef["censor_keys"].append(rconf.Key)
-                        else:
-                            value = rconf.Value
-                        data[rconf.Key] = value
-                    resolverdef["data"] = data
-                    resolverconfig[resolver.name] = resolverdef
-                # Load realm configuration
-                for realm in Realm.query.all():
-                    if realm.default:
-                        default_realm = realm.name
-                    realmdef = {"id": realm.id,
-                                "option": realm.option,
-                                "default": realm.default,
-                                "resolver": []}
-                    for x in realm.resolver_list:
-                        realmdef["resolver"].append({"priority": x.priority,
-                                                     "name": x.resolver.name,
-                                                     "type": x.resolver.rtype,
-                                                     "node": x.node_uuid})
-                    realmconfig[realm.name] = realmdef
-                # Load all policies
-                for pol in Policy.query.all():
-                    policies.append(pol.get())
-                # Load all events
-                for event in EventHandler.query.order_by(EventHandler.ordering):
-                    events.append(event.get())
-                # Load all CA connectors
-                from privacyidea.lib.caconnector import get_caconnector_object
-                for ca in CAConnector.query.all():
-                    try:
-                        ca_obj = get_caconnector_object(ca.name)
-                        caconnectors.append({"connectorname": ca.name,
-                                             "type": ca.catype,
-                                             "data": ca_obj.config,
-                                             "templates": ca_obj.get_templates()})
-                    except Exception as exx:  # pragma: no cover
-                        log.debug("{0!s}".format(traceback.format_exc()))
-                        log.error(exx)
-
-                # Finally, set the current timestamp
-                timestamp = datetime.datetime.now()
-                with self._config_lock:
-                    self.config = config
-                    self.resolver = resolverconfig
-                    self.realm = realmconfig
-                    self.default_realm = default_realm
-                    self.policies = policies
-                    self.events = events
-                    self.timestamp = timestamp
-                    self.caconnectors = caconnectors
+        notifier = get_config_notifier()
+        if notifier:
+            # We read the version before the timestamps, so that we do not miss
+            # any change, which happens in between.
+            version = notifier.get_version()
+            check_db = not self.timestamp or version is None or version != self.notification_version
+        else:
+            version = None
+            check_reload_config = get_app_config_value("PI_CHECK_RELOAD_CONFIG", 0)
+            check_db = not self.timestamp or \
+                self.timestamp + datetime.timedelta(seconds=check_reload_config) < datetime.datetime.now()
+        if check_db:
+            timestamp_keys = [PRIVACYIDEA_TIMESTAMP] + [get_config_timestamp_key(s) for s in CONFIG_SECTIONS]
+            db_timestamps = {c.Key: c.Value for c in Config.query.filter(Config.Key.in_(timestamp_keys))}
+            sections = self._changed_sections(db_timestamps)
+            # A request, which has changed the config itself, must not get the old config
+            local_change = get_request_local_store().pop("config_changed", False)
+            if sections:
+                if self.timestamp and not local_change and \
+                        get_app_config_value("PI_CONFIG_RELOAD_BACKGROUND", False):
+                    # The notification version is not updated, so that the next
+                    # request checks the database again.
+                    self._start_background_reload(sections, db_timestamps)
+                    return
+                self._reload_sections(sections, db_timestamps)
+            self.notification_version = version
+
+    def _start_background_reload(self, sections, db_timestamps):
+        """
+        Reload the given config sections in a background thread. If there is
+        already a running reload thread, do nothing. The changes will be detected
+        again by the next request after the running reload has finished.
+        """
+        with self._config_lock:
+            if self._reload_thread and self._reload_thread.is_alive():
+                return
+            log.debug("Reloading config sections {0!s} in the background".format(sections))
+            self._reload_thread = threading.Thread(target=self._background_reload,
+                                                   args=(current_app._get_current_object(),
+                                                         sections, db_timestamps),
+                                                   daemon=True)
+            self._reload_thread.start()
+
+    def _background_reload(self, app, sections, db_timestamps):
+        with app.app_context():
+            try:
+                self._reload_sections(sections, db_timestamps)
+            except Exception as exx:  # pragma: no cover
+                log.error("Could not reload the config: {0!s}".format(exx))
+                log.debug("{0!s}".format(traceback.format_exc()))
+            finally:
+                db.session.remove()
+
+    def _reload_sections(self, sections, db_timestamps):
+        """
+        Read the given config sections from the database and swap them in.
+        All other sections are taken from the current configuration.
+
+        :param sections: list of config sections
+        :param db_timestamps: the config timestamps, which have been read before the data
+        """
+        log.debug("Reloading shared config sections {0!s} from database".format(sections))
+        config = self.config
+        resolverconfig = self.resolver
+        realmconfig = self.realm
+        default_realm = self.default_realm
+        policies = self.policies
+        policy_index = self.policy_index
+        events = self.events
+        event_index = self.event_index
+        caconnectors = self.caconnectors
+        if "config" in sections:
+            config = self._load_config()
+        if "resolver" in sections:
+            resolverconfig = self._load_resolvers()
+        if "realm" in sections:
+            realmconfig, default_realm = self._load_realms()
+        if "policy" in sections:
+            policies = self._load_policies()
+            from privacyidea.lib.policy import PolicyIndex
+            policy_index = PolicyIndex(policies)
+        if "event" in sections:
+            events = self._load_events()
+            from privacyidea.lib.event import EventIndex
+            event_index = EventIndex(events)
+        if "caconnector" in sections:
+            caconnectors = self._load_caconnectors()
+
+        # Finally, set the current timestamp
+        timestamp = datetime.datetime.now()
+        with self._config_lock:
+            self.config = config
+            self.resolver = resolverconfig
+            self.realm = realmconfig
+            self.default_realm = default_realm
+            self.policies = policies
+            self.policy_index = policy_index
+            self.events = events
+            self.event_index = event_index
+            self.timestamp = timestamp
+            self.caconnectors = caconnectors
+            self.db_timestamps = db_timestamps
+
+    @staticmethod
+    def _load_config():
+        """
+        :return: the system configuration without the config timestamps of the sections
+        """
+        section_keys = [get_config_timestamp_key(section) for section in CONFIG_SECTIONS]
+        config = {}
+        for sysconf in Config.query.filter(Config.Key.notin_(section_keys)):
+            config[sysconf.Key] = {
+                "Value": sysconf.Value,
+                "Type": sysconf.Type,
+                "Description": sysconf.Description}
+        return config
+
+    @staticmethod
+    def _load_resolvers():
+        resolverconfig = {}
+        # The passwords of all resolvers are decrypted at once
+        passwords = []
+        for resolver in Resolver.query.all():
+            resolverdef = {"type": resolver.rtype,
+                           "resolvername": resolver.name,
+                           "censor_keys": []}
+            data = {}
+            for rconf in resolver.config_list:
+                if rconf.Type == "password":
+                    passwords.append((data, rconf.Key, rconf.Value))
+                    resolverdef["censor_keys"].append(rconf.Key)
+                else:
+                    data[rconf.Key] = rconf.Value
+            resolverdef["data"] = data
+            resolverconfig[resolver.name] = resolverdef
+        decrypted = decryptPasswords([value for _data, _key, value in passwords])
+        for (data, key, _value), password in zip(passwords, decrypted):
+            data[key] = password
+        return resolverconfig
+
+    @staticmethod
+    def _load_realms():
+        """
+        :return: tuple of the realm configuration and the name of the default realm
+        """
+        realmconfig = {}
+        default_realm = None
+        for realm in Realm.query.all():
+            if realm.default:
+                default_realm = realm.name
+            realmdef = {"id": realm.id,
+                        "option": realm.option,
+                        "default": realm.default,
+                        "resolver": []}
+            for x in realm.resolver_list:
+                realmdef["resolver"].append({"priority": x.priority,
+                                             "name": x.resolver.name,
+                                             "type": x.resolver.rtype,
+                                             "node": x.node_uuid})
+            realmconfig[realm.name] = realmdef
+        return realmconfig, default_realm
+
+    @staticmethod
+    def _load_policies():
+        return [pol.get() for pol in Policy.query.all()]
+
+    @staticmethod
+    def _load_events():
+        return [event.get() for event in EventHandler.query.order_by(EventHandler.ordering)]
+
+    @staticmethod
+    def _load_caconnectors():
+        from privacyidea.lib.caconnector import get_caconnector_object
+        caconnectors = []
+        for ca in CAConnector.query.all():
+            try:
+                ca_obj = get_caconnector_object(ca.name)
+                caconnectors.append({"connectorname": ca.name,
+                                     "type": ca.catype,
+                                     "data": ca_obj.config,
+                                     "templates": ca_obj.get_templates()})
+            except Exception as exx:  # pragma: no cover
+                log.debug("{0!s}".format(traceback.format_exc()))
+                log.error(exx)
+        return caconnectors
 
     def _clone(self):
         """
@@ -191,7 +340,9 @@ class SharedConfigClass(object):
                 self.policies,
                 self.events,
                 self.caconnectors,
-                self.timestamp
+                self.timestamp,
+                self.policy_index,
+                self.event_index
             )
 
     def reload_and_clone(self):
@@ -213,13 +364,16 @@ class LocalConfigClass(object):
     request and is supposed to stay alive and unchanged during the request.
     """
 
-    def __init__(self, config, resolver, realm, default_realm, policies, events, caconnectors, timestamp):
+    def __init__(self, config, resolver, realm, default_realm, policies, events, caconnectors, timestamp,
+                 policy_index=None, event_index=None):
         self.config = config
         self.resolver = resolver
         self.realm = realm
         self.default_realm = default_realm
         self.policies = policies
+        self.policy_index = policy_index
         self.events = events
+        self.event_index = event_index
         self.caconnectors = caconnectors
         self.timestamp = timestamp
 
@@ -251,12 +405,15 @@ class LocalConfigClass(object):
         if not reduced_config and role == "admin":
             reduced_config = self.config
 
+        password_keys = []
         for ckey, cvalue in reduced_config.items():
             if cvalue.get("Type") == "password":
-                # decrypt the password
-                r_config[ckey] = decryptPassword(cvalue.get("Value"))
+                password_keys.append(ckey)
             else:
                 r_config[ckey] = cvalue.get("Value")
+        # decrypt the passwords
+        passwords = decryptPasswords([reduced_config[ckey].get("Value") for ckey in password_keys])
+        r_config.update(zip(password_keys, passwords))
 
         for t_key in default_true_keys:
             if t_key not in r_config:
@@ -308,6 +465,52 @@ def get_shared_config_object():
     return store['shared_config_object']
 
 
+def get_config_notifier():
+    """
+    Return the application-wide config notifier according to the app config's
+    ``PI_CONFIG_NOTIFICATION_CLASS`` option. All app config options starting
+    with ``PI_CONFIG_NOTIFICATION_`` are passed to the notifier.
+
+    :return: a ``BaseConfigNotifier`` object or None, if no notifier is configured.
+    """
+    store = get_app_local_store()
+    if 'config_notifier' not in store:
+        notifier = None
+        notifier_class = get_app_config_value(CONFIG_NOTIFICATION_CLASS)
+        if notifier_class:
+            try:
+                package_name, class_name = notifier_class.rsplit(".", 1)
+                options = {}
+                for k, v in get_app_config().items():
+                    if k.startswith(CONFIG_NOTIFICATION_OPTION_PREFIX) and k != CONFIG_NOTIFICATION_CLASS:
+                        options[k[len(CONFIG_NOTIFICATION_OPTION_PREFIX):].lower()] = v
+                notifier = get_module_class(package_name, class_name)(options)
+                log.info("Created a new config notifier: {0!r}".format(notifier))
+            except (ImportError, ValueError) as exx:
+                log.warning("Could not import config notifier class {0!r}: {1!r}".format(notifier_class, exx))
+        store['config_notifier'] = notifier
+    return store['config_notifier']
+
+
+@event.listens_for(db.session, "after_commit")
+def _notify_config_change(session):
+    """
+    After a transaction containing a config change has been committed,
+    notify all workers via the config notifier. The current request
+    remembers the change, so that it reads the new config synchronously.
+    """
+    if session.info.pop("config_changed", False) and has_app_context():
+        get_request_local_store()["config_changed"] = True
+        notifier = get_config_notifier()
+        if notifier:
+            notifier.notify()
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_config_change(session):
+    session.info.pop("config_changed", None)
+
+
 def invalidate_config_object():
     """
     Invalidate the request-local config object. This is useful whenever a request modifies
@@ -942,7 +1145,7 @@ def set_privacyidea_config(key, value, typ="", desc=""):
             c1.Type = typ
         if desc:
             c1.Description = desc
-        save_config_timestamp()
+        save_config_timestamp(sections=["config"])
         db.session.commit()
         ret = "update"
     else:
@@ -0,0 +1,50 @@
+# (c) NetKnights GmbH 2024,  https://netknights.it
+#
+# This code is free software; you can redistribute it and/or
+# modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+# as published by the Free Software Foundation; either
+# version 3 of the License, or any later version.
+#
+# This code is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU AFFERO GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+
+
+class BaseConfigNotifier(object):
+    """
+    A config notifier tells the shared config objects of all workers that
+    the configuration in the database has changed.
+
+    Without a config notifier, every worker reads the config timestamps from
+    the database at the beginning of each request. With a config notifier,
+    the worker only reads the timestamps, if the notifier reports a new version.
+
+    The notifier is configured with a dictionary of options and is shared
+    between the threads of a process.
+    """
+    def __init__(self, options):
+        self.options = options
+
+    def notify(self):  # pragma: no cover
+        """
+        Notify all workers that the configuration has changed. This is called
+        after the transaction containing the config change has been committed.
+        """
+        raise NotImplementedError()
+
+    def get_version(self):  # pragma: no cover
+        """
+        Return an opaque value, which changes whenever ``notify`` has been
+        called by any worker. The value only needs to be comparable for equality.
+
+        :return: the current version or None, if it can not be determined. In
+            this case the config timestamps are read from the database.
+        """
+        raise NotImplementedError()
@@ -0,0 +1,99 @@
+# (c) NetKnights GmbH 2024,  https://netknights.it
+#
+# This code is free software; you can redistribute it and/or
+# modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+# as published by the Free Software Foundation; either
+# version 3 of the License, or any later version.
+#
+# This code is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU AFFERO GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+__doc__ = """A config notifier for several privacyIDEA nodes sharing one database.
+
+The config timestamps are written to the database in the same transaction as
+the config change. Instead of reading them at the beginning of each request,
+a background thread of each process reads them every ``interval`` seconds.
+"""
+import logging
+import threading
+
+from flask import current_app
+
+from privacyidea.lib.confignotifiers.base import BaseConfigNotifier
+from privacyidea.models import db, Config, PRIVACYIDEA_TIMESTAMP, CONFIG_SECTIONS, get_config_timestamp_key
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 1
+
+
+class DBConfigNotifier(BaseConfigNotifier):
+    """
+    The poll interval in seconds is given by the option ``interval``.
+    """
+    def __init__(self, options):
+        BaseConfigNotifier.__init__(self, options)
+        self.interval = float(options.get("interval", DEFAULT_INTERVAL))
+        self._keys = [PRIVACYIDEA_TIMESTAMP] + [get_config_timestamp_key(s) for s in CONFIG_SECTIONS]
+        self._version = None
+        # Incremented by each local notification, so that the poll thread does
+        # not store a version, which it has read before the notification
+        self._notifications = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def notify(self):
+        # The config timestamps have already been committed with the config change.
+        # The other workers read them with their next poll. This worker forgets
+        # its version, so that its next request reads the timestamps immediately.
+        with self._lock:
+            self._notifications += 1
+            self._version = None
+
+    def get_version(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll,
+                                                args=(current_app._get_current_object(),),
+                                                daemon=True)
+                self._thread.start()
+        return self._version
+
+    def stop(self):
+        """
+        Stop the background thread
+        """
+        self._stopped.set()
+
+    def read_version(self):
+        """
+        Read the config timestamps from the database.
+
+        :return: a tuple of the timestamp values
+        """
+        timestamps = dict(db.session.query(Config.Key, Config.Value).filter(Config.Key.in_(self._keys)))
+        return tuple(timestamps.get(key) for key in self._keys)
+
+    def _poll(self, app):
+        while not self._stopped.is_set():
+            with app.app_context():
+                notifications = self._notifications
+                try:
+                    version = self.read_version()
+                except Exception as exx:  # pragma: no cover
+                    log.warning("Could not read the config timestamps: {0!s}".format(exx))
+                    version = None
+                finally:
+                    db.session.remove()
+                with self._lock:
+                    if notifications == self._notifications:
+                        self._version = version
+            self._stopped.wait(self.interval)
@@ -0,0 +1,63 @@
+# (c) NetKnights GmbH 2024,  https://netknights.it
+#
+# This code is free software; you can redistribute it and/or
+# modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+# as published by the Free Software Foundation; either
+# version 3 of the License, or any later version.
+#
+# This code is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU AFFERO GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+__doc__ = """A config notifier for all workers on one host. The notification is
+the inode and the modification time of a file, which is replaced on every
+config change.
+"""
+import logging
+import os
+import tempfile
+import time
+
+from privacyidea.lib.confignotifiers.base import BaseConfigNotifier
+
+log = logging.getLogger(__name__)
+
+DEFAULT_FILE = os.path.join(tempfile.gettempdir(), "privacyidea-config-notification")
+
+
+class FileConfigNotifier(BaseConfigNotifier):
+    """
+    The notification file is given by the option ``file``. All workers on
+    the host need write access to the file and its directory.
+    """
+    def __init__(self, options):
+        BaseConfigNotifier.__init__(self, options)
+        self.filename = options.get("file") or DEFAULT_FILE
+        if not os.path.exists(self.filename):
+            self.notify()
+
+    def notify(self):
+        # We write a new file and replace the old one, so that the inode
+        # changes even if the file system has a coarse timestamp resolution.
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        try:
+            fd, tmp_name = tempfile.mkstemp(dir=directory, prefix=".pi-config-")
+            with os.fdopen(fd, "w") as f:
+                f.write("{0!s} {1!s}\n".format(time.time(), os.getpid()))
+            os.replace(tmp_name, self.filename)
+        except OSError as exx:
+            log.warning("Could not write config notification file {0!s}: {1!s}".format(self.filename, exx))
+
+    def get_version(self):
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            # Without the file we do not know anything about config changes
+            return None
+        return stat.st_ino, stat.st_mtime_ns
@@ -50,6 +50,10 @@ import random
 import string
 import binascii
 import ctypes
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
 import base64
 import traceback
@@ -57,7 +61,7 @@ from passlib.context import CryptContext
 from privacyidea.lib.log import log_with
 from privacyidea.lib.error import HSMException, ParameterError
 from privacyidea.lib.framework import (get_app_local_store, get_app_config_value,
-                                       get_app_config)
+                                       get_app_config, get_request_local_store)
 from privacyidea.lib.utils import (to_unicode, to_bytes, hexlify_and_unicode,
                                    b64encode_and_unicode)
 
@@ -89,12 +93,139 @@ FAILED_TO_DECRYPT_PASSWORD = "FAILED TO DECRYPT PASSWORD!"  # nosec B105 # place
 log = logging.getLogger(__name__)
 
 
+KEY_CACHE_SIZE = "PI_KEY_CACHE_SIZE"
+KEY_CACHE_TTL = "PI_KEY_CACHE_TTL"
+
+
+def _lock_memory(buf, lock=True):
+    """
+    Try to prevent the given bytearray from being swapped to disk.
+    This is only done, if the libc provides mlock.
+    """
+    try:
+        libc = ctypes.CDLL(None)
+        address = ctypes.addressof((ctypes.c_char * len(buf)).from_buffer(buf))
+        func = libc.mlock if lock else libc.munlock
+        func(ctypes.c_void_p(address), ctypes.c_size_t(len(buf)))
+    except (OSError, AttributeError, ValueError, TypeError):  # pragma: no cover
+        log.debug("Could not lock memory of the key cache.")
+
+
+class DecryptedKeyCache(object):
+    """
+    Size bounded cache of decrypted token keys with a time to live.
+
+    The entries are identified by the serial, the hash of the encrypted
+    key and the IV. So a changed key in the database never matches an old
+    entry. The decrypted keys are stored in bytearrays, which are zeroed when
+    the entry is evicted.
+    """
+
+    def __init__(self, size, ttl=300):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # (serial, sha256(encrypted key), iv) -> (bytearray, valid until)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(serial, enc_key, iv):
+        return serial, sha256(to_bytes(enc_key)).digest(), to_bytes(iv)
+
+    @staticmethod
+    def _zero(buf):
+        for i in range(len(buf)):
+            buf[i] = 0
+        _lock_memory(buf, lock=False)
+
+    def get(self, serial, enc_key, iv):
+        """
+        :return: a copy of the decrypted key or None
+        :rtype: bytes
+        """
+        key = self._key(serial, enc_key, iv)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            buf, valid_until = entry
+            if valid_until < time.monotonic():
+                del self._entries[key]
+                self._zero(buf)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return bytes(buf)
+
+    def add(self, serial, enc_key, iv, bkey):
+        buf = bytearray(bkey)
+        _lock_memory(buf)
+        key = self._key(serial, enc_key, iv)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._zero(old[0])
+            self._entries[key] = (buf, time.monotonic() + self.ttl)
+            while len(self._entries) > self.size:
+                _key, (old_buf, _valid_until) = self._entries.popitem(last=False)
+                self._zero(old_buf)
+
+    def invalidate(self, serial=None):
+        """
+        Remove the keys of the given token or all keys from the cache.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if serial is None or key[0] == serial:
+                    self._zero(self._entries.pop(key)[0])
+
+
+def get_key_cache():
+    """
+    Get the cache of decrypted token keys of the current application.
+
+    :return: a :class:`DecryptedKeyCache` or None, if ``PI_KEY_CACHE_SIZE``
+        is not set
+    """
+    size = int(get_app_config_value(KEY_CACHE_SIZE, 0))
+    if size <= 0:
+        return None
+    app_store = get_app_local_store()
+    if "key_cache" not in app_store:
+        app_store.setdefault("key_cache", DecryptedKeyCache(size,
+                                                            int(get_app_config_value(KEY_CACHE_TTL, 300))))
+    return app_store["key_cache"]
+
+
+def invalidate_key_cache(serial=None):
+    """
+    Remove the decrypted keys of the given token from the key cache.
+
+    :param serial: the serial of the token. If it is None, all keys are removed.
+    """
+    key_cache = get_key_cache()
+    if key_cache:
+        key_cache.invalidate(serial)
+
+
 class SecretObj(object):
-    def __init__(self, val, iv, preserve=True):
+    def __init__(self, val, iv, preserve=True, serial=None):
+        """
+        :param val: the encrypted secret
+        :param iv: the IV
+        :param preserve: keep the decrypted key after usage
+        :param serial: the serial of the token. If it is given, the decrypted
+            key can be taken from the key cache.
+        """
         self.val = val
         self.iv = iv
         self.bkey = None
         self.preserve = preserve
+        self.serial = serial
 
     def getKey(self):
         log.info('Requesting secret key '
@@ -115,6 +246,25 @@ class SecretObj(object):
         self._clearKey_(preserve=self.preserve)
         return h
 
+    def hmac_digests(self, data_inputs, hash_algo):
+        """
+        Calculate the HMAC of several data inputs. The key is only decrypted
+        and set up once, the HMAC object is copied for each data input.
+
+        :param data_inputs: iterable of data inputs
+        :param hash_algo: the hash function
+        :return: generator of the digests
+        """
+        self._setupKey_()
+        try:
+            h = hmac.new(self.bkey, digestmod=hash_algo)
+            for data_input in data_inputs:
+                h_copy = h.copy()
+                h_copy.update(data_input)
+                yield h_copy.digest()
+        finally:
+            self._clearKey_(preserve=self.preserve)
+
     def aes_ecb_decrypt(self, enc_data):
         '''
         support inplace aes decryption for the yubikey (mode ECB)
@@ -132,10 +282,16 @@ class SecretObj(object):
 
     def _setupKey_(self):
         if self.bkey is None:
-            akey = decrypt(self.val, self.iv)
-            self.bkey = binascii.unhexlify(akey)
-            zerome(akey)
-            del akey
+            key_cache = get_key_cache() if self.serial else None
+            if key_cache:
+                self.bkey = key_cache.get(self.serial, self.val, self.iv)
+            if self.bkey is None:
+                akey = decrypt(self.val, self.iv)
+                self.bkey = binascii.unhexlify(akey)
+                zerome(akey)
+                del akey
+                if key_cache:
+                    key_cache.add(self.serial, self.val, self.iv, self.bkey)
 
     def _clearKey_(self, preserve=False):
         if preserve is False and self.bkey is not None:
@@ -337,6 +493,27 @@ def decryptPassword(cryptPass):
     return ret
 
 
+@log_with(log, log_entry=False, log_exit=False)
+def decryptPasswords(cryptPasses):
+    """
+    Decrypt a list of encrypted passwords at once.
+    If the decryption fails, the passwords are decrypted one by one, so that
+    only the failing passwords are replaced by FAILED_TO_DECRYPT_PASSWORD.
+
+    :param cryptPasses: list of str
+    :return: list of the decrypted passwords
+    :rtype: list of str
+    """
+    if not cryptPasses:
+        return []
+    hsm = get_hsm()
+    try:
+        return hsm.decrypt_passwords(cryptPasses)
+    except Exception as exx:
+        log.debug("Could not decrypt the passwords at once: {0!r}".format(exx))
+        return [decryptPassword(cryptPass) for cryptPass in cryptPasses]
+
+
 @log_with(log, log_exit=False)
 def decryptPin(cryptPin):
     """
@@ -388,6 +565,90 @@ def decrypt(enc_data, iv, key_id=0):
     return res
 
 
+@log_with(log, log_entry=False)
+def encrypt_many(items, key_id=0):
+    """
+    Encrypt several values with the security module at once.
+
+    :param items: list of tuples (data, iv)
+    :type items: list
+    :param key_id: contains the key id of the keyset which should be used
+    :type key_id: int
+    :return: list of encrypted and hexlified data
+    :rtype: list of str
+    """
+    hsm = get_hsm()
+    ret = hsm.encrypt_many([(to_bytes(data), to_bytes(iv)) for data, iv in items],
+                           key_id=key_id)
+    return [hexlify_and_unicode(r) for r in ret]
+
+
+@contextmanager
+def encryption_batch(values, key_id=0):
+    """
+    Encrypt the given values at once with :func:`encrypt_many` and a random
+    initialisation vector for each value. Within the context
+    :func:`encrypt_with_random_iv` returns the prepared encrypted values, so
+    that e.g. the keys of all tokens of an import file are encrypted in one
+    call to the security module.
+
+    :param values: list of values, which will be encrypted
+    :type values: list of bytes or str
+    :param key_id: contains the key id of the keyset which should be used
+    :type key_id: int
+    """
+    ivs = [geturandom(16) for _value in values]
+    encrypted = encrypt_many(list(zip(values, ivs)), key_id=key_id) if values else []
+    store = get_request_local_store()
+    previous = store.get("encryption_batch")
+    batch = {}
+    for value, enc_data, iv in zip(values, encrypted, ivs):
+        batch.setdefault((key_id, to_bytes(value)), []).append((enc_data, iv))
+    store["encryption_batch"] = batch
+    try:
+        yield
+    finally:
+        store["encryption_batch"] = previous
+
+
+def encrypt_with_random_iv(data, key_id=0):
+    """
+    Encrypt the data with a random initialisation vector. If the data has
+    already been encrypted in an :func:`encryption_batch`, the prepared
+    value is returned.
+
+    :param data: buffer, which contains the value
+    :type data: bytes or str
+    :param key_id: contains the key id of the keyset which should be used
+    :type key_id: int
+    :return: tuple of the encrypted and hexlified data and the initialisation vector
+    :rtype: tuple
+    """
+    batch = get_request_local_store().get("encryption_batch")
+    prepared = batch.get((key_id, to_bytes(data))) if batch else None
+    if prepared:
+        return prepared.pop()
+    iv = geturandom(16)
+    return encrypt(data, iv, key_id=key_id), iv
+
+
+@log_with(log, log_exit=False)
+def decrypt_many(items, key_id=0):
+    """
+    Decrypt several values with the security module at once.
+
+    :param items: list of tuples (enc_data, iv)
+    :type items: list
+    :param key_id: contains the key id of the keyset which should be used
+    :type key_id: int
+    :return: list of decrypted buffers
+    :rtype: list of bytes
+    """
+    hsm = get_hsm()
+    return hsm.decrypt_many([(to_bytes(enc_data), to_bytes(iv)) for enc_data, iv in items],
+                            key_id=key_id)
+
+
 @log_with(log, log_exit=False)
 def aes_cbc_decrypt(key, iv, enc_data):
     """
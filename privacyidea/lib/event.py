@@ -20,16 +20,156 @@
 # License along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 #
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
 from privacyidea.lib.config import get_config_object
-from privacyidea.lib.utils import fetch_one_resource
+from privacyidea.lib.error import ParameterError
+from privacyidea.lib.framework import get_app_config_value, get_app_local_store
+from privacyidea.lib.lifecycle import call_finalizers
+from privacyidea.lib.utils import fetch_one_resource, is_true
 from privacyidea.models import EventHandler, EventHandlerOption, db
 from privacyidea.lib.audit import getAudit
 from privacyidea.lib.utils.export import (register_import, register_export)
+from privacyidea.lib.eventhandler.base import RUN_ASYNC_OPTION
+import copy
 import functools
+import io
 import logging
+import threading
+import traceback
 log = logging.getLogger(__name__)
 
 AVAILABLE_EVENTS = []
+_HANDLER_CLASSES = None
+
+EVENT_ASYNC_WORKERS = "PI_EVENT_ASYNC_WORKERS"
+EVENT_ASYNC_QUEUE_SIZE = "PI_EVENT_ASYNC_QUEUE_SIZE"
+
+
+class EventWorkerPool(object):
+    """
+    Runs the actions of post event handlers, which are defined to run
+    asynchronously, in a bounded pool of threads.
+    At most ``workers`` actions run at the same time and at most
+    ``queue_size`` further actions wait for a free thread.
+    """
+
+    def __init__(self, app, workers=4, queue_size=100):
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="event-handler")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, func, *args):
+        """
+        Run ``func(*args)`` in an application context of a worker thread.
+
+        :return: False, if the queue is full and the function was not submitted
+        """
+        if not self._slots.acquire(blocking=False):
+            return False
+        try:
+            future = self._executor.submit(self._run, func, *args)
+        except RuntimeError:
+            # The pool has been shut down
+            self._slots.release()
+            return False
+        future.add_done_callback(lambda _f: self._slots.release())
+        return True
+
+    def _run(self, func, *args):
+        with self.app.app_context():
+            try:
+                func(*args)
+            except Exception as exx:
+                log.warning("Error running an asynchronous event handler: {0!r}".format(exx))
+                log.debug(traceback.format_exc())
+            finally:
+                call_finalizers()
+
+    def shutdown(self, wait=True):
+        """
+        Stop the pool. With ``wait`` all submitted actions are completed.
+        """
+        self._executor.shutdown(wait=wait)
+
+
+def get_event_worker_pool():
+    """
+    Return the worker pool for asynchronous event handlers of the current
+    application. The size is configured with ``PI_EVENT_ASYNC_WORKERS``
+    (default 4) and ``PI_EVENT_ASYNC_QUEUE_SIZE`` (default 100).
+
+    :return: an :class:`EventWorkerPool` object
+    """
+    store = get_app_local_store()
+    pool = store.get("event_worker_pool")
+    if pool is None:
+        pool = EventWorkerPool(current_app._get_current_object(),
+                               workers=int(get_app_config_value(EVENT_ASYNC_WORKERS, 4)),
+                               queue_size=int(get_app_config_value(EVENT_ASYNC_QUEUE_SIZE, 100)))
+        pool = store.setdefault("event_worker_pool", pool)
+    return pool
+
+
+def _snapshot_event_options(options):
+    """
+    Copy the request, the request globals and the response in the options of
+    an event handler, so that the action can run after the request has ended.
+
+    :param options: the options with "request", "g", "response" and "handler_def"
+    :return: new options
+    """
+    request = options.get("request")
+    environ = dict(request.environ)
+    # The parameters have already been read into ``all_data``
+    environ["wsgi.input"] = io.BytesIO()
+    environ.pop("werkzeug.request", None)
+    request_copy = request.__class__(environ)
+    request_copy.all_data = dict(getattr(request, "all_data", None) or {})
+    for attribute in ["User", "pi_allowed_realms", "pi_allowed_container_realms"]:
+        if hasattr(request, attribute):
+            setattr(request_copy, attribute, getattr(request, attribute))
+
+    g_copy = copy.copy(options.get("g"))
+    # The request local store must not be shared with the worker thread
+    g_copy.__dict__.pop("_request_local_store", None)
+    audit_object = getattr(g_copy, "audit_object", None)
+    if audit_object is not None:
+        g_copy.audit_object = copy.copy(audit_object)
+        g_copy.audit_object.audit_data = dict(audit_object.audit_data)
+
+    response = options.get("response")
+    if response is not None and hasattr(response, "get_data"):
+        # A streamed response can only be read once
+        data = b"" if response.is_streamed else response.get_data()
+        response = response.__class__(data, status=response.status,
+                                      headers=list(response.headers.items()))
+    return {"request": request_copy,
+            "g": g_copy,
+            "response": response,
+            "handler_def": options.get("handler_def")}
+
+
+def _do_post_event_action(event_handler, e_handler_def, options, event_audit_data, audit_config):
+    """
+    Run the action of a post event handler and write the audit entry of the
+    event handler.
+
+    :return: the response, which might have been modified by the handler
+    """
+    # create a new audit object
+    event_audit = getAudit(audit_config)
+    event_audit.log(event_audit_data)
+    result = event_handler.do(e_handler_def.get("action"),
+                              options=options)
+    if not result and event_handler.run_details:
+        event_audit_data["info"] += " ({!s})".format(event_handler.run_details)
+        event_audit.log(event_audit_data)
+    # set audit object to success
+    event_audit.log({"success": result})
+    event_audit.finalize_log()
+    return options.get("response")
 
 
 class event(object):
@@ -118,8 +258,6 @@ class event(object):
                     log.debug("Post-Handling event {eventname} with options"
                               "{options}".format(eventname=self.eventname,
                                                  options=options))
-                    # create a new audit object
-                    event_audit = getAudit(self.g.audit_object.config)
                     # copy all values from the original audit entry
                     event_audit_data = dict(self.g.audit_object.audit_data)
                     event_audit_data["action"] = "POST-EVENT {trigger}>>" \
@@ -130,24 +268,58 @@ class event(object):
                     event_audit_data["action_detail"] = "{0!s}".format(
                         e_handler_def.get("options"))
                     event_audit_data["info"] = e_handler_def.get("name")
-                    event_audit.log(event_audit_data)
 
-                    result = event_handler.do(e_handler_def.get("action"),
-                                               options=options)
-                    if not result and event_handler.run_details:
-                        event_audit_data["info"] += " ({!s})".format(event_handler.run_details)
-                        event_audit.log(event_audit_data)
+                    if event_handler.allow_async and \
+                            is_true((e_handler_def.get("options") or {}).get(RUN_ASYNC_OPTION)):
+                        if get_event_worker_pool().submit(_do_post_event_action, event_handler,
+                                                          e_handler_def, _snapshot_event_options(options),
+                                                          event_audit_data, self.g.audit_object.config):
+                            continue
+                        log.warning("The queue for asynchronous event handlers is full. Running the "
+                                    "event handler {0!r} synchronously.".format(e_handler_def.get("name")))
                     # In case the handler has modified the response
-                    f_result = options.get("response")
-                    # set audit object to success
-                    event_audit.log({"success": result})
-                    event_audit.finalize_log()
+                    f_result = _do_post_event_action(event_handler, e_handler_def, options,
+                                                     event_audit_data, self.g.audit_object.config)
 
             return f_result
 
         return event_wrapper
 
 
+def _get_handler_classes():
+    """
+    Return the dictionary of the event handler classes by their identifier.
+    The dictionary is created on the first call.
+    """
+    global _HANDLER_CLASSES
+    if _HANDLER_CLASSES is None:
+        from privacyidea.lib.eventhandler.usernotification import \
+            UserNotificationEventHandler
+        from privacyidea.lib.eventhandler.tokenhandler import TokenEventHandler
+        from privacyidea.lib.eventhandler.scripthandler import ScriptEventHandler
+        from privacyidea.lib.eventhandler.federationhandler import \
+            FederationEventHandler
+        from privacyidea.lib.eventhandler.counterhandler import CounterEventHandler
+        from privacyidea.lib.eventhandler.requestmangler import RequestManglerEventHandler
+        from privacyidea.lib.eventhandler.responsemangler import ResponseManglerEventHandler
+        from privacyidea.lib.eventhandler.logginghandler import LoggingEventHandler
+        from privacyidea.lib.eventhandler.customuserattributeshandler import CustomUserAttributesHandler
+        from privacyidea.lib.eventhandler.webhookeventhandler import WebHookHandler
+        from privacyidea.lib.eventhandler.containerhandler import ContainerEventHandler
+        _HANDLER_CLASSES = {"UserNotification": UserNotificationEventHandler,
+                            "Token": TokenEventHandler,
+                            "Script": ScriptEventHandler,
+                            "Federation": FederationEventHandler,
+                            "Counter": CounterEventHandler,
+                            "RequestMangler": RequestManglerEventHandler,
+                            "ResponseMangler": ResponseManglerEventHandler,
+                            "Logging": LoggingEventHandler,
+                            "CustomUserAttributes": CustomUserAttributesHandler,
+                            "WebHook": WebHookHandler,
+                            "Container": ContainerEventHandler}
+    return _HANDLER_CLASSES
+
+
 def get_handler_object(handlername):
     """
     Return an event handler object based on the Name of the event handler class
@@ -156,44 +328,11 @@ def get_handler_object(handlername):
     :type hanldername: basestring
     :return:
     """
-    # TODO: beautify and make this work with several different handlers
-    from privacyidea.lib.eventhandler.usernotification import \
-        UserNotificationEventHandler
-    from privacyidea.lib.eventhandler.tokenhandler import TokenEventHandler
-    from privacyidea.lib.eventhandler.scripthandler import ScriptEventHandler
-    from privacyidea.lib.eventhandler.federationhandler import \
-        FederationEventHandler
-    from privacyidea.lib.eventhandler.counterhandler import CounterEventHandler
-    from privacyidea.lib.eventhandler.requestmangler import RequestManglerEventHandler
-    from privacyidea.lib.eventhandler.responsemangler import ResponseManglerEventHandler
-    from privacyidea.lib.eventhandler.logginghandler import LoggingEventHandler
-    from privacyidea.lib.eventhandler.customuserattributeshandler import CustomUserAttributesHandler
-    from privacyidea.lib.eventhandler.webhookeventhandler import WebHookHandler
-    from privacyidea.lib.eventhandler.containerhandler import ContainerEventHandler
-    h_obj = None
-    if handlername == "UserNotification":
-        h_obj = UserNotificationEventHandler()
-    elif handlername == "Token":
-        h_obj = TokenEventHandler()
-    elif handlername == "Script":
-        h_obj = ScriptEventHandler()
-    elif handlername == "Federation":
-        h_obj = FederationEventHandler()
-    elif handlername == "Counter":
-        h_obj = CounterEventHandler()
-    elif handlername == "RequestMangler":
-        h_obj = RequestManglerEventHandler()
-    elif handlername == "ResponseMangler":
-        h_obj = ResponseManglerEventHandler()
-    elif handlername == "Logging":
-        h_obj = LoggingEventHandler()
-    elif handlername == "CustomUserAttributes":
-        h_obj = CustomUserAttributesHandler()
-    elif handlername == "WebHook":
-        h_obj = WebHookHandler()
-    elif handlername == "Container":
-        h_obj = ContainerEventHandler()
-    return h_obj
+    h_class = _get_handler_classes().get(handlername)
+    if h_class is None:
+        return None
+    # Event handler objects store the details of a run, so every call gets a new object
+    return h_class()
 
 
 def enable_event(event_id, enable=True):
@@ -236,7 +375,8 @@ def set_event(name=None, event=None, handlermodule=None, action=None, conditions
     :param ordering: An optional ordering of the event definitions.
     :type ordering: integer
     :param options: Additional options, that are needed as parameters for the
-        action
+        action. The option ``run_async`` runs a post event handler in the
+        background, if the event handler allows it.
     :type options: dict
     :param id: The DB id of the event. If the id is given, the event is
         updated. Otherwise, a new entry is generated.
@@ -248,6 +388,11 @@ def set_event(name=None, event=None, handlermodule=None, action=None, conditions
     if type(event) == list:
         event = ",".join(event)
     conditions = conditions or {}
+    if is_true((options or {}).get(RUN_ASYNC_OPTION)):
+        h_obj = get_handler_object(handlermodule)
+        if position != "post" or (h_obj and not h_obj.allow_async):
+            raise ParameterError("The event handler {0!s} can not run asynchronously "
+                                 "at the position {1!s}.".format(handlermodule, position))
     if id:
         id = int(id)
     event = EventHandler(name, event, handlermodule, action,
@@ -268,6 +413,36 @@ def delete_event(event_id):
     return fetch_one_resource(EventHandler, id=event_id).delete()
 
 
+class EventIndex(object):
+    """
+    A read-only index over the list of event handler definitions of one
+    configuration snapshot. It is built by the shared config object whenever
+    the event handler definitions are reloaded and maps the event name and
+    the position to the active definitions in the order of their priority.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self._handled_events = {}
+        for e_handler_def in events:
+            if not e_handler_def.get("active"):
+                continue
+            position = e_handler_def.get("position")
+            for eventname in set(e_handler_def.get("event")):
+                self._handled_events.setdefault((eventname, position), []).append(e_handler_def)
+
+    def get_handled_events(self, eventname, position="post"):
+        """
+        Return a list of the active event handling definitions for the given
+        eventname and the given position.
+
+        :param eventname: The name of the event
+        :param position: the position of the event definition
+        :return: list of event handler definitions
+        """
+        return list(self._handled_events.get((eventname, position), []))
+
+
 class EventConfiguration(object):
     """
     This class is supposed to contain the event handling configuration during
@@ -294,6 +469,9 @@ class EventConfiguration(object):
         :param position: the position of the event definition
         :return:
         """
+        event_index = getattr(get_config_object(), "event_index", None)
+        if event_index is not None:
+            return event_index.get_handled_events(eventname, position)
         eventlist = [e for e in self.events if (
             eventname in e.get("event") and e.get("active") and e.get("position") == position)]
         return eventlist
@@ -97,6 +97,11 @@ class CONDITION(object):
     SERIAL = "serial"
 
 
+# The name of the option of an event handler definition, which runs the
+# action after the response in a background thread.
+RUN_ASYNC_OPTION = "run_async"
+
+
 class GROUP(object):
     """
     These are the event handler groups. The conditions
@@ -122,6 +127,9 @@ class BaseEventHandler(object):
     identifier = "BaseEventHandler"
     description = "This is the base class of an EventHandler with no " \
                   "functionality"
+    # Event handlers, which modify the request or the response, can not
+    # run asynchronously.
+    allow_async = True
 
     def __init__(self):
         pass
@@ -137,6 +145,23 @@ class BaseEventHandler(object):
         """
         return ["post"]
 
+    def add_async_option(self, actions):
+        """
+        Add the option to run the action asynchronously to all actions of
+        the event handler, if the event handler allows it.
+
+        :param actions: dictionary of actions as returned by ``actions``
+        :return: dictionary of actions
+        """
+        if self.allow_async and isinstance(actions, dict):
+            async_option = {"type": "bool",
+                            "required": False,
+                            "description": _("Run the action in the background after the response "
+                                             "has been sent. This is only used at the position 'post'.")}
+            actions = {action: dict(action_options, **{RUN_ASYNC_OPTION: async_option})
+                       for action, action_options in actions.items()}
+        return actions
+
     @property
     def actions(self):
         """
@@ -54,6 +54,7 @@ class FederationEventHandler(BaseEventHandler):
     identifier = "Federation"
     description = "This event handler can forward the request to other " \
                   "privacyIDEA servers"
+    allow_async = False
 
     # TODO: Do we need to change the federation handler this way, that it does only pre-handling?
 
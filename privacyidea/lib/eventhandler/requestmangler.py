@@ -62,6 +62,7 @@ class RequestManglerEventHandler(BaseEventHandler):
 
     identifier = "RequestMangler"
     description = "This event handler can modify the parameters in the request."
+    allow_async = False
 
     @property
     def allowed_positions(cls):
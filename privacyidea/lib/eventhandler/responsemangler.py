@@ -53,6 +53,7 @@ class ResponseManglerEventHandler(BaseEventHandler):
 
     identifier = "ResponseMangler"
     description = "This event handler can mangle the JSON response."
+    allow_async = False
 
     @property
     def allowed_positions(cls):
@@ -64,7 +64,8 @@ from privacyidea.lib.utils import (modhex_decode, modhex_encode,
                                    b64encode_and_unicode)
 from privacyidea.lib.config import get_token_class
 from privacyidea.lib.log import log_with
-from privacyidea.lib.crypto import (aes_decrypt_b64, aes_encrypt_b64, geturandom)
+from privacyidea.lib.crypto import (aes_decrypt_b64, aes_encrypt_b64, geturandom,
+                                    decrypt_many)
 from bs4 import BeautifulSoup
 import traceback
 from passlib.crypto.digest import pbkdf2_hmac
@@ -702,9 +703,13 @@ def export_pskc(tokenobj_list, psk=None):
      </MACMethod>
 """.format(encrypted_mackey=encrypted_mackey), "html.parser")
 
-    for tokenobj in tokenobj_list:
-        if tokenobj.type.lower() not in ["totp", "hotp", "pw"]:
-            continue
+    tokenobj_list = [tokenobj for tokenobj in tokenobj_list
+                     if tokenobj.type.lower() in ["totp", "hotp", "pw"]]
+    # decrypt the keys of all tokens at once
+    otpkeys = decrypt_many([(binascii.unhexlify(tokenobj.token.key_enc),
+                             binascii.unhexlify(tokenobj.token.key_iv))
+                            for tokenobj in tokenobj_list])
+    for tokenobj, otpkey in zip(tokenobj_list, otpkeys):
         type = tokenobj.type.lower()
         issuer = "privacyIDEA"
         try:
@@ -722,7 +727,6 @@ def export_pskc(tokenobj_list, psk=None):
         else:
             timestep = 0
             timedrift = 0
-        otpkey = tokenobj.token.get_otpkey().getKey()
         try:
             if tokenobj.type.lower() in ["totp", "hotp"]:
                 encrypted_otpkey = aes_encrypt_b64(psk, binascii.unhexlify(otpkey))
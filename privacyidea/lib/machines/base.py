@@ -157,6 +157,15 @@ class BaseMachineResolver(object):
         """
         return None
 
+    def get_cache_info(self):
+        """
+        Returns the statistics of the cache of the machine resolver in the
+        current process like the numbers of cache hits and misses.
+
+        :return: dict or None, if the resolver does not cache
+        """
+        return None
+
     @staticmethod
     def get_config_description():
         """
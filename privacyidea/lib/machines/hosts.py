@@ -29,13 +29,87 @@ from .base import Machine
 from .base import BaseMachineResolver
 from .base import MachineResolverError
 
+import os
+import threading
+from collections import namedtuple
+
 import netaddr
 
+#: One line of a hosts file. The search key contains the machine id, the
+#: hostnames and the IP address in lower case for substring searches.
+HostsEntry = namedtuple("HostsEntry", ["id", "hostnames", "ip", "search_key"])
+
+# The parsed hosts files of this process: file name -> (file stamp, HostsFile)
+_HOSTS_FILES = {}
+_HOSTS_FILES_LOCK = threading.Lock()
+
+
+class HostsFile(object):
+    """
+    The parsed machines of a hosts file with indexes by machine id, IP
+    address and hostname. The object is not changed after it was created, so
+    that it can be shared between threads.
+    """
+
+    def __init__(self, filename):
+        self.entries = []
+        self.by_id = {}
+        self.by_ip = {}
+        self.by_hostname = {}
+        with open(filename, "r") as f:
+            for line in f:
+                split_line = line.split()
+                if len(split_line) < 2:
+                    # skip lines with less than 2 columns
+                    continue
+                if split_line[0][0] == "#":
+                    # skip comments
+                    continue
+                line_id = split_line[0]
+                line_ip = netaddr.IPAddress(split_line[0])
+                line_hostname = split_line[1:]
+                search_key = "\n".join([line_id, "{0!s}".format(line_ip)] + line_hostname).lower()
+                entry = HostsEntry(line_id, line_hostname, line_ip, search_key)
+                self.entries.append(entry)
+                self.by_id.setdefault(line_id, []).append(entry)
+                self.by_ip.setdefault(line_ip, []).append(entry)
+                for name in set(line_hostname):
+                    self.by_hostname.setdefault(name, []).append(entry)
+
+
+def get_hosts_file(filename):
+    """
+    Return the parsed hosts file. The parsed file is shared within the
+    process and only read again, if the modification time, the size or the
+    inode of the file changes.
+
+    :param filename: The name of the hosts file
+    :return: the parsed file
+    :rtype: HostsFile
+    """
+    filename = os.path.abspath(filename)
+    # We take the stamp before reading the file. If the file changes while
+    # it is read, it is read again on the next call.
+    stat = os.stat(filename)
+    stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    with _HOSTS_FILES_LOCK:
+        entry = _HOSTS_FILES.get(filename)
+    if entry and entry[0] == stamp:
+        return entry[1]
+    hosts_file = HostsFile(filename)
+    with _HOSTS_FILES_LOCK:
+        _HOSTS_FILES[filename] = (stamp, hosts_file)
+    return hosts_file
+
 
 class HostsMachineResolver(BaseMachineResolver):
 
     type = "hosts"
 
+    def _machine(self, entry):
+        return Machine(self.name, entry.id, hostname=list(entry.hostnames),
+                       ip=entry.ip)
+
     def get_machines(self, machine_id=None, hostname=None, ip=None, any=None,
                      substring=False):
         """
@@ -46,59 +120,48 @@ class HostsMachineResolver(BaseMachineResolver):
         :param ip: can not be matched as substring
         :param substring: Whether the filtering should be a substring matching
         :type substring: bool
-        :param any: a substring that matches EITHER hostname, machineid or ip
+        :param any: a substring that matches EITHER hostname, machineid or ip.
+            The matching is not case sensitive.
         :type any: basestring
         :return: list of Machine Objects
         """
-        machines = []
-
-        f = open(self.filename, "r")
-        try:
-            for line in f:
-                split_line = line.split()
-                if len(split_line) < 2:
-                    # skip lines with less than 2 columns
-                    continue
-                if split_line[0][0] == "#":
-                    # skip comments
-                    continue
-                line_id = split_line[0]
-                line_ip = netaddr.IPAddress(split_line[0])
-                line_hostname = split_line[1:]
-                # check if machine_id, ip or hostname matches a substring
-                if (any and any not in line_id and
-                        len([x for x in line_hostname if any in x]) <= 0 and
-                        any not in "{0!s}".format(line_ip)):
-                    # "any" was provided but did not match either
-                    # hostname, ip or machine_id
-                    continue
+        hosts = get_hosts_file(self.filename)
+        if isinstance(ip, str):
+            ip = netaddr.IPAddress(ip)
+        if any:
+            any = any.lower()
+
+        if machine_id and not substring:
+            # The first machine with this id is returned
+            for entry in hosts.by_id.get(machine_id, []):
+                if not any or any in entry.search_key:
+                    return [self._machine(entry)]
+            return []
+
+        # Use the indexes to get the candidates
+        if ip:
+            entries = hosts.by_ip.get(ip, [])
+        elif hostname and not substring:
+            entries = hosts.by_hostname.get(hostname, [])
+        else:
+            entries = hosts.entries
 
+        machines = []
+        for entry in entries:
+            if any and any not in entry.search_key:
+                # "any" was provided but did not match either
+                # hostname, ip or machine_id
+                continue
+            if machine_id and machine_id not in entry.id:
+                continue
+            if hostname:
+                if substring:
+                    h_match = [x for x in entry.hostnames if hostname in x]
                 else:
-                    if machine_id:
-                        if not substring and machine_id == line_id:
-                            return [Machine(self.name, line_id,
-                                            hostname=line_hostname, ip=line_ip)]
-                        if substring and machine_id not in line_id:
-                            # do not append this machine!
-                            continue
-                    if hostname:
-                        if substring:
-                            h_match = len([x for x in line_hostname if hostname in x])
-                        else:
-                            h_match = hostname in line_hostname
-                        if not h_match:
-                            # do not append this machine!
-                            continue
-
-                    if ip and ip != line_ip:
-                        # Do not append this machine!
-                        continue
-
-                machines.append(Machine(self.name, line_id,
-                                        hostname=line_hostname,
-                                        ip=line_ip))
-        finally:
-            f.close()
+                    h_match = hostname in entry.hostnames
+                if not h_match:
+                    continue
+            machines.append(self._machine(entry))
         return machines
 
     def get_machine_id(self, hostname=None, ip=None):
@@ -116,12 +179,16 @@ class HostsMachineResolver(BaseMachineResolver):
         :return: The machine ID, which depends on the resolver
         :rtype: basestring
         """
-        machines = self.get_machines()
-        for machine in machines:
-            h_match = not hostname or machine.has_hostname(hostname)
-            i_match = not ip or machine.has_ip(ip)
-            if h_match and i_match:
-                return machine.id
+        hosts = get_hosts_file(self.filename)
+        if ip:
+            entries = hosts.by_ip.get(netaddr.IPAddress(ip), [])
+        elif hostname:
+            entries = hosts.by_hostname.get(hostname, [])
+        else:
+            entries = hosts.entries
+        for entry in entries:
+            if not hostname or hostname in entry.hostnames:
+                return entry.id
 
         return
 
@@ -33,23 +33,142 @@ This file is tested in tests/test_lib_machine_resolver_ldap.py in the class
 LdapMachineTestCase
 """
 
+import hashlib
+import json
 import netaddr
+import threading
+import time
 import traceback
 import logging
+from collections import OrderedDict
 
 import ldap3
 from ldap3 import Tls
+from ldap3.core.exceptions import LDAPException
 import ssl
 
 from .base import Machine
 from .base import BaseMachineResolver
 from .base import MachineResolverError
+from privacyidea.lib.framework import get_app_local_store
 from privacyidea.lib.utils import is_true
-from privacyidea.lib.resolvers.LDAPIdResolver import AUTHTYPE, DEFAULT_CA_FILE, IdResolver
+from privacyidea.lib.resolvers.LDAPIdResolver import (AUTHTYPE, DEFAULT_CA_FILE, IdResolver,
+                                                     LockingServerPool)
 from privacyidea.lib import _
 
 log = logging.getLogger(__name__)
 
+# The default number of seconds a machine id is cached
+CACHE_TIMEOUT = 120
+# The default number of machine ids, which are cached per resolver
+CACHE_SIZE = 1000
+# The default number of idle connections, which are kept per resolver
+POOL_SIZE = 4
+
+# Protects the replacement of the connection pools
+_pools_lock = threading.Lock()
+
+
+class MachineIdCache(object):
+    """
+    A cache of machine ids, which are looked up by hostname and IP address.
+    Entries expire after ``timeout`` seconds. If the cache contains more than
+    ``size`` entries, the least recently used entries are removed.
+    The numbers of cache hits and misses are counted.
+    """
+
+    def __init__(self, timeout, size):
+        self.timeout = timeout
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: tuple of a flag, if the key was found, and the machine id
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.timeout:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, machine_id):
+        with self._lock:
+            self._entries[key] = (machine_id, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get_info(self):
+        """
+        :return: dict with the number of hits, misses and cached entries
+        """
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "size": len(self._entries)}
+
+
+class LdapConnectionPool(object):
+    """
+    Keeps up to ``size`` idle, bound connections of a machine resolver, so
+    that they can be reused by the following requests. A connection is only
+    used by one thread at a time.
+    """
+
+    def __init__(self, size, server_pool):
+        self.size = size
+        self.server_pool = server_pool
+        self._idle = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def close(connection):
+        try:
+            connection.unbind()
+        except Exception as exx:  # pragma: no cover
+            log.debug("Could not unbind the LDAP connection: {0!r}".format(exx))
+
+    def checkout(self):
+        """
+        :return: an idle connection or None
+        """
+        with self._lock:
+            while self._idle:
+                connection = self._idle.pop()
+                if connection.bound and not connection.closed:
+                    return connection
+                self.close(connection)
+        return None
+
+    def checkin(self, connection):
+        with self._lock:
+            if not self._closed and len(self._idle) < self.size:
+                self._idle.append(connection)
+                return
+        self.close(connection)
+
+    def close_all(self):
+        """
+        Unbind the idle connections. Connections, which are in use, are
+        unbound when they are checked in.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self.close(connection)
+
 
 class LdapMachineResolver(BaseMachineResolver):
 
@@ -61,20 +180,108 @@ class LdapMachineResolver(BaseMachineResolver):
         if config:
             self.load_config(config)
 
-    def _bind(self):
-        if not self.i_am_bound:
-            server_pool = IdResolver.create_serverpool(self.uri, self.timeout,
-                                                       tls_context=self.tls_context)
-            self.l = IdResolver.create_connection(authtype=self.authtype,
+    def _connect(self, server_pool):
+        connection = IdResolver.create_connection(authtype=self.authtype,
                                                   server=server_pool,
                                                   user=self.binddn,
                                                   password=self.bindpw,
                                                   auto_referrals=not self.noreferrals,
                                                   start_tls=self.start_tls)
-            if not self.l.bind():
-                raise Exception("Wrong credentials")
+        if not connection.bind():
+            raise Exception("Wrong credentials")
+        return connection
+
+    def _bind(self):
+        if not self.i_am_bound:
+            server_pool = IdResolver.create_serverpool(self.uri, self.timeout,
+                                                       tls_context=self.tls_context)
+            self.l = self._connect(server_pool)
             self.i_am_bound = True
 
+    def _get_connection_pool(self):
+        """
+        Return the process wide connection pool of this resolver or None, if
+        ``POOL_SIZE`` is 0. If the configuration of the resolver has changed,
+        the connections of the previous pool are closed.
+        """
+        if self.pool_size <= 0:
+            return None
+        pools = get_app_local_store().setdefault("ldap_machine_connection_pools", {})
+        with _pools_lock:
+            config_version, pool = pools.get(self.name, (None, None))
+            if config_version != self.config_version:
+                if pool is not None:
+                    pool.close_all()
+                server_pool = IdResolver.create_serverpool(self.uri, self.timeout,
+                                                           tls_context=self.tls_context,
+                                                           pool_cls=LockingServerPool)
+                pool = LdapConnectionPool(self.pool_size, server_pool)
+                pools[self.name] = (self.config_version, pool)
+        return pool
+
+    def get_cache(self):
+        """
+        Return the process wide cache of machine ids of this resolver or
+        None, if ``CACHE_TIMEOUT`` is 0. If the configuration of the resolver
+        has changed, a new cache is used.
+
+        :rtype: MachineIdCache
+        """
+        if self.cache_timeout <= 0:
+            return None
+        caches = get_app_local_store().setdefault("ldap_machine_caches", {})
+        config_version, cache = caches.get(self.name, (None, None))
+        if config_version != self.config_version:
+            cache = MachineIdCache(self.cache_timeout, self.cache_size)
+            caches[self.name] = (self.config_version, cache)
+        return cache
+
+    def get_cache_info(self):
+        """
+        Return the numbers of cache hits and misses and the number of cached
+        machine ids of this resolver in the current process.
+
+        :return: dict or None, if the cache is disabled
+        """
+        cache = self.get_cache()
+        return cache.get_info() if cache else None
+
+    def _search(self, **kwargs):
+        """
+        Search the LDAP directory with a pooled connection or with the
+        connection of this resolver object.
+
+        :return: the response of the search
+        """
+        pool = self._get_connection_pool()
+        if pool is None:
+            self._bind()
+            self.l.search(**kwargs)
+            return self.l.response
+
+        connection = pool.checkout()
+        try:
+            if connection is None:
+                connection = self._connect(pool.server_pool)
+                connection.search(**kwargs)
+            else:
+                try:
+                    connection.search(**kwargs)
+                except LDAPException as exx:
+                    # The server may have closed the idle connection
+                    log.debug("Reconnecting after failed search with a pooled "
+                              "connection: {0!r}".format(exx))
+                    pool.close(connection)
+                    connection = self._connect(pool.server_pool)
+                    connection.search(**kwargs)
+            response = connection.response
+        except Exception:
+            if connection is not None:
+                pool.close(connection)
+            raise
+        pool.checkin(connection)
+        return response
+
     @staticmethod
     def _get_entry(entry_attribute, entries):
         if type(entries.get(entry_attribute)) == list:
@@ -139,7 +346,6 @@ class LdapMachineResolver(BaseMachineResolver):
         :return: list of Machine Objects
         """
         machines = []
-        self._bind()
         attributes = []
         if self.id_attribute.lower() != "dn":
             attributes.append(self.id_attribute)
@@ -156,20 +362,20 @@ class LdapMachineResolver(BaseMachineResolver):
                                           substring, any)
 
         if self.id_attribute.lower() == "dn" and machine_id:
-            self.l.search(search_base=machine_id,
-                          search_scope=ldap3.BASE,
-                          search_filter=filter,
-                          attributes=attributes,
-                          paged_size=self.sizelimit)
+            response = self._search(search_base=machine_id,
+                                    search_scope=ldap3.BASE,
+                                    search_filter=filter,
+                                    attributes=attributes,
+                                    paged_size=self.sizelimit)
         else:
-            self.l.search(search_base=self.basedn,
-                          search_scope=ldap3.SUBTREE,
-                          search_filter=filter,
-                          attributes=attributes,
-                          paged_size=self.sizelimit)
+            response = self._search(search_base=self.basedn,
+                                    search_scope=ldap3.SUBTREE,
+                                    search_filter=filter,
+                                    attributes=attributes,
+                                    paged_size=self.sizelimit)
 
         # returns a list of dictionaries
-        for entry in self.l.response:
+        for entry in response:
             dn = entry.get("dn")
             attributes = entry.get("attributes")
 
@@ -215,6 +421,14 @@ class LdapMachineResolver(BaseMachineResolver):
         :rtype: basestring
         """
         machine_id = None
+        cache = self.get_cache()
+        key = (hostname, "{0!s}".format(ip) if ip else None)
+        if cache:
+            found, machine_id = cache.get(key)
+            if found:
+                log.debug("Reading machine id for {0!r} from cache: "
+                          "{1!r}".format(key, cache.get_info()))
+                return machine_id
         machines = self.get_machines(hostname=hostname, ip=ip)
         if len(machines) > 1:
             raise Exception("More than one machine found in LDAP resolver {0!s}".format(
@@ -222,6 +436,8 @@ class LdapMachineResolver(BaseMachineResolver):
 
         if len(machines) == 1:
             machine_id = machines[0].id
+        if cache:
+            cache.set(key, machine_id)
         return machine_id
 
     def load_config(self, config):
@@ -254,6 +470,13 @@ class LdapMachineResolver(BaseMachineResolver):
         self.ip_attribute = config.get("IPATTRIBUTE")
         self.search_filter = config.get("SEARCHFILTER",
                                         "(objectClass=computer)")
+        self.cache_timeout = int(config.get("CACHE_TIMEOUT", CACHE_TIMEOUT))
+        self.cache_size = int(config.get("CACHE_SIZE", CACHE_SIZE))
+        self.pool_size = int(config.get("POOL_SIZE", POOL_SIZE))
+        # The pooled connections and the cache of a resolver are replaced,
+        # when its configuration changes
+        self.config_version = hashlib.sha256(json.dumps([self.name, config], sort_keys=True,
+                                                        default=str).encode("utf8")).hexdigest()
 
         self.noreferrals = is_true(config.get("NOREFERRALS", False))
         self.authtype = config.get("AUTHTYPE", AUTHTYPE.SIMPLE)
@@ -284,7 +507,10 @@ class LdapMachineResolver(BaseMachineResolver):
                                              "AUTHTYPE": "string",
                                              "TLS_VERIFY": "bool",
                                              "TLS_CA_FILE": "string",
-                                             "START_TLS": "bool"
+                                             "START_TLS": "bool",
+                                             "CACHE_TIMEOUT": "int",
+                                             "CACHE_SIZE": "int",
+                                             "POOL_SIZE": "int"
                                              }}}
 
         return description
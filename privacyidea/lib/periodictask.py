@@ -29,6 +29,7 @@ from dateutil.tz import tzutc, tzlocal
 from privacyidea.lib.error import ParameterError, ResourceNotFoundError
 from privacyidea.lib.utils import fetch_one_resource, parse_date
 from privacyidea.lib.task.eventcounter import EventCounterTask
+from privacyidea.lib.task.challengecleanup import ChallengeCleanupTask
 from privacyidea.lib.task.simplestats import SimpleStatsTask
 from privacyidea.models import PeriodicTask
 from privacyidea.lib.framework import get_app_config
@@ -36,7 +37,7 @@ from privacyidea.lib.utils.export import (register_import, register_export)
 
 log = logging.getLogger(__name__)
 
-TASK_CLASSES = [EventCounterTask, SimpleStatsTask]
+TASK_CLASSES = [EventCounterTask, SimpleStatsTask, ChallengeCleanupTask]
 #: TASK_MODULES maps task module identifiers to subclasses of BaseTask
 TASK_MODULES = dict((cls.identifier, cls) for cls in TASK_CLASSES)
 
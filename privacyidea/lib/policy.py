@@ -176,6 +176,7 @@ from privacyidea.lib.config import (get_token_classes, get_token_types,
                                     get_multichallenge_enrollable_tokentypes,
                                     get_email_validators)
 from privacyidea.lib.error import ParameterError, PolicyError, ResourceNotFoundError, ServerError
+from privacyidea.lib.framework import get_request_local_store
 from privacyidea.lib.realm import get_realms
 from privacyidea.lib.resolver import get_resolver_list
 from privacyidea.lib.smtpserver import get_smtpservers
@@ -187,7 +188,7 @@ from privacyidea.lib.utils.compare import compare_values, COMPARATOR_DESCRIPTION
 from privacyidea.lib.utils.export import (register_import, register_export)
 from privacyidea.lib.user import User
 from privacyidea.lib import _
-from netaddr import AddrFormatError
+from netaddr import AddrFormatError, IPAddress, IPNetwork
 from privacyidea.lib.error import privacyIDEAError
 import re
 import ast
@@ -500,6 +501,212 @@ class CONDITION_CHECK(object):
     CHECK_AND_RAISE_EXCEPTION_ON_MISSING = None
 
 
+# Characters which turn a policy value into a regular expression. Values
+# without any of these characters can only match by equality.
+REGEX_CHARACTERS = set(".^$*+?{}[]\\|()")
+
+
+def _is_literal(value):
+    """
+    :return: True, if the given policy value can only match by equality
+    """
+    return not REGEX_CHARACTERS.intersection(value)
+
+
+class PolicyIndex(object):
+    """
+    A compiled, read-only index over the list of policy dictionaries of
+    one configuration snapshot.
+
+    The index is built once whenever the shared config object reloads the
+    policies from the database and is then shared by all requests which use
+    this snapshot. It contains
+
+     * the positions of the policies bucketed by name, scope and action,
+     * precompiled regular expressions for all user, realm and resolver values and
+     * the client definitions of the policies parsed to integer ranges.
+
+    ``PolicyClass.list_policies`` uses the index to reduce the policies to
+    a small list of candidates before the remaining attributes are matched.
+    """
+
+    def __init__(self, policies):
+        self.policies = policies
+        self.patterns = {}
+        self._by_name = {}
+        self._by_scope = {None: []}
+        # scope -> action -> list of positions. The scope None contains all scopes.
+        self._by_action = {None: {}}
+        # scope -> list of positions of policies which need to be checked for every action
+        self._any_action = {None: []}
+        # id(policy) -> (included ranges, excluded ranges)
+        self._client_ranges = {}
+
+        for position, policy in enumerate(policies):
+            scope = policy.get("scope")
+            self._by_name.setdefault(policy.get("name"), []).append(position)
+            self._by_scope[None].append(position)
+            self._by_scope.setdefault(scope, []).append(position)
+            actions = policy.get("action") or {}
+            if not actions or not all(_is_literal(a) for a in actions):
+                # The policy either matches all actions or contains
+                # regular expressions or wildcards.
+                for key in (None, scope):
+                    self._any_action.setdefault(key, []).append(position)
+            else:
+                for action in actions:
+                    for key in (None, scope):
+                        self._by_action.setdefault(key, {}).setdefault(action, []).append(position)
+
+            for searchkey in ["realm", "adminrealm", "user", "adminuser", "resolver"]:
+                for value in policy.get(searchkey) or []:
+                    self._compile(value)
+                    if searchkey in ["user", "adminuser"] and policy.get("user_case_insensitive"):
+                        self._compile(value.lower())
+
+            self._parse_client(policy)
+
+    def _compile(self, value):
+        """
+        Compile the policy value to a regular expression, which matches the
+        complete search value. Invalid regular expressions are not added, so
+        that they fail at matching time just like before.
+        """
+        if value not in self.patterns:
+            try:
+                self.patterns[value] = re.compile("^{0!s}$".format(value))
+            except re.error:
+                log.debug("Can not compile policy value {0!r}.".format(value))
+
+    def _parse_client(self, policy):
+        """
+        Parse the client definition of a policy to lists of integer ranges
+        ``(version, first, last)`` of included and excluded clients.
+        """
+        included = []
+        excluded = []
+        try:
+            for ipdef in filter(None, policy.get("client") or []):
+                if ipdef[0] in ['-', '!']:
+                    network = IPNetwork(ipdef[1:])
+                    excluded.append((network.version, network.first, network.last))
+                else:
+                    network = IPNetwork(ipdef)
+                    included.append((network.version, network.first, network.last))
+        except (AddrFormatError, ValueError, TypeError):
+            # We can not parse the client definition. The policy is checked
+            # with check_ip_in_policy at matching time.
+            log.debug("Can not parse client definition of policy {0!s}.".format(policy.get("name")))
+            return
+        self._client_ranges[id(policy)] = (included, excluded)
+
+    def candidates(self, name=None, active=None, scope=None, action=None):
+        """
+        Return the policies matching the given name, active state and scope
+        exactly, in their original order. If an action is given, only policies
+        which could contain this action are returned. The caller still needs
+        to check the action of the returned policies.
+
+        :return: list of policy dictionaries
+        """
+        if name is not None:
+            positions = self._by_name.get(name, [])
+        elif isinstance(action, str):
+            positions = sorted(self._by_action.get(scope, {}).get(action, []) +
+                               self._any_action.get(scope, []))
+        else:
+            positions = self._by_scope.get(scope, [])
+
+        policies = [self.policies[position] for position in positions]
+        for searchkey, searchvalue in [("name", name), ("active", active), ("scope", scope)]:
+            if searchvalue is not None:
+                policies = [policy for policy in policies if policy.get(searchkey) == searchvalue]
+        return policies
+
+    def check_client(self, client_ip, client, policy):
+        """
+        Check if the client IP is contained in the client definition of
+        the policy. This is the indexed version of ``check_ip_in_policy``.
+
+        :param client_ip: A function returning the parsed IPAddress of the client
+        :param client: The client IP as string
+        :param policy: The policy dictionary
+        :return: tuple of (found, excluded)
+        """
+        ranges = self._client_ranges.get(id(policy))
+        if ranges is None:
+            return check_ip_in_policy(client, policy.get("client"))
+        included, excluded = ranges
+        if not included and not excluded:
+            return False, False
+        ip = client_ip()
+        client_found = any(version == ip.version and first <= ip.value <= last
+                           for version, first, last in included)
+        client_excluded = any(version == ip.version and first <= ip.value <= last
+                              for version, first, last in excluded)
+        return client_found, client_excluded
+
+
+class PolicyMatchCache(object):
+    """
+    A request-local cache of policy matching results.
+
+    The cache is stored in the request-local store next to the request-local
+    config object and is only valid for this very config object. It maps the
+    normalized matching arguments to the list of matching policies.
+    Results which contain policies with a time or with conditions are not cached,
+    since these depend on the current time, the request headers or the token.
+    """
+
+    def __init__(self, config_object):
+        self.config_object = config_object
+        self._results = {}
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def get(self, key):
+        """
+        :return: a copy of the cached list of policies or None
+        """
+        if key in self._results:
+            self.hits += 1
+            return list(self._results[key])
+        return None
+
+    def add(self, key, policies):
+        """
+        Add the list of policies to the cache, if it does not depend on
+        the time or on conditions.
+        """
+        if any(policy.get("time") or policy.get("conditions") for policy in policies):
+            self.bypassed += 1
+        else:
+            self.misses += 1
+            self._results[key] = list(policies)
+
+    def statistics(self):
+        """
+        :return: a dictionary with the number of hits, misses and bypassed results
+        """
+        return {"hits": self.hits, "misses": self.misses, "bypassed": self.bypassed}
+
+
+def get_policy_match_cache():
+    """
+    Return the request-local policy match cache. If it does not exist yet or
+    if it belongs to an outdated request-local config object, create it.
+
+    :return: a ``PolicyMatchCache`` object
+    """
+    store = get_request_local_store()
+    config_object = get_config_object()
+    cache = store.get("policy_match_cache")
+    if cache is None or cache.config_object is not config_object:
+        cache = store["policy_match_cache"] = PolicyMatchCache(config_object)
+    return cache
+
+
 class PolicyClass(object):
     """
     A policy object can be used to query the current set of policies.
@@ -520,8 +727,18 @@ class PolicyClass(object):
         """
         return get_config_object().policies
 
+    @property
+    def policy_index(self):
+        """
+        Shorthand to retrieve the compiled policy index of the request-local config object
+        """
+        config_object = get_config_object()
+        if config_object.policy_index is None:
+            config_object.policy_index = PolicyIndex(config_object.policies)
+        return config_object.policy_index
+
     @classmethod
-    def _search_value(cls, policy_attributes, searchvalue):
+    def _search_value(cls, policy_attributes, searchvalue, patterns=None):
         """
         Searches a given value in a policy attribute. The policy_attribute is
         a list like searching the resolver name "resolver1" in the given
@@ -534,6 +751,8 @@ class PolicyClass(object):
 
         :param policy_attributes:
         :param searchvalue:
+        :param patterns: A dictionary of precompiled regular expressions
+            for the policy values, see ``PolicyIndex``.
         :return: tuple of value_found and value_excluded
         """
         value_found = False
@@ -551,7 +770,11 @@ class PolicyClass(object):
                 # Do not do this search style for resolvers, which come as a list
                 # check regular expression only for exact matches
                 # avoid matching user1234 -> user1
-                if re.search("^{0!s}$".format(value), searchvalue):
+                pattern = patterns.get(value) if patterns else None
+                if pattern is not None:
+                    if pattern.search(searchvalue):
+                        value_found = True
+                elif re.search("^{0!s}$".format(value), searchvalue):
                     value_found = True
 
         return value_found, value_excluded
@@ -595,17 +818,15 @@ class PolicyClass(object):
         :return: list of policies
         :rtype: list of dicts
         """
-        reduced_policies = self.policies
+        index = self.policy_index
+        patterns = index.patterns
 
         # Do exact matches for "name", "active" and "scope", as these fields
-        # can only contain one entry
-        p = [("name", name), ("active", active), ("scope", scope)]
-        for searchkey, searchvalue in p:
-            if searchvalue is not None:
-                reduced_policies = [policy for policy in reduced_policies if
-                                    policy.get(searchkey) == searchvalue]
-                log.debug("Policies after matching {1!s}={2!s}: {0!s}".format(
-                    reduced_policies, searchkey, searchvalue))
+        # can only contain one entry. The index also reduces the policies to
+        # the ones, which could contain the action.
+        reduced_policies = index.candidates(name=name, active=active, scope=scope, action=action)
+        log.debug("Policies after matching name={1!s}, active={2!s}, scope={3!s}: {0!s}".format(
+            reduced_policies, name, active, scope))
 
         p = [("action", action), ("realm", realm)]
         q = [("user", user)]
@@ -626,7 +847,7 @@ class PolicyClass(object):
                         new_policies.append(policy)
                     else:
                         value_found, value_excluded = self._search_value(
-                            policy.get(searchkey), searchvalue)
+                            policy.get(searchkey), searchvalue, patterns)
                         if value_found and not value_excluded:
                             new_policies.append(policy)
                 reduced_policies = new_policies
@@ -650,7 +871,7 @@ class PolicyClass(object):
                         if policy.get("user_case_insensitive"):
                             current_searchvalue = current_searchvalue.lower()
                             searchkeys = [x.lower() for x in searchkeys]
-                        value_found, value_excluded = self._search_value(searchkeys, current_searchvalue)
+                        value_found, value_excluded = self._search_value(searchkeys, current_searchvalue, patterns)
                         if value_found and not value_excluded:
                             new_policies.append(policy)
                 reduced_policies = new_policies
@@ -674,7 +895,7 @@ class PolicyClass(object):
                                                   realm=realm).get_ordered_resolvers()
                         for reso in user_resolvers:
                             value_found, _v_ex = self._search_value(
-                                policy.get("resolver"), reso)
+                                policy.get("resolver"), reso, patterns)
                             if value_found:
                                 new_policies.append(policy)
                                 break
@@ -684,7 +905,7 @@ class PolicyClass(object):
                     new_policies.append(policy)
                 else:
                     value_found, _v_ex = self._search_value(
-                        policy.get("resolver"), resolver)
+                        policy.get("resolver"), resolver, patterns)
                     if value_found:
                         new_policies.append(policy)
 
@@ -716,10 +937,18 @@ class PolicyClass(object):
             if not client:
                 raise ParameterError("client argument must be a non-empty string")
 
+            client_ip = []
+
+            def get_client_ip():
+                # The client IP is only parsed once and only if a policy defines clients
+                if not client_ip:
+                    client_ip.append(IPAddress(client))
+                return client_ip[0]
+
             new_policies = []
             for policy in reduced_policies:
                 log.debug("checking client ip in policy {0!s}.".format(policy))
-                client_found, client_excluded = check_ip_in_policy(client, policy.get("client"))
+                client_found, client_excluded = index.check_client(get_client_ip, client, policy)
                 if client_found and not client_excluded:
                     # The client was contained in the defined subnets and was
                     #  not excluded
@@ -799,10 +1028,32 @@ class PolicyClass(object):
             realm = user_object.realm
             resolver = user_object.resolver
 
+        # Within a request the same policies are matched many times. Results which neither
+        # depend on the time nor on conditions are taken from the request-local cache.
+        cache = get_policy_match_cache()
+        cache_key = (name, scope, realm, active, resolver, user, client, action,
+                     adminrealm, adminuser, pinode, sort_by_priority)
+        try:
+            reduced_policies = cache.get(cache_key)
+        except TypeError:
+            # unhashable arguments like a list of resolvers are not cached
+            cache_key = None
+            reduced_policies = None
+
+        if reduced_policies is not None:
+            log.debug("Policies taken from the request-local cache: {0!s}".format(
+                [p.get("name") for p in reduced_policies]))
+            if audit_data is not None:
+                for p in reduced_policies:
+                    audit_data.setdefault("policies", []).append(p.get("name"))
+            return reduced_policies
+
         reduced_policies = self.list_policies(name=name, scope=scope, realm=realm, active=active,
                                               resolver=resolver, user=user, client=client, action=action,
                                               adminrealm=adminrealm, adminuser=adminuser, pinode=pinode,
                                               sort_by_priority=sort_by_priority)
+        if cache_key is not None:
+            cache.add(cache_key, reduced_policies)
 
         # filter policy for time. If no time is set or is a time is set and
         # it matches the time_range, then we add this policy
@@ -1454,7 +1705,7 @@ def set_policy(name=None, scope=None, action=None, realm=None, resolver=None,
         p1.user_case_insensitive = user_case_insensitive
         if conditions is not None:
             p1.set_conditions(conditions)
-        save_config_timestamp()
+        save_config_timestamp(sections=["policy"])
         db.session.commit()
         ret = p1.id
     else:
@@ -21,6 +21,9 @@ This module implements a so-called engine registry which manages
 the SQLAlchemy engines used for connections to external SQL databases
 by the SQL audit module and SQLIdResolver.
 
+It also implements a registry of reflected tables, so that the SQLIdResolver
+does not need to read the table schema from the database on every request.
+
 There should only be one shared registry per application which is
 used by all threads. This is necessary to properly implement pooling.
 
@@ -123,4 +126,70 @@ def get_engine(key, creator):
     Shortcut to get an engine from the application-global engine registry.
     :return: an SQLAlchemy engine
     """
-    return get_registry().get_engine(key, creator)
\ No newline at end of file
+    return get_registry().get_engine(key, creator)
+
+
+class TableRegistry(object):
+    """
+    A registry which holds a dictionary mapping a key to a reflected SQLAlchemy
+    table. The key should contain everything the table depends on, e.g. the
+    database, the table name and a version of the resolver configuration,
+    so that the table is reflected again if the configuration changes.
+    The table of a previous configuration is removed with ``invalidate``.
+    """
+    def __init__(self):
+        self._table_lock = Lock()
+        self._tables = {}
+
+    def get_table(self, key, creator):
+        """
+        Return the table associated with the key ``key``.
+        :param key: An arbitrary hashable Python object
+        :param creator: A function with no arguments which returns a new SQLAlchemy table.
+                        Called to reflect the table, if it is not contained in the registry.
+        :return: an SQLAlchemy table
+        """
+        with self._table_lock:
+            table = self._tables.get(key)
+        if table is not None:
+            return table
+        # We do not hold the lock while reflecting the table, since this
+        # requires several queries to the database. If two threads reflect
+        # the same table concurrently, the last one wins.
+        log.debug("Reflecting the table for key {!s}".format(key))
+        table = creator()
+        with self._table_lock:
+            self._tables[key] = table
+        return table
+
+    def invalidate(self, key=None):
+        """
+        Remove the table with the key ``key`` or all tables from the registry.
+        :param key: An arbitrary hashable Python object or None
+        """
+        with self._table_lock:
+            if key is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(key, None)
+
+
+def get_table_registry():
+    """
+    Return the ``TableRegistry`` object associated with the current application.
+    If there is no such object yet, create one and write it to the app-local store.
+    :return: a ``TableRegistry`` object
+    """
+    app_store = get_app_local_store()
+    try:
+        return app_store["table_registry"]
+    except KeyError:
+        return app_store.setdefault("table_registry", TableRegistry())
+
+
+def get_table(key, creator):
+    """
+    Shortcut to get a table from the application-global table registry.
+    :return: an SQLAlchemy table
+    """
+    return get_table_registry().get_table(key, creator)
@@ -266,7 +266,7 @@ def set_realm(realm, resolvers=None):
     # if this is the first realm, make it the default
     if Realm.query.count() == 1:
         db_realm.default = True
-        save_config_timestamp()
+        save_config_timestamp(sections=["realm"])
         db.session.commit()
 
     return added, failed
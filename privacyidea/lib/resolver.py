@@ -43,12 +43,18 @@ config.py, so this can be tested standalone without realms, tokens and
 webservice!
 """
 
+import hashlib
+import json
 import logging
+import threading
+import time
 
 from .log import log_with
 from .config import (get_resolver_types, get_resolver_classes, get_config_object)
 from privacyidea.lib.usercache import delete_user_cache
-from privacyidea.lib.framework import get_request_local_store
+from privacyidea.lib.framework import (get_request_local_store, get_app_local_store,
+                                       get_app_config_value)
+from privacyidea.lib.lifecycle import register_finalizer
 from ..models import (Resolver,
                       ResolverConfig)
 from ..api.lib.utils import required
@@ -64,6 +70,132 @@ import copy
 CENSORED = "__CENSORED__"
 log = logging.getLogger(__name__)
 
+RESOLVER_POOL_SIZE = "PI_RESOLVER_POOL_SIZE"
+RESOLVER_POOL_IDLE_TIMEOUT = "PI_RESOLVER_POOL_IDLE_TIMEOUT"
+
+
+class ResolverPool(object):
+    """
+    Process wide pool of resolver objects with a loaded configuration.
+
+    A request checks out a resolver object and returns it at the end of the
+    request, so that a resolver object is only used by one thread at a time.
+    Thus e.g. an LDAP resolver keeps its bound connection between requests.
+
+    The resolver objects are stored per resolver name and a version of the
+    resolver configuration. If the configuration changes, the old resolver
+    objects are discarded. Only resolver classes with ``poolable = True``
+    are pooled.
+    """
+
+    def __init__(self, size=10, idle_timeout=60):
+        """
+        :param size: maximum number of idle resolver objects per resolver
+        :param idle_timeout: idle resolver objects are discarded after
+            this number of seconds
+        """
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # resolvername -> (config version, list of (resolver object, last used))
+        self._idle = {}
+
+    @staticmethod
+    def _close(r_obj):
+        try:
+            r_obj.close()
+        except Exception as exx:  # pragma: no cover
+            log.debug("Could not close resolver object: {0!r}".format(exx))
+
+    def checkout(self, resolvername, version):
+        """
+        Get an idle resolver object for the given configuration version.
+
+        :return: a resolver object or None
+        """
+        discarded = []
+        r_obj = None
+        with self._lock:
+            idle_version, idle = self._idle.get(resolvername, (version, []))
+            if idle_version != version:
+                # The configuration has changed
+                discarded.extend(o for o, _last_used in idle)
+                idle = []
+                del self._idle[resolvername]
+            now = time.monotonic()
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used > self.idle_timeout:
+                    discarded.append(candidate)
+                else:
+                    r_obj = candidate
+                    break
+        for obj in discarded:
+            self._close(obj)
+        if r_obj is not None and not r_obj.is_healthy():
+            log.debug("Discarding unhealthy resolver object {0!s}.".format(resolvername))
+            self._close(r_obj)
+            r_obj = None
+        if r_obj is not None:
+            r_obj.reuse()
+        return r_obj
+
+    def checkin(self, resolvername, version, r_obj):
+        """
+        Return the resolver object to the pool.
+        """
+        discarded = None
+        with self._lock:
+            idle_version, idle = self._idle.setdefault(resolvername, (version, []))
+            if idle_version != version:
+                discarded = r_obj
+            else:
+                idle.append((r_obj, time.monotonic()))
+                if len(idle) > self.size:
+                    discarded = idle.pop(0)[0]
+        if discarded is not None:
+            self._close(discarded)
+
+    def invalidate(self, resolvername=None):
+        """
+        Discard the idle resolver objects of the given resolver or of all
+        resolvers.
+        """
+        with self._lock:
+            if resolvername is None:
+                removed = list(self._idle.values())
+                self._idle = {}
+            else:
+                removed = [self._idle.pop(resolvername, (None, []))]
+        for _version, idle in removed:
+            for r_obj, _last_used in idle:
+                self._close(r_obj)
+
+
+def get_resolver_pool():
+    """
+    Return the process wide resolver pool of the current application.
+
+    :return: a :class:`ResolverPool` object or None, if ``PI_RESOLVER_POOL_SIZE``
+        is not set
+    """
+    size = int(get_app_config_value(RESOLVER_POOL_SIZE, 0))
+    if size <= 0:
+        return None
+    app_store = get_app_local_store()
+    if "resolver_pool" not in app_store:
+        idle_timeout = int(get_app_config_value(RESOLVER_POOL_IDLE_TIMEOUT, 60))
+        app_store.setdefault("resolver_pool", ResolverPool(size, idle_timeout))
+    return app_store["resolver_pool"]
+
+
+def _get_config_version(resolver_type, resolver_config):
+    """
+    :return: a fingerprint of the resolver configuration
+    """
+    data = json.dumps([resolver_type, resolver_config], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf8")).hexdigest()
+
 
 # Hide the keyswords BINDPW and Password in params
 @log_with(log, hide_args_keywords={0: ["BINDPW", "Password"]})
@@ -118,6 +250,7 @@ def save_resolver(params):
 
     # Everything passed. So lets actually create the resolver in the DB
     if update_resolver:
+        previous_config = get_resolver_config(resolvername)
         resolver_id = Resolver.query.filter(func.lower(Resolver.name) ==
                                             resolvername.lower()).first().id
     else:
@@ -140,6 +273,11 @@ def save_resolver(params):
 
     # Remove corresponding entries from the user cache
     delete_user_cache(resolver=resolvername)
+    resolver_pool = get_resolver_pool()
+    if resolver_pool:
+        resolver_pool.invalidate(resolvername)
+    if update_resolver:
+        get_resolver_class(resolvertype).invalidate_config(previous_config)
 
     return resolver_id
 
@@ -217,6 +355,8 @@ def delete_resolver(resolvername):
     """
     ret = -1
 
+    resolver_class = get_resolver_class(get_resolver_type(resolvername))
+    previous_config = get_resolver_config(resolvername)
     reso = Resolver.query.filter_by(name=resolvername).first()
     if reso:
         if reso.realm_list:
@@ -234,6 +374,11 @@ def delete_resolver(resolvername):
 
     # Remove corresponding entries from the user cache
     delete_user_cache(resolver=resolvername)
+    resolver_pool = get_resolver_pool()
+    if resolver_pool:
+        resolver_pool.invalidate(resolvername)
+    if resolver_class and previous_config:
+        resolver_class.invalidate_config(previous_config)
 
     return ret
 
@@ -316,6 +461,9 @@ def get_resolver_object(resolvername):
     Return the cached resolver object for the given resolver name (stored in the request context).
     If no resolver object is cached, create it and add it to the cache.
 
+    If the resolver pool is enabled, the resolver object is taken from the
+    pool and returned to the pool at the end of the request.
+
     :param resolvername: the resolver string as from the token including
                          the config as last part
     :return: instance of the resolver with the loaded config
@@ -333,11 +481,19 @@ def get_resolver_object(resolvername):
             store['resolver_objects'] = {}
         resolver_objects = store['resolver_objects']
         if resolvername not in resolver_objects:
-            # create the resolver instance and load the config
-            r_obj = resolver_objects[resolvername] = r_obj_class()
-            if r_obj is not None:
-                resolver_config = get_resolver_config(resolvername)
+            resolver_config = get_resolver_config(resolvername)
+            resolver_pool = get_resolver_pool() if r_obj_class.poolable else None
+            r_obj = None
+            if resolver_pool:
+                version = _get_config_version(r_type, resolver_config)
+                r_obj = resolver_pool.checkout(resolvername, version)
+            if r_obj is None:
+                # create the resolver instance and load the config
+                r_obj = r_obj_class()
                 r_obj.loadConfig(resolver_config)
+            resolver_objects[resolvername] = r_obj
+            if resolver_pool:
+                register_finalizer(lambda: resolver_pool.checkin(resolvername, version, r_obj))
         return resolver_objects[resolvername]
 
 @log_with(log)
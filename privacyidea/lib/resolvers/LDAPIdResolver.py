@@ -68,7 +68,7 @@ from .UserIdResolver import UserIdResolver
 import ldap3
 from ldap3 import MODIFY_REPLACE, MODIFY_ADD, MODIFY_DELETE
 from ldap3 import Tls
-from ldap3.core.exceptions import LDAPOperationResult
+from ldap3.core.exceptions import LDAPOperationResult, LDAPException
 from ldap3.core.results import RESULT_SIZE_LIMIT_EXCEEDED
 import ssl
 
@@ -287,6 +287,33 @@ def cache(func):
     return cache_wrapper
 
 
+def retry_pooled_connection(func):
+    """
+    A resolver object, which is taken from the resolver pool, may hold a
+    connection, which was closed by the server or a firewall in the meantime.
+    If the first LDAP operation of such an object fails, the connection is
+    discarded and the operation is retried once with a new connection.
+    """
+    @functools.wraps(func)
+    def retry_wrapper(self, *args, **kwds):
+        if not self._check_pooled_connection:
+            return func(self, *args, **kwds)
+        self._check_pooled_connection = False
+        try:
+            return func(self, *args, **kwds)
+        except LDAPException as exx:
+            log.info("The LDAP connection of the pooled resolver failed: {0!r}. "
+                     "Binding again.".format(exx))
+            log.debug("{0!s}".format(traceback.format_exc()))
+            try:
+                self.close()
+            except LDAPException:  # pragma: no cover
+                pass
+            return func(self, *args, **kwds)
+
+    return retry_wrapper
+
+
 class AUTHTYPE(object):
     SIMPLE = "Simple"
     SASL_DIGEST_MD5 = "SASL Digest-MD5"
@@ -298,9 +325,12 @@ class IdResolver (UserIdResolver):
 
     # If the resolver could be configured editable
     updateable = True
+    poolable = True
 
     def __init__(self):
         self.i_am_bound = False
+        # Set, if the resolver object has been taken from the resolver pool
+        self._check_pooled_connection = False
         self.uri = ""
         self.basedn = ""
         self.binddn = ""
@@ -486,6 +516,7 @@ class IdResolver (UserIdResolver):
         return userId
 
     @cache
+    @retry_pooled_connection
     def _getDN(self, userId):
         """
         This function returns the DN of a userId.
@@ -538,6 +569,30 @@ class IdResolver (UserIdResolver):
                 raise Exception("Wrong credentials")
             self.i_am_bound = True
 
+    def close(self):
+        """
+        Unbind the connection to the LDAP server
+        """
+        if self.i_am_bound:
+            self.i_am_bound = False
+            self.l.unbind()
+
+    def is_healthy(self):
+        """
+        A pooled resolver object can be reused, if it is not bound yet or if
+        the connection is still bound.
+        """
+        if not self.i_am_bound:
+            return True
+        return bool(self.l.bound and not self.l.closed)
+
+    def reuse(self):
+        """
+        The connection may have been closed by the server without notice,
+        so the first LDAP operation is retried once.
+        """
+        self._check_pooled_connection = self.i_am_bound
+
     @staticmethod
     def _get_tls_context(ldap_uri=None, start_tls=False, tls_version=None, tls_verify=None,
                          tls_ca_file=None, tls_options=None):
@@ -566,6 +621,7 @@ class IdResolver (UserIdResolver):
         return tls_context
 
     @cache
+    @retry_pooled_connection
     def getUserInfo(self, userId):
         """
         This function returns all user info for a given userid/object.
@@ -648,6 +704,7 @@ class IdResolver (UserIdResolver):
         return info.get('username', "")
 
     @cache
+    @retry_pooled_connection
     def getUserId(self, LoginName):
         """
         resolve the loginname to the userid.
@@ -713,6 +770,7 @@ class IdResolver (UserIdResolver):
 
         return userid
 
+    @retry_pooled_connection
     def getUserList(self, searchDict=None):
         """
         :param searchDict: A dictionary with search parameters
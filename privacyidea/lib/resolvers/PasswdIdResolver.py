@@ -43,6 +43,9 @@ import os
 import logging
 import crypt
 import codecs
+import threading
+from bisect import bisect_left
+from collections import namedtuple
 
 from privacyidea.lib.utils import to_bytes, convert_column_to_unicode
 from .UserIdResolver import UserIdResolver
@@ -51,6 +54,118 @@ log = logging.getLogger(__name__)
 ENCODING = "utf-8"
 
 
+# The fields of a line in the passwd file
+NAME = 0
+PASS = 1
+ID = 2
+DESCRIPTION = 4
+
+#: One user of a passwd file. ``fields`` contains the fields of the line in the file.
+PasswdUser = namedtuple("PasswdUser", ["fields", "givenname", "surname",
+                                       "mobile", "phone", "email"])
+
+# The parsed passwd files of this process: file name -> (file stamp, PasswdFile)
+_PASSWD_FILES = {}
+_PASSWD_FILES_LOCK = threading.Lock()
+
+
+class PasswdFile(object):
+    """
+    The parsed users of a passwd file. The object is not changed after it
+    was created, so that it can be shared between threads.
+    """
+
+    def __init__(self, filename):
+        #: userid -> PasswdUser
+        self.users = {}
+        #: username -> userid
+        self.userids = {}
+        log.info('loading users from file {0!s} from within {1!r}'.format(filename,
+                                                                         os.getcwd()))
+        with codecs.open(filename, "r", ENCODING) as fileHandle:
+            for line in fileHandle:
+                line = line.strip()
+                if not line:
+                    # continue on an empty line
+                    continue
+
+                fields = line.split(":", 7)
+                self.userids[fields[NAME]] = fields[ID]
+                self.users[fields[ID]] = self._parse_user(fields)
+
+        #: userid -> position of the user in the file
+        self.positions = {uid: position for position, uid in enumerate(self.users)}
+        #: sorted list of (lower case username, userid) for searches by username
+        self.username_index = sorted((user.fields[NAME].lower(), uid)
+                                     for uid, user in self.users.items())
+
+    @staticmethod
+    def _parse_user(fields):
+        # get surname, givenname and phones from the description
+        descriptions = fields[DESCRIPTION].split(",")
+        names = descriptions[0].split(' ', 1)
+        givenname = names[0]
+        surname = mobile = phone = email = ""
+        if len(names) >= 2:
+            surname = names[1]
+        if len(descriptions) >= 4:
+            mobile = descriptions[2]
+            phone = descriptions[3]
+        if len(descriptions) >= 5:
+            for field in descriptions[4:]:
+                # very basic e-mail regex
+                email_match = re.search(r'.+@.+\..+', field)
+                if email_match:
+                    email = email_match.group(0)
+        return PasswdUser(fields, givenname, surname, mobile, phone, email)
+
+    def find_usernames(self, pattern):
+        """
+        Return the userids of the users, whose username matches the given
+        pattern, if the pattern can be looked up in the username index.
+        This is the case for an exact pattern or a pattern with a trailing "*".
+
+        :param pattern: The search pattern for the username
+        :return: list of userids in the order of the file or None
+        """
+        pattern = pattern.lower()
+        if pattern.startswith("*"):
+            return None
+        prefix = pattern[:-1] if pattern.endswith("*") else pattern
+        userids = []
+        for name, uid in self.username_index[bisect_left(self.username_index, (prefix,)):]:
+            if not name.startswith(prefix):
+                break
+            if name == pattern or pattern.endswith("*"):
+                userids.append(uid)
+        return sorted(set(userids), key=self.positions.get)
+
+
+def get_passwd_file(filename):
+    """
+    Return the parsed passwd file. The parsed file is shared within the
+    process and only read again, if the modification time, the size or the
+    inode of the file changes.
+
+    :param filename: The name of the passwd file
+    :return: the parsed file
+    :rtype: PasswdFile
+    """
+    filename = os.path.abspath(filename)
+    # We take the stamp before reading the file. If the file changes while
+    # it is read, it is read again on the next call.
+    stat = os.stat(filename)
+    stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    with _PASSWD_FILES_LOCK:
+        entry = _PASSWD_FILES.get(filename)
+    if entry and entry[0] == stamp:
+        return entry[1]
+    passwd_file = PasswdFile(filename)
+    with _PASSWD_FILES_LOCK:
+        _PASSWD_FILES[filename] = (stamp, passwd_file)
+    return passwd_file
+
+
 def tokenise(r):
     def _(s):
         ret = None
@@ -103,15 +218,7 @@ class IdResolver (UserIdResolver):
         self.fileName = ""
 
         self.name = "P"
-        self.nameDict = {}
-        self.descDict = {}
-        self.reversDict = {}
-        self.passDict = {}
-        self.officePhoneDict = {}
-        self.homePhoneDict = {}
-        self.surnameDict = {}
-        self.givennameDict = {}
-        self.emailDict = {}
+        self.passwd_file = None
 
     def loadFile(self):
 
@@ -119,57 +226,13 @@ class IdResolver (UserIdResolver):
         Loads the data of the file initially.
         if the self.fileName is empty, it loads /etc/passwd.
         Empty lines are ignored.
+        The parsed file is shared within the process, see :py:func:`get_passwd_file`.
         """
 
         if self.fileName == "":
             self.fileName = "/etc/passwd"
 
-        log.info('loading users from file {0!s} from within {1!r}'.format(self.fileName,
-                                                                os.getcwd()))
-        with codecs.open(self.fileName, "r", ENCODING) as fileHandle:
-            ID = self.sF["userid"]
-            NAME = self.sF["username"]
-            PASS = self.sF["cryptpass"]
-            DESCRIPTION = self.sF["description"]
-
-            for line in fileHandle:
-                line = line.strip()
-                if not line:
-                    # continue on an empty line
-                    continue
-
-                fields = line.split(":", 7)
-                self.nameDict[fields[NAME]] = fields[ID]
-
-                # for speed reason - build a revers lookup
-                self.reversDict[fields[ID]] = fields[NAME]
-
-                # for full info store the line
-                self.descDict[fields[ID]] = fields
-
-                # store the crypted password
-                self.passDict[fields[ID]] = fields[PASS]
-
-                # store surname, givenname and phones
-                descriptions = fields[DESCRIPTION].split(",")
-                name = descriptions[0]
-                names = name.split(' ', 1)
-                self.givennameDict[fields[ID]] = names[0]
-                self.surnameDict[fields[ID]] = ""
-                self.officePhoneDict[fields[ID]] = ""
-                self.homePhoneDict[fields[ID]] = ""
-                self.emailDict[fields[ID]] = ""
-                if len(names) >= 2:
-                    self.surnameDict[fields[ID]] = names[1]
-                if len(descriptions) >= 4:
-                    self.officePhoneDict[fields[ID]] = descriptions[2]
-                    self.homePhoneDict[fields[ID]] = descriptions[3]
-                if len(descriptions) >= 5:
-                    for field in descriptions[4:]:
-                        # very basic e-mail regex
-                        email_match = re.search(r'.+@.+\..+', field)
-                        if email_match:
-                            self.emailDict[fields[ID]] = email_match.group(0)
+        self.passwd_file = get_passwd_file(self.fileName)
 
     def checkPass(self, uid, password):
         """
@@ -191,7 +254,7 @@ class IdResolver (UserIdResolver):
         :rtype: bool
         """
         log.info("checking password for user uid {0!s}".format(uid))
-        cryptedpasswd = self.passDict[uid]
+        cryptedpasswd = self.passwd_file.users[uid].fields[PASS]
         log.debug("We found the encrypted pass {0!s} for uid {1!s}".format(cryptedpasswd, uid))
         if cryptedpasswd:
             if cryptedpasswd in ['x', '*']:
@@ -222,20 +285,19 @@ class IdResolver (UserIdResolver):
         """
         ret = {}
 
-        if userId in self.reversDict:
-            fields = self.descDict.get(userId)
-
+        user = self.passwd_file.users.get(userId)
+        if user:
             for key in self.sF:
                 if no_passwd and key == "cryptpass":
                     continue
                 index = self.sF[key]
-                ret[key] = fields[index]
+                ret[key] = user.fields[index]
 
-            ret['givenname'] = self.givennameDict.get(userId)
-            ret['surname'] = self.surnameDict.get(userId)
-            ret['phone'] = self.homePhoneDict.get(userId)
-            ret['mobile'] = self.officePhoneDict.get(userId)
-            ret['email'] = self.emailDict.get(userId)
+            ret['givenname'] = user.givenname
+            ret['surname'] = user.surname
+            ret['phone'] = user.phone
+            ret['mobile'] = user.mobile
+            ret['email'] = user.email
 
         return ret
 
@@ -247,10 +309,24 @@ class IdResolver (UserIdResolver):
         :return: username
         :rtype: str
         '''
-        fields = self.descDict.get(userId)
+        fields = self.passwd_file.users[userId].fields
         index = self.sF["username"]
         return fields[index]
 
+    def getUsernames(self, userids):
+        """
+        Returns the usernames for a list of userids. Unknown userids
+        are not contained in the result.
+
+        :param userids: The userids in this resolver
+        :type userids: list
+        :return: dictionary of userid and username
+        :rtype: dict
+        """
+        users = self.passwd_file.users
+        return {userid: users[userid].fields[NAME]
+                for userid in set(userids) if userid in users}
+
     def getUserId(self, LoginName):
         """
         search the user id from the login name
@@ -260,9 +336,9 @@ class IdResolver (UserIdResolver):
         :rtype: str
         """
         # We do not encode the LoginName anymore, as we are
-        # storing unicode in nameDict now.
-        if LoginName in self.nameDict:
-            return convert_column_to_unicode(self.nameDict[LoginName])
+        # storing unicode in the parsed file now.
+        if LoginName in self.passwd_file.userids:
+            return convert_column_to_unicode(self.passwd_file.userids[LoginName])
         else:
             return ""
 
@@ -293,10 +369,18 @@ class IdResolver (UserIdResolver):
         :param searchDict: dict of search expressions
         """
         ret = []
+        searchDict = searchDict or {}
+        users = self.passwd_file.users
+        userids = None
+        if "username" in searchDict:
+            # Use the username index for exact and prefix searches
+            userids = self.passwd_file.find_usernames(searchDict["username"])
+        if userids is None:
+            userids = list(users)
 
         #  first check if the searches are in the searchDict
-        for l in self.descDict:
-            line = self.descDict[l]
+        for uid in userids:
+            line = users[uid].fields
             ok = True
 
             for search in searchDict:
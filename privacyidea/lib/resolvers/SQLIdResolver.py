@@ -41,7 +41,8 @@ from sqlalchemy.orm import sessionmaker, scoped_session
 
 import traceback
 import hashlib
-from privacyidea.lib.pooling import get_engine
+import json
+from privacyidea.lib.pooling import get_engine, get_table, get_table_registry
 from privacyidea.lib.lifecycle import register_finalizer
 from privacyidea.lib.utils import (is_true, censor_connect_string,
                                    convert_column_to_unicode)
@@ -152,6 +153,9 @@ hash_type_dict = {"PHPASS": 'phpass',
                   }
 
 log = logging.getLogger(__name__)
+# Number of userids, which are looked up in one query. Oracle allows at most
+# 1000 values in an IN clause, MSSQL at most 2100 parameters in a query.
+USERNAMES_CHUNK_SIZE = 500
 
 
 class IdResolver (UserIdResolver):
@@ -318,6 +322,45 @@ class IdResolver (UserIdResolver):
         info = self.getUserInfo(userId)
         return info.get('username', "")
 
+    def getUsernames(self, userIds):
+        """
+        Returns the usernames for a list of userids with one query per
+        ``USERNAMES_CHUNK_SIZE`` userids.
+        Userids, which do not exist, are not contained in the result.
+
+        :param userIds: The userids in this resolver
+        :type userIds: list
+        :return: dictionary of userid and username
+        :rtype: dict
+        """
+        column = self.TABLE.columns[self.map.get("userid")]
+        if isinstance(column.type, String):
+            values = {str(uid): uid for uid in userIds}
+        elif isinstance(column.type, Integer):
+            try:
+                values = {int(uid): uid for uid in userIds}
+            except ValueError:
+                return super(IdResolver, self).getUsernames(userIds)
+        else:
+            return super(IdResolver, self).getUsernames(userIds)
+
+        usernames = {}
+        column_values = list(values)
+        # Databases limit the number of values in an IN clause
+        for i in range(0, len(column_values), USERNAMES_CHUNK_SIZE):
+            conditions = [column.in_(column_values[i:i + USERNAMES_CHUNK_SIZE])]
+            conditions = self._append_where_filter(conditions, self.TABLE,
+                                                   self.where)
+            result = self.session.execute(select(self.TABLE).filter(and_(*conditions)))
+            for r in result.mappings():
+                uid = values.get(r[self.map.get("userid")])
+                if uid is not None:
+                    username = self._get_user_from_mapped_object(r).get('username', "")
+                    if username:
+                        usernames[uid] = username
+
+        return usernames
+
     def getUserId(self, LoginName):
         """
         resolve the loginname to the userid.
@@ -473,15 +516,7 @@ class IdResolver (UserIdResolver):
         # (necessary for MySQL servers, which terminate idle connections after some hours)
         self.pool_recycle = int(config.get('poolRecycle') or 7200)
 
-        # create the connect-string like
-        params = {'Port': self.port,
-                  'Password': self.password,
-                  'conParams': self.conParams,
-                  'Driver': self.driver,
-                  'User': self.user,
-                  'Server': self.server,
-                  'Database': self.database}
-        self.connect_string = self._create_connect_string(params)
+        self.connect_string = self._get_connect_string(config)
 
         # get an engine from the engine registry, using self.getResolverId() as the key,
         # which involves the connect-string and the pool settings.
@@ -492,13 +527,52 @@ class IdResolver (UserIdResolver):
         register_finalizer(self.session.close)
         self.session._model_changes = {}
 
-        table_parts = self.table.split(".")
-        schema = table_parts[0] if len(table_parts) > 1 else None
-        self.table = table_parts[-1]
+        table_key = self._get_table_key(config)
+        _connect_string, schema, self.table, _config_version = table_key
         log.debug("Loading table {0!s} from schema {1!s}".format(self.table, schema))
-        self.TABLE = Table(self.table, MetaData(), autoload_with=self.engine, schema=schema)
+        self.TABLE = get_table(table_key,
+                               lambda: Table(self.table, MetaData(), autoload_with=self.engine,
+                                             schema=schema))
         return self
 
+    @classmethod
+    def _get_connect_string(cls, config):
+        # create the connect-string like
+        params = {'Port': config.get('Port', ""),
+                  'Password': config.get('Password', ""),
+                  'conParams': config.get('conParams', ""),
+                  'Driver': config.get('Driver', ""),
+                  'User': config.get('User', ""),
+                  'Server': config.get('Server', ""),
+                  'Database': config.get('Database', "")}
+        return cls._create_connect_string(params)
+
+    @classmethod
+    def _get_table_key(cls, config):
+        """
+        Return the key of the reflected table in the table registry.
+
+        The reflected table is shared between all resolver objects with the
+        same database, table and configuration. It is reflected again, if the
+        configuration of the resolver changes, e.g. to find new columns.
+
+        :return: tuple of the connect string, the schema, the table name and
+            the version of the configuration
+        """
+        table_parts = config.get('Table', "").split(".")
+        schema = table_parts[0] if len(table_parts) > 1 else None
+        config_version = hashlib.sha256(json.dumps(config, sort_keys=True,
+                                                   default=str).encode('utf8')).hexdigest()
+        return cls._get_connect_string(config), schema, table_parts[-1], config_version
+
+    @classmethod
+    def invalidate_config(cls, config):
+        """
+        Remove the reflected table of the given configuration from the table
+        registry of this process.
+        """
+        get_table_registry().invalidate(cls._get_table_key(config))
+
     def _create_engine(self):
         log.info("using the connect string "
                  "{0!s}".format(censor_connect_string(self.connect_string)))
@@ -62,12 +62,42 @@ class UserIdResolver(object):
     # If the resolver could be configured editable
     updateable = False
 
+    # If resolver objects can be reused by several requests
+    poolable = False
+
     def close(self):
         """
         Hook to close down the resolver after one request
         """
         return
 
+    def is_healthy(self):
+        """
+        Check, if a pooled resolver object can be used for another request.
+
+        :return: True or False
+        """
+        return True
+
+    def reuse(self):
+        """
+        Hook, which is called, when a pooled resolver object is taken from
+        the pool for another request.
+        """
+        return
+
+    @classmethod
+    def invalidate_config(cls, config):
+        """
+        Hook, which is called, when the configuration of a resolver is changed
+        or the resolver is deleted. Resolver classes, which share objects of a
+        configuration in the process, like reflected tables, remove them here.
+
+        :param config: The previous configuration of the resolver
+        :type config: dict
+        """
+        return
+
     @staticmethod
     def getResolverClassType():
         """
@@ -141,6 +171,26 @@ class UserIdResolver(object):
         """
         return "dummy_user_name"
 
+    def getUsernames(self, userids):
+        """
+        Returns the usernames for a list of userids.
+        Userids, which do not exist, are not contained in the result.
+        Resolvers which can look up several users at once should override
+        this method; the default implementation calls ``getUsername`` for
+        each userid.
+
+        :param userids: The userids in this resolver
+        :type userids: list
+        :return: dictionary of userid and username
+        :rtype: dict
+        """
+        usernames = {}
+        for userid in set(userids):
+            username = self.getUsername(userid)
+            if username:
+                usernames[userid] = username
+        return usernames
+
     def getUserInfo(self, userid):
         """
         This function returns all user information for a given user object
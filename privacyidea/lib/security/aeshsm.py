@@ -22,6 +22,9 @@
 
 import logging
 import datetime
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from privacyidea.lib.security.default import (SecurityModule,
                                               int_list_to_bytestring)
 from privacyidea.lib.error import HSMException
@@ -35,6 +38,7 @@ HSM that is connected via PKCS11. This alternate version relies on AES keys.
 log = logging.getLogger(__name__)
 
 MAX_RETRIES = 5
+SESSION_POOL_SIZE = 4
 
 try:
     import PyKCS11
@@ -87,6 +91,11 @@ class AESHardwareSecurityModule(SecurityModule):  # pragma: no cover
         log.debug("Setting the modules: {0!s}".format(self.module))
         self.max_retries = config.get("max_retries", MAX_RETRIES)
         log.debug("Setting max retries: {0!s}".format(self.max_retries))
+        # Number of additional sessions used by encrypt_many and decrypt_many
+        self.session_pool_size = int(config.get("session_pool_size", SESSION_POOL_SIZE))
+        log.debug("Setting session pool size: {0!s}".format(self.session_pool_size))
+        self.session_pool = None
+        self.session_pool_lock = threading.Lock()
         self.session = None
         self.session_start_time = datetime.datetime.now()
         self.session_lastused_time = datetime.datetime.now()
@@ -102,6 +111,8 @@ class AESHardwareSecurityModule(SecurityModule):  # pragma: no cover
         * get session
         :return:
         """
+        # The sessions of the pool are invalid after C_Finalize
+        self.session_pool = None
         self.pkcs11 = PyKCS11.PyKCS11Lib()
         self.pkcs11.load(self.module)
         self.pkcs11.lib.C_Initialize()
@@ -263,6 +274,78 @@ class AESHardwareSecurityModule(SecurityModule):  # pragma: no cover
             log.warning("Decryption after {0!s} retries successful. Time taken: {1!s}.".format(retries, td))
         return int_list_to_bytestring(r)
 
+    def _get_session_pool(self):
+        """
+        Return the queue of additional sessions. The sessions share the login
+        state of the main session.
+        """
+        with self.session_pool_lock:
+            if self.session_pool is None:
+                session_pool = queue.Queue()
+                for _i in range(self.session_pool_size):
+                    session_pool.put(self.pkcs11.openSession(slot=self.slot))
+                self.session_pool = session_pool
+            return self.session_pool
+
+    def _run_many(self, operation, items, key_id):
+        """
+        Run the operation ("encrypt" or "decrypt") for all items in parallel
+        on the sessions of the pool. Items, which fail on a pooled session, are
+        processed afterwards one by one by the single operation with its retry
+        logic, so that only one thread re-initializes the HSM.
+        """
+        single = getattr(self, operation)
+        if len(items) < 2 or self.session_pool_size < 2:
+            return [single(data, iv, key_id) for data, iv in items]
+        try:
+            session_pool = self._get_session_pool()
+        except PyKCS11.PyKCS11Error as exx:
+            log.warning("Could not open the session pool: {0!s}".format(exx))
+            return [single(data, iv, key_id) for data, iv in items]
+
+        def _process(item):
+            data, iv = item
+            if operation == "decrypt" and len(data) == 0:
+                return bytes()
+            m = PyKCS11.Mechanism(PyKCS11.CKM_AES_CBC_PAD, iv)
+            session = session_pool.get()
+            try:
+                r = getattr(session, operation)(self.key_handles[key_id], bytes(data), m)
+            except PyKCS11.PyKCS11Error as exx:
+                log.warning("{0!s} on pooled session failed: {1!s}".format(operation, exx))
+                return None
+            finally:
+                session_pool.put(session)
+            return int_list_to_bytestring(r)
+
+        log.debug("Running {0!s} for {1:d} items on {2:d} sessions".format(
+            operation, len(items), self.session_pool_size))
+        with ThreadPoolExecutor(max_workers=self.session_pool_size) as executor:
+            res = list(executor.map(_process, items))
+        for i, (data, iv) in enumerate(items):
+            if res[i] is None:
+                res[i] = single(data, iv, key_id)
+        self.session_lastused_time = datetime.datetime.now()
+        return res
+
+    def encrypt_many(self, items, key_id=SecurityModule.TOKEN_KEY):
+        """
+        Encrypt several values on a pool of HSM sessions.
+
+        :param items: list of tuples (data, iv)
+        :rtype: list of bytes
+        """
+        return self._run_many("encrypt", list(items), key_id)
+
+    def decrypt_many(self, items, key_id=SecurityModule.TOKEN_KEY):
+        """
+        Decrypt several values on a pool of HSM sessions.
+
+        :param items: list of tuples (enc_data, iv)
+        :rtype: list of bytes
+        """
+        return self._run_many("decrypt", list(items), key_id)
+
     def create_keys(self):
         """
         Connect to the HSM and create the encryption keys.
@@ -117,6 +117,38 @@ class SecurityModule(object):
                   "the method : %s " % (fname,))
         raise NotImplementedError("Should have been implemented {0!s}".format(fname))
 
+    def encrypt_many(self, items, key_id=TOKEN_KEY):
+        """
+        Encrypt several values with the same key.
+
+        This default implementation calls ``encrypt`` for each value.
+        Security modules can overwrite it to process the values more
+        efficiently.
+
+        :param items: list of tuples (data, iv)
+        :type items: list
+        :param key_id: slot of the key array
+        :return: list of the encrypted data in the same order
+        :rtype: list of bytes
+        """
+        return [self.encrypt(data, iv, key_id) for data, iv in items]
+
+    def decrypt_many(self, items, key_id=TOKEN_KEY):
+        """
+        Decrypt several values with the same key.
+
+        This default implementation calls ``decrypt`` for each value.
+        Security modules can overwrite it to process the values more
+        efficiently.
+
+        :param items: list of tuples (enc_data, iv)
+        :type items: list
+        :param key_id: slot of the key array
+        :return: list of the decrypted data in the same order
+        :rtype: list of bytes
+        """
+        return [self.decrypt(enc_data, iv, key_id) for enc_data, iv in items]
+
     def decrypt_password(self, crypt_pass):
         """
         Decrypt the given password. The CONFIG_KEY is used to decrypt it.
@@ -130,6 +162,18 @@ class SecurityModule(object):
         """
         return self._decrypt_value(crypt_pass, self.CONFIG_KEY)
 
+    def decrypt_passwords(self, crypt_passes):
+        """
+        Decrypt the given passwords with the CONFIG_KEY.
+
+        :param crypt_passes: list of encrypted passwords with the leading iv,
+            separated by the ':', hexlified
+        :type crypt_passes: list of str
+        :return: list of the decrypted passwords
+        :rtype: list of str
+        """
+        return self._decrypt_values(crypt_passes, self.CONFIG_KEY)
+
     def decrypt_pin(self, crypt_pin):
         """
         Decrypt the given encrypted PIN with the TOKEN_KEY
@@ -209,17 +253,39 @@ class SecurityModule(object):
         :return: decrypted data
         :rtype: str
         """
-        # split at ":"
+        data, iv = self._split_value(crypt_value)
+        clear_data = self.decrypt(data, iv, slot_id)
+
+        return to_unicode(clear_data)
+
+    def _decrypt_values(self, crypt_values, slot_id):
+        """
+        base method to decrypt several values with ``decrypt_many``
+
+        :param crypt_values: list of values with leading iv, separated by ':'
+        :type crypt_values: list of str
+        :param slot_id: slot of the key array
+        :type slot_id: int
+        :return: list of decrypted data
+        :rtype: list of str
+        """
+        items = [self._split_value(crypt_value) for crypt_value in crypt_values]
+        return [to_unicode(clear_data) for clear_data in self.decrypt_many(items, slot_id)]
+
+    @staticmethod
+    def _split_value(crypt_value):
+        """
+        Split the value at the ":" into the data and the iv
+
+        :return: tuple of (data, iv)
+        """
         pos = crypt_value.find(':')
         bIV = crypt_value[:pos]
         bData = crypt_value[pos + 1:]
 
         iv = binascii.unhexlify(bIV)
         data = binascii.unhexlify(bData)
-
-        clear_data = self.decrypt(data, iv, slot_id)
-
-        return to_unicode(clear_data)
+        return data, iv
 
     def create_keys(self):
         """
@@ -395,15 +461,26 @@ class DefaultSecurityModule(SecurityModule):
         :return: encrypted data
         :rtype:  bytes
         """
+        return self.encrypt_many([(data, iv)], key_id)[0]
+
+    def encrypt_many(self, items, key_id=SecurityModule.TOKEN_KEY):
+        """
+        Encrypt several values. The key is only read once.
+
+        :param items: list of tuples (data, iv)
+        :param key_id: slot of the key array
+        :return: list of the encrypted data
+        :rtype: list of bytes
+        """
         if self.is_ready is False:
             raise HSMException('setup of security module incomplete')
 
         key = self._get_secret(key_id)
-
-        padder = padding.PKCS7(algorithms.AES.block_size).padder()
-        padded_data = padder.update(data) + padder.finalize()
-
-        res = aes_cbc_encrypt(key, iv, padded_data)
+        res = []
+        for data, iv in items:
+            padder = padding.PKCS7(algorithms.AES.block_size).padder()
+            padded_data = padder.update(data) + padder.finalize()
+            res.append(aes_cbc_encrypt(key, iv, padded_data))
 
         if self.crypted is False:
             zerome(key)
@@ -480,27 +557,41 @@ class DefaultSecurityModule(SecurityModule):
         :return: decrypted data
         :rtype: bytes
         """
+        return self.decrypt_many([(enc_data, iv)], key_id)[0]
+
+    def decrypt_many(self, items, key_id=SecurityModule.TOKEN_KEY):
+        """
+        Decrypt several values. The key is only read once.
+
+        :param items: list of tuples (enc_data, iv)
+        :param key_id: slot of the key array
+        :return: list of the decrypted data
+        :rtype: list of bytes
+        """
         if self.is_ready is False:
             raise HSMException('setup of security module incomplete')
 
         key = self._get_secret(key_id)
-        output = aes_cbc_decrypt(key, iv, enc_data)
+        res = []
+        for enc_data, iv in items:
+            output = aes_cbc_decrypt(key, iv, enc_data)
 
-        try:
-            unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
-            data = unpadder.update(output) + unpadder.finalize()
-        except ValueError as _e:
-            # try legacy padding
-            # remove padding
-            eof = output.rfind(b"\x01\x02")
-            if eof >= 0:
-                output = output[:eof]
-
-            # convert output from ascii, back to bin data
-            data = binascii.unhexlify(output)
+            try:
+                unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+                data = unpadder.update(output) + unpadder.finalize()
+            except ValueError as _e:
+                # try legacy padding
+                # remove padding
+                eof = output.rfind(b"\x01\x02")
+                if eof >= 0:
+                    output = output[:eof]
+
+                # convert output from ascii, back to bin data
+                data = binascii.unhexlify(output)
+            res.append(data)
 
         if self.crypted is False:
             zerome(key)
             del key
 
-        return data
+        return res
@@ -26,6 +26,8 @@ The code is tested in tests/test_lib_subscriptions.py.
 import logging
 import datetime
 import random
+import threading
+import time
 from .log import log_with
 from .utils import get_plugin_info_from_useragent
 from ..models import Subscription
@@ -34,7 +36,8 @@ from privacyidea.lib.token import get_tokens
 from privacyidea.lib.crypto import Sign
 from privacyidea.lib import _, lazy_gettext
 import functools
-from privacyidea.lib.framework import get_app_config_value
+from privacyidea.lib.framework import get_app_config_value, get_app_local_store
+from flask import current_app
 import os
 import traceback
 from sqlalchemy import func
@@ -79,6 +82,93 @@ APPLICATIONS = {"demo_application": 0,
 
 log = logging.getLogger(__name__)
 
+# Number of seconds, for which the number of users with active tokens and the
+# result of the signature check are kept in memory. 0 disables the cache.
+SUBSCRIPTION_REFRESH_INTERVAL = "PI_SUBSCRIPTION_REFRESH_INTERVAL"
+
+
+class SubscriptionCache(object):
+    """
+    Keeps the number of users with active tokens and the successfully verified
+    subscriptions of a process in memory.
+
+    The number of users is counted once, when it is requested first. Afterwards
+    a request always gets the cached number. If it is older than the refresh
+    interval, it is counted again in a background thread.
+    """
+    def __init__(self, refresh_interval):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._token_users = None
+        self._timestamp = 0
+        self._refreshing = False
+        self._signatures = {}
+
+    def get_users_with_active_tokens(self):
+        with self._lock:
+            token_users = self._token_users
+            start_refresh = (token_users is not None and not self._refreshing
+                             and time.time() - self._timestamp > self.refresh_interval)
+            if start_refresh:
+                self._refreshing = True
+        if token_users is None:
+            token_users = self._count()
+        elif start_refresh:
+            app = current_app._get_current_object()
+            threading.Thread(target=self._refresh, args=(app,), daemon=True).start()
+        return token_users
+
+    def _count(self):
+        token_users = get_users_with_active_tokens()
+        with self._lock:
+            self._token_users = token_users
+            self._timestamp = time.time()
+        return token_users
+
+    def _refresh(self, app):
+        try:
+            with app.app_context():
+                self._count()
+        except Exception as exx:  # pragma: no cover
+            log.warning("Could not count the users with active tokens: {0!r}".format(exx))
+            log.debug(traceback.format_exc())
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def check_signature(self, subscription):
+        """
+        Check the signature of the subscription, if it has not been verified
+        successfully within the refresh interval.
+        """
+        key = tuple(sorted((k, str(v)) for k, v in subscription.items()))
+        with self._lock:
+            timestamp = self._signatures.get(key)
+        if timestamp is not None and time.time() - timestamp <= self.refresh_interval:
+            return True
+        r = check_signature(subscription)
+        with self._lock:
+            self._signatures[key] = time.time()
+        return r
+
+
+def get_subscription_cache():
+    """
+    Return the subscription cache of the process according to
+    ``PI_SUBSCRIPTION_REFRESH_INTERVAL``.
+
+    :return: a ``SubscriptionCache`` object or None, if the cache is disabled
+    """
+    refresh_interval = int(get_app_config_value(SUBSCRIPTION_REFRESH_INTERVAL, 0))
+    if refresh_interval <= 0:
+        return None
+    store = get_app_local_store()
+    cache = store.get("subscription_cache")
+    if cache is None or cache.refresh_interval != refresh_interval:
+        cache = SubscriptionCache(refresh_interval)
+        store["subscription_cache"] = cache
+    return cache
+
 
 def get_users_with_active_tokens():
     """
@@ -266,7 +356,11 @@ def check_subscription(application, max_free_subscriptions=None):
         subscriptions = get_subscription(application) or get_subscription(
             application.lower())
         # get the number of users with active tokens
-        token_users = get_users_with_active_tokens()
+        subscription_cache = get_subscription_cache()
+        if subscription_cache:
+            token_users = subscription_cache.get_users_with_active_tokens()
+        else:
+            token_users = get_users_with_active_tokens()
         free_subscriptions = max_free_subscriptions or APPLICATIONS.get(application.lower())
         if len(subscriptions) == 0:
             if subscription_exceeded_probability(token_users, free_subscriptions):
@@ -283,7 +377,10 @@ def check_subscription(application, max_free_subscriptions=None):
                                             application=application)
             else:
                 # subscription is still valid, so check the signature.
-                check_signature(subscription)
+                if subscription_cache:
+                    subscription_cache.check_signature(subscription)
+                else:
+                    check_signature(subscription)
                 allowed_tokennums = subscription.get("num_tokens")
                 if subscription_exceeded_probability(token_users, allowed_tokennums):
                     # subscription is exceeded
@@ -0,0 +1,66 @@
+# (c) NetKnights GmbH 2024,  https://netknights.it
+#
+# This code is free software; you can redistribute it and/or
+# modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+# as published by the Free Software Foundation; either
+# version 3 of the License, or any later version.
+#
+# This code is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU AFFERO GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+import logging
+
+from privacyidea.lib.task.base import BaseTask
+from privacyidea.lib.challenge import delete_expired_challenges, get_challenge_count
+from privacyidea.lib.monitoringstats import write_stats
+from privacyidea.lib.utils import is_true
+from privacyidea.lib.error import ParameterError
+from privacyidea.lib import _
+
+__doc__ = """This task module deletes expired challenges from the challenge table.
+It can also write the size of the challenge table to the MonitoringStats table."""
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNKSIZE = 1000
+
+
+class ChallengeCleanupTask(BaseTask):
+    identifier = "ChallengeCleanup"
+    description = "Delete expired challenges from the database."
+
+    @property
+    def options(self):
+        return {
+            "chunksize": {
+                "type": "str",
+                "description": _("The number of expired challenges, which are deleted in one "
+                                 "database statement (default: {0!s}).").format(DEFAULT_CHUNKSIZE)},
+            "write_stats": {
+                "type": "bool",
+                "description": _("Write the number of deleted challenges and the number of "
+                                 "remaining challenges to the MonitoringStats table.")}
+        }
+
+    def do(self, params):
+        try:
+            chunksize = int(params.get("chunksize") or DEFAULT_CHUNKSIZE)
+        except ValueError:
+            raise ParameterError("The chunksize needs to be an integer.")
+        if chunksize <= 0:
+            raise ParameterError("The chunksize needs to be positive.")
+
+        deleted = delete_expired_challenges(chunksize=chunksize)
+        log.info("Deleted {0!s} expired challenges.".format(deleted))
+        if is_true(params.get("write_stats")):
+            write_stats("challenges_deleted", deleted)
+            write_stats("challenges_total", get_challenge_count())
+
+        return True
@@ -67,6 +67,7 @@ import logging
 from collections import defaultdict
 
 from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.sql.functions import FunctionElement
 
@@ -79,7 +80,7 @@ from privacyidea.lib.decorators import (check_user_or_serial,
 from privacyidea.lib.tokenclass import TokenClass
 from privacyidea.lib.utils import (is_true, BASE58, hexlify_and_unicode,
                                    check_serial_valid, create_tag_dict)
-from privacyidea.lib.crypto import generate_password
+from privacyidea.lib.crypto import generate_password, encryption_batch
 from privacyidea.lib.log import log_with
 from privacyidea.models import (db, Token, Realm, TokenRealm, Challenge,
                                 TokenInfo, TokenOwner, TokenTokengroup,
@@ -105,7 +106,7 @@ from privacyidea.lib.challengeresponsedecorators import (generic_challenge_respo
                                                          generic_challenge_response_resync)
 from privacyidea.lib.tokenclass import DATE_FORMAT
 from privacyidea.lib.tokenclass import TOKENKIND
-from privacyidea.lib.user import get_username
+from privacyidea.lib.user import get_username, get_usernames
 from dateutil.tz import tzlocal
 
 log = logging.getLogger(__name__)
@@ -114,6 +115,9 @@ optional = True
 required = False
 
 ENCODING = "utf-8"
+# Number of tokens, whose details are fetched from the database at once when
+# converting a token list to dictionaries
+TOKEN_LIST_CHUNK_SIZE = 500
 
 
 # Define function to convert Oracle CLOBs to VARCHAR before using them in a
@@ -382,16 +386,25 @@ def _create_token_query(tokentype=None, token_type_list=None, realm=None, assign
 
 def get_tokens_paginated_generator(tokentype=None, realm=None, assigned=None, user=None,
                                    serial_wildcard=None, active=None, resolver=None, rollout_state=None,
-                                   revoked=None, locked=None, tokeninfo=None, maxfail=None, psize=1000):
+                                   revoked=None, locked=None, tokeninfo=None, maxfail=None, psize=1000,
+                                   has_tokeninfo_key=None, has_not_tokeninfo_key=None):
     """
     Fetch chunks of ``psize`` tokens that match the filter criteria from the database and generate
     lists of token objects.
     See ``get_tokens`` for information on the arguments.
 
+    The chunks are read with a keyset pagination on the token ID, so that every chunk is
+    fetched with the same cost. The token info, realms, tokengroups and the container of the
+    tokens of a chunk are loaded with a fixed number of queries.
+
     Note that individual lists may contain less than ``psize`` elements if
     a token entry has an invalid type.
 
     :param psize: Maximum size of chunks that are fetched from the database
+    :param has_tokeninfo_key: Only return tokens, which have a tokeninfo with this key
+    :type has_tokeninfo_key: str
+    :param has_not_tokeninfo_key: Only return tokens, which do not have a tokeninfo with this key
+    :type has_not_tokeninfo_key: str
     :return: This is a generator that generates non-empty lists of token objects.
     """
     main_sql_query = _create_token_query(tokentype=tokentype, realm=realm,
@@ -400,7 +413,14 @@ def get_tokens_paginated_generator(tokentype=None, realm=None, assigned=None, us
                                          active=active, resolver=resolver,
                                          rollout_state=rollout_state,
                                          revoked=revoked, locked=locked,
-                                         tokeninfo=tokeninfo, maxfail=maxfail).order_by(Token.id)
+                                         tokeninfo=tokeninfo, maxfail=maxfail)
+    if has_tokeninfo_key:
+        main_sql_query = main_sql_query.filter(
+            Token.id.in_(select(TokenInfo.token_id).where(TokenInfo.Key == has_tokeninfo_key)))
+    if has_not_tokeninfo_key:
+        main_sql_query = main_sql_query.filter(
+            Token.id.not_in(select(TokenInfo.token_id).where(TokenInfo.Key == has_not_tokeninfo_key)))
+    main_sql_query = main_sql_query.options(*_token_list_load_options()).order_by(Token.id)
     # Fetch the first ``psize`` tokens
     sql_query = main_sql_query.limit(psize)
     while True:
@@ -421,6 +441,105 @@ def get_tokens_paginated_generator(tokentype=None, realm=None, assigned=None, us
             break
 
 
+def _token_list_load_options():
+    """
+    Return the loader options, which fetch the token info, the realms, the
+    tokengroups and the container of a list of tokens with one query per
+    relationship instead of one query per token.
+    """
+    return [selectinload(Token.info_list),
+            selectinload(Token.realm_list).lazyload(TokenRealm.token),
+            selectinload(Token.tokengroup_list).lazyload(TokenTokengroup.token),
+            selectinload(Token.container)]
+
+
+def _get_token_dicts(tokens):
+    """
+    Convert a list of token objects to a list of dictionaries including the
+    user information and the container serial.
+
+    The database data of the tokens is fetched in bulk: The relationships of
+    the tokens and the token owners are loaded with a fixed number of queries
+    per ``TOKEN_LIST_CHUNK_SIZE`` tokens and the usernames are resolved with
+    one lookup per resolver. Owners, which are not found by this lookup, are
+    resolved per token.
+
+    :param tokens: A list of token objects
+    :type tokens: list
+    :return: A list of tuples of the token object and its dictionary
+    :rtype: list
+    """
+    token_objects = [tok for tok in tokens if isinstance(tok, TokenClass)]
+    db_tokens = {tok.token.id: tok.token for tok in token_objects}
+    token_ids = list(db_tokens)
+    userids = defaultdict(set)
+    for i in range(0, len(token_ids), TOKEN_LIST_CHUNK_SIZE):
+        chunk = token_ids[i:i + TOKEN_LIST_CHUNK_SIZE]
+        # This populates the relationships of the tokens in the session
+        Token.query.filter(Token.id.in_(chunk)).options(*_token_list_load_options()).all()
+        for token_id in chunk:
+            db_tokens[token_id].prefetched_owners = []
+        owners = TokenOwner.query.filter(TokenOwner.token_id.in_(chunk)).order_by(TokenOwner.id)
+        for owner in owners:
+            db_tokens[owner.token_id].prefetched_owners.append(owner)
+            userids[owner.resolver].add(owner.user_id)
+
+    # Resolve the usernames per resolver. Users, which are not found this way,
+    # e.g. if the user does not exist anymore or the LDAP or SQL server is not
+    # reachable, are resolved per token below.
+    usernames = {}
+    editable = {}
+    for resolvername, resolver_userids in userids.items():
+        try:
+            usernames[resolvername] = get_usernames(resolver_userids, resolvername)
+            editable[resolvername] = get_resolver_object(resolvername).editable
+        except Exception as exx:
+            log.warning("Could not resolve the users of resolver {0!s} at once: "
+                        "{1!s}".format(resolvername, exx))
+            log.debug(traceback.format_exc())
+            usernames.pop(resolvername, None)
+
+    token_dicts = []
+    try:
+        for tokenobject in token_objects:
+            token_dict = tokenobject.get_as_dict()
+            # add user information
+            token_dict["username"] = ""
+            token_dict["user_realm"] = ""
+            tokenowner = tokenobject.token.first_owner
+            resolver_usernames = usernames.get(tokenowner.resolver, {}) if tokenowner else {}
+            if tokenowner and tokenowner.user_id in resolver_usernames:
+                token_dict["username"] = resolver_usernames[tokenowner.user_id]
+                token_dict["user_realm"] = tokenowner.realm.name
+                token_dict["user_editable"] = editable[tokenowner.resolver]
+            elif tokenowner:
+                # In certain cases the LDAP or SQL server might not be reachable.
+                # Then an exception is raised
+                try:
+                    userobject = tokenobject.user
+                    if userobject:
+                        token_dict["username"] = userobject.login
+                        token_dict["user_realm"] = userobject.realm
+                        token_dict["user_editable"] = get_resolver_object(
+                            userobject.resolver).editable
+                except Exception as exx:
+                    log.error("User information can not be retrieved: {0!s}".format(exx))
+                    log.debug(traceback.format_exc())
+                    token_dict["username"] = "**resolver error**"
+
+            # check if token is in a container
+            token_dict["container_serial"] = ""
+            if tokenobject.token.container:
+                token_dict["container_serial"] = tokenobject.token.container[0].serial
+
+            token_dicts.append((tokenobject, token_dict))
+    finally:
+        for db_token in db_tokens.values():
+            db_token.prefetched_owners = None
+
+    return token_dicts
+
+
 def convert_token_objects_to_dicts(tokens, user, user_role="user", allowed_realms=None):
     """
     Convert a list of token objects to a list of dictionaries.
@@ -439,44 +558,18 @@ def convert_token_objects_to_dicts(tokens, user, user_role="user", allowed_realm
     :rtype: list
     """
     token_dict_list = []
-    for tokenobject in tokens:
-        if isinstance(tokenobject, TokenClass):
-            token_dict = tokenobject.get_as_dict()
-            # add user information
-            # In certain cases the LDAP or SQL server might not be reachable.
-            # Then an exception is raised
-            token_dict["username"] = ""
-            token_dict["user_realm"] = ""
-            try:
-                userobject = tokenobject.user
-                if userobject:
-                    token_dict["username"] = userobject.login
-                    token_dict["user_realm"] = userobject.realm
-                    token_dict["user_editable"] = get_resolver_object(
-                        userobject.resolver).editable
-            except Exception as exx:
-                log.error("User information can not be retrieved: {0!s}".format(exx))
-                log.debug(traceback.format_exc())
-                token_dict["username"] = "**resolver error**"
-
-            # check if token is in a container
-            token_dict["container_serial"] = ""
-            from privacyidea.lib.container import find_container_for_token
-            container = find_container_for_token(tokenobject.get_serial())
-            if container:
-                token_dict["container_serial"] = container.serial
-
-            # Reduce token info if the user is not the owner
-            if user_role != "admin":
-                if not user or user.login != token_dict["username"] or user.realm != token_dict["user_realm"]:
-                    token_dict = {"serial": token_dict["serial"]}
-            elif user_role == "admin" and allowed_realms is not None:
-                same_realms = list(set(token_dict["realms"]).intersection(allowed_realms))
-                if len(same_realms) == 0:
-                    # The token is in no realm the admin is allowed to see
-                    token_dict = {"serial": token_dict["serial"]}
-
-            token_dict_list.append(token_dict)
+    for _tokenobject, token_dict in _get_token_dicts(tokens):
+        # Reduce token info if the user is not the owner
+        if user_role != "admin":
+            if not user or user.login != token_dict["username"] or user.realm != token_dict["user_realm"]:
+                token_dict = {"serial": token_dict["serial"]}
+        elif user_role == "admin" and allowed_realms is not None:
+            same_realms = list(set(token_dict["realms"]).intersection(allowed_realms))
+            if len(same_realms) == 0:
+                # The token is in no realm the admin is allowed to see
+                token_dict = {"serial": token_dict["serial"]}
+
+        token_dict_list.append(token_dict)
 
     return token_dict_list
 
@@ -662,40 +755,13 @@ def get_tokens_paginate(tokentype=None, token_type_list=None, realm=None, assign
     if pagination.has_next:
         next = page + 1
     token_list = []
-    for token in tokens:
-        tokenobject = create_tokenclass_object(token)
-        if isinstance(tokenobject, TokenClass):
-            token_dict = tokenobject.get_as_dict()
-            # add user information
-            # In certain cases the LDAP or SQL server might not be reachable.
-            # Then an exception is raised
-            token_dict["username"] = ""
-            token_dict["user_realm"] = ""
-            try:
-                userobject = tokenobject.user
-                if userobject:
-                    token_dict["username"] = userobject.login
-                    token_dict["user_realm"] = userobject.realm
-                    token_dict["user_editable"] = get_resolver_object(
-                        userobject.resolver).editable
-            except Exception as exx:
-                log.error("User information can not be retrieved: {0!s}".format(exx))
-                log.debug(traceback.format_exc())
-                token_dict["username"] = "**resolver error**"
-
-            if hidden_tokeninfo:
-                for key in list(token_dict['info']):
-                    if key in hidden_tokeninfo:
-                        token_dict['info'].pop(key)
-
-            # check if token is in a container
-            token_dict["container_serial"] = ""
-            from privacyidea.lib.container import find_container_for_token
-            container = find_container_for_token(tokenobject.get_serial())
-            if container:
-                token_dict["container_serial"] = container.serial
+    for _tokenobject, token_dict in _get_token_dicts([create_tokenclass_object(token) for token in tokens]):
+        if hidden_tokeninfo:
+            for key in list(token_dict['info']):
+                if key in hidden_tokeninfo:
+                    token_dict['info'].pop(key)
 
-            token_list.append(token_dict)
+        token_list.append(token_dict)
 
     ret = {"tokens": token_list,
            "prev": prev,
@@ -1158,6 +1224,31 @@ def import_token(serial, token_dict, tokenrealms=None):
     return token
 
 
+@log_with(log, log_entry=False)
+def import_tokens(tokens, tokenrealms=None):
+    """
+    Import several tokens of a token file. The OTP keys of all tokens are
+    encrypted at once by the security module.
+
+    :param tokens: A dictionary of the serial numbers and the token
+        dictionaries as described in :func:`import_token`
+    :type tokens: dict
+    :param tokenrealms: List of realms to set as realms of the tokens
+    :type tokenrealms: list
+    :return: list of the token objects
+    """
+    otpkeys = [token_dict.get("otpkey") for token_dict in tokens.values() if token_dict.get("otpkey")]
+    # New tokens are created with an empty key, before the key is set
+    existing = {t.serial for t in Token.query.filter(Token.serial.in_(list(tokens))).with_entities(Token.serial)}
+    otpkeys.extend("" for serial in tokens if serial not in existing)
+    token_objects = []
+    with encryption_batch(otpkeys):
+        for serial, token_dict in tokens.items():
+            log.info("initialize token. serial: {0!s}, realm: {1!s}".format(serial, tokenrealms))
+            token_objects.append(import_token(serial, token_dict, tokenrealms=tokenrealms))
+    return token_objects
+
+
 @log_with(log)
 def init_token(param, user=None, tokenrealms=None,
                tokenkind=None):
@@ -1616,7 +1616,8 @@ class TokenClass(object):
         # get the challenges for this transaction ID
         if transaction_id is not None:
             challengeobject_list = get_challenges(serial=self.token.serial,
-                                                  transaction_id=transaction_id)
+                                                  transaction_id=transaction_id,
+                                                  only_valid=True)
 
             for challengeobject in challengeobject_list:
                 if challengeobject.is_valid():
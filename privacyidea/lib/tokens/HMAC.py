@@ -83,6 +83,43 @@ class HmacOtp(object):
 
         return dig
 
+    def hmac_window(self, start, end, key=None):
+        """
+        Calculate the HMAC for all counters in the range ``start`` to ``end``.
+        The key schedule is only set up once for the whole window.
+
+        :param start: the first counter
+        :param end: the counter after the last counter
+        :param key: the key, if the secretObj should not be used
+        :return: generator of the digests
+        """
+        data_inputs = (struct.pack(">Q", c) for c in range(start, end))
+        if key is None:
+            return self.secretObj.hmac_digests(data_inputs, self.hashfunc)
+        h = hmac.new(key, digestmod=self.hashfunc)
+        return self._copy_digests(h, data_inputs)
+
+    @staticmethod
+    def _copy_digests(h, data_inputs):
+        for data_input in data_inputs:
+            h_copy = h.copy()
+            h_copy.update(data_input)
+            yield h_copy.digest()
+
+    def generate_window(self, start, end, key=None):
+        """
+        Generate the truncated OTP values for all counters in the range
+        ``start`` to ``end``.
+
+        :return: generator of the OTP values
+        :rtype: str
+        """
+        modulus = 10 ** self.digits
+        otp_format = "{{0:0{0:d}d}}".format(self.digits)
+        for digest in self.hmac_window(start, end, key=key):
+            binary = struct.unpack_from(">I", digest, digest[-1] & 0x0f)[0] & 0x7fffffff
+            yield otp_format.format(binary % modulus)
+
     def truncate(self, digest):
         offset = digest[-1] & 0x0f
 
@@ -148,12 +185,12 @@ class HmacOtp(object):
             end = self.counter + (window)
 
         log.debug("OTP range counter: {0!r} - {1!r}".format(start, end))
-        for c in range(start, end):
-            otpval = self.generate(c)
-            #log.debug("calculating counter {0!r}".format(c))
-
+        for c, otpval in enumerate(self.generate_window(start, end), start):
             if safe_compare(otpval, anOtpVal):
                 res = c
                 break
+        if end > start:
+            # like generate(), the counter points behind the last calculated value
+            self.counter = c + 1
         # return -1 or the counter
         return res
@@ -681,11 +681,10 @@ class HotpTokenClass(TokenClass):
 
         if count > 0:
             error = "OK"
-            for i in range(count):
-                otpval = hmac2Otp.generate(self.token.count + i,
-                                           inc_counter=False)
+            start = self.token.count
+            for i, otpval in enumerate(hmac2Otp.generate_window(start, start + count)):
                 if counter_index:
-                    otp_dict["otp"][self.token.count + i] = otpval
+                    otp_dict["otp"][start + i] = otpval
                 else:
                     otp_dict["otp"][i] = otpval
             ret = True
@@ -59,7 +59,8 @@ from privacyidea.lib.user import User
 from privacyidea.lib.apps import _construct_extra_parameters
 from privacyidea.lib.crypto import geturandom, generate_keypair
 from privacyidea.lib.smsprovider.SMSProvider import get_smsgateway, create_sms_instance
-from privacyidea.lib.challenge import get_challenges
+from privacyidea.lib.challenge import (get_challenges, get_challenge_notifier,
+                                       notify_challenge_answer)
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
@@ -79,7 +80,6 @@ PUBLIC_KEY_SMARTPHONE = "public_key_smartphone"
 POLLING_ALLOWED = "polling_allowed"
 GWTYPE = 'privacyidea.lib.smsprovider.FirebaseProvider.FirebaseProvider'
 ISO_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
-DELAY = 1.0
 
 # Timedelta in minutes
 POLL_TIME_WINDOW = 1
@@ -724,6 +724,9 @@ class PushTokenClass(TokenClass):
                             else:
                                 chal.set_otp_status(True)
                         chal.save()
+                        if result:
+                            # wake up a request waiting for this challenge (push_wait)
+                            notify_challenge_answer(chal.transaction_id)
                     except InvalidSignature as _e:
                         pass
         elif all(k in request_data for k in ('new_fb_token', 'timestamp', 'signature')):
@@ -1098,15 +1101,22 @@ class PushTokenClass(TokenClass):
                 waiting = int(options.get(PUSH_ACTION.WAIT, 20))
                 # Trigger the challenge
                 _t, _m, transaction_id, _attr = self.create_challenge(options=options)
-                # now we need to check and wait for the response to be answered in the challenge table
+                # now we need to check and wait for the response to be answered in the challenge table.
+                # The challenge notifier wakes us up, when the answer is received. We subscribe
+                # before reading the challenge table, so that we do not miss an answer.
+                notifier = get_challenge_notifier()
                 starttime = time.time()
-                while True:
-                    db.session.commit()
-                    otp_counter = self.check_challenge_response(options={"transaction_id": transaction_id})
-                    elapsed_time = time.time() - starttime
-                    if otp_counter >= 0 or elapsed_time > waiting or elapsed_time < 0:
-                        break
-                    time.sleep(DELAY - (elapsed_time % DELAY))
+                with notifier.subscribe(transaction_id) as subscription:
+                    while True:
+                        db.session.commit()
+                        otp_counter = self.check_challenge_response(options={"transaction_id": transaction_id})
+                        elapsed_time = time.time() - starttime
+                        if otp_counter >= 0 or elapsed_time > waiting or elapsed_time < 0:
+                            break
+                        timeout = waiting - elapsed_time
+                        if notifier.poll_interval > 0:
+                            timeout = min(timeout, notifier.poll_interval - (elapsed_time % notifier.poll_interval))
+                        subscription.wait(timeout)
 
         return pin_match, otp_counter, reply
 
@@ -1141,7 +1151,8 @@ class PushTokenClass(TokenClass):
         # get the challenges for this transaction ID
         if transaction_id is not None:
             challengeobject_list = get_challenges(serial=self.token.serial,
-                                                  transaction_id=transaction_id)
+                                                  transaction_id=transaction_id,
+                                                  only_valid=True)
 
             for challengeobject in challengeobject_list:
                 # check if we are still in time.
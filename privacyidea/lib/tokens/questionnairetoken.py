@@ -302,7 +302,8 @@ class QuestionnaireTokenClass(TokenClass):
         # get the challenges for this transaction ID
         if transaction_id is not None:
             challengeobject_list = get_challenges(serial=self.token.serial,
-                                                  transaction_id=transaction_id)
+                                                  transaction_id=transaction_id,
+                                                  only_valid=True)
 
             for challengeobject in challengeobject_list:
                 if challengeobject.is_valid():
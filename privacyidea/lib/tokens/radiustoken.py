@@ -274,7 +274,8 @@ class RadiusTokenClass(RemoteTokenClass):
         if transaction_id:
             # get the challenges for this transaction ID
             challengeobject_list = get_challenges(serial=self.token.serial,
-                                                  transaction_id=transaction_id)
+                                                  transaction_id=transaction_id,
+                                                  only_valid=True)
 
             for challengeobject in challengeobject_list:
                 if challengeobject.is_valid():
@@ -311,7 +312,8 @@ class RadiusTokenClass(RemoteTokenClass):
         # get the challenges for this transaction ID
         if transaction_id is not None:
             challengeobject_list = get_challenges(serial=self.token.serial,
-                                                  transaction_id=transaction_id)
+                                                  transaction_id=transaction_id,
+                                                  only_valid=True)
 
             for challengeobject in challengeobject_list:
                 if challengeobject.is_valid():
@@ -471,7 +471,8 @@ class TiqrTokenClass(OcraTokenClass):
         # get the challenges for this transaction ID
         if transaction_id is not None:
             challengeobject_list = get_challenges(serial=self.token.serial,
-                                                  transaction_id=transaction_id)
+                                                  transaction_id=transaction_id,
+                                                  only_valid=True)
             for challengeobject in challengeobject_list:
                 # check if we are still in time.
                 if challengeobject.is_valid():
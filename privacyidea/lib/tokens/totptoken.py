@@ -613,9 +613,8 @@ class TotpTokenClass(HotpTokenClass):
 
         if count > 0:
             error = "OK"
-            for i in range(0, count):
-                otpval = hmac2Otp.generate(counter=counter + i,
-                                           inc_counter=False)
+            otpvals = hmac2Otp.generate_window(counter, counter + count)
+            for i, otpval in enumerate(otpvals):
                 timeCounter = ((counter + i) * self.timestep) + self.timeshift
 
                 val_time = datetime.datetime.\
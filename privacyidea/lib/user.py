@@ -60,7 +60,8 @@ from .realm import (get_realms, realm_is_defined,
                     get_realm, get_realm_id)
 from .config import get_from_config, SYSCONF
 from .framework import get_app_config_value
-from .usercache import (user_cache, cache_username, user_init, delete_user_cache)
+from .usercache import (user_cache, cache_username, user_init, delete_user_cache,
+                        is_cache_enabled)
 from privacyidea.models import CustomUserAttribute, db
 
 log = logging.getLogger(__name__)
@@ -808,6 +809,29 @@ def get_username(userid, resolvername):
     return username
 
 
+def get_usernames(userids, resolvername):
+    """
+    Determine the usernames for a list of ids in one resolver.
+    If the user cache is enabled, the names are looked up via
+    :py:func:`get_username`, so that the cache is used and filled.
+
+    :param userids: The ids of the users in the resolver
+    :type userids: list
+    :param resolvername: The name of the resolver
+    :return: dictionary of userid and username without the users, which do not exist
+    :rtype: dict
+    """
+    userids = [userid for userid in set(userids) if userid]
+    if is_cache_enabled():
+        usernames = {userid: get_username(userid, resolvername) for userid in userids}
+        return {userid: username for userid, username in usernames.items() if username}
+    usernames = {}
+    y = get_resolver_object(resolvername)
+    if y and userids:
+        usernames = y.getUsernames(userids)
+    return usernames
+
+
 def log_used_user(user, other_text=""):
     """
     This creates a log message combined of a user and another text.
@@ -45,7 +45,8 @@ from flask_sqlalchemy import SQLAlchemy
 
 from privacyidea.lib.crypto import (encrypt, encryptPin, decryptPin,
                                     geturandom, hash, SecretObj, pass_hash,
-                                    verify_pass_hash, get_rand_digit_str)
+                                    verify_pass_hash, get_rand_digit_str,
+                                    invalidate_key_cache, encrypt_with_random_iv)
 from sqlalchemy import and_
 from sqlalchemy.schema import Sequence, CreateSequence
 from sqlalchemy.ext.compiler import compiles
@@ -66,6 +67,10 @@ log = logging.getLogger(__name__)
 
 implicit_returning = True
 PRIVACYIDEA_TIMESTAMP = "__timestamp__"
+# The shared config object consists of these sections. Each section has its
+# own timestamp in the config table, so that only changed sections need to
+# be reloaded.
+CONFIG_SECTIONS = ["config", "resolver", "realm", "policy", "event", "caconnector"]
 SAFE_STORE = "PI_DB_SAFE_STORE"
 
 db = SQLAlchemy()
@@ -105,20 +110,38 @@ class MethodsMixin(object):
         return ret
 
 
-def save_config_timestamp(invalidate_config=True):
+def get_config_timestamp_key(section):
+    """
+    :param section: one of ``CONFIG_SECTIONS``
+    :return: the key of the config entry containing the timestamp of the section
+    """
+    return "{0!s}{1!s}".format(PRIVACYIDEA_TIMESTAMP, section)
+
+
+def save_config_timestamp(invalidate_config=True, sections=None):
     """
     Save the current timestamp to the database, and optionally
     invalidate the current request-local config object.
+
+    Besides the global timestamp, the timestamps of the changed config
+    sections are updated. They contain microseconds, so that subsequent
+    changes within the same second can be distinguished.
+
     :param invalidate_config: defaults to True
-    """
-    c1 = Config.query.filter_by(Key=PRIVACYIDEA_TIMESTAMP).first()
-    if c1:
-        c1.Value = datetime.now().strftime("%s")
-    else:
-        new_timestamp = Config(PRIVACYIDEA_TIMESTAMP,
-                               datetime.now().strftime("%s"),
+    :param sections: list of the changed config sections. Defaults to all sections.
+    """
+    now = datetime.now()
+    timestamps = {PRIVACYIDEA_TIMESTAMP: now.strftime("%s")}
+    for section in CONFIG_SECTIONS if sections is None else sections:
+        timestamps[get_config_timestamp_key(section)] = "{0:.6f}".format(now.timestamp())
+    for c1 in Config.query.filter(Config.Key.in_(list(timestamps))).all():
+        c1.Value = timestamps.pop(c1.Key)
+    for key, value in timestamps.items():
+        new_timestamp = Config(key, value,
                                Description="config timestamp. last changed.")
         db.session.add(new_timestamp)
+    # The config notifier is called after the transaction has been committed
+    db.session.info["config_changed"] = True
     if invalidate_config:
         # We have just modified the config. From now on, the request handling
         # should operate on the *new* config. Hence, we need to invalidate
@@ -133,17 +156,19 @@ class TimestampMethodsMixin(object):
     """
     This class mixes in the table functions including update of the timestamp
     """
+    # The config sections, which are changed by this table. None means all sections.
+    config_sections = None
 
     def save(self):
         db.session.add(self)
-        save_config_timestamp()
+        save_config_timestamp(sections=self.config_sections)
         db.session.commit()
         return self.id
 
     def delete(self):
         ret = self.id
         db.session.delete(self)
-        save_config_timestamp()
+        save_config_timestamp(sections=self.config_sections)
         db.session.commit()
         return ret
 
@@ -273,12 +298,21 @@ class Token(MethodsMixin, db.Model):
             if tr or to:
                 db.session.commit()
 
+    # The owners can not be loaded eagerly, since the relationship is dynamic.
+    # When listing many tokens, they are fetched in one query and set here
+    # for the duration of the listing (see privacyidea.lib.token).
+    prefetched_owners = None
+
     @property
     def first_owner(self):
+        if self.prefetched_owners is not None:
+            return self.prefetched_owners[0] if self.prefetched_owners else None
         return self.owners.first()
 
     @property
     def all_owners(self):
+        if self.prefetched_owners is not None:
+            return list(self.prefetched_owners)
         return self.owners.all()
 
     @log_with(log)
@@ -286,6 +320,7 @@ class Token(MethodsMixin, db.Model):
         # some DBs (e.g. DB2) run in a deadlock, if the TokenRealm entry
         # is deleted via key relation, so we delete it explicitly
         ret = self.id
+        invalidate_key_cache(self.serial)
         db.session.query(TokenRealm) \
             .filter(TokenRealm.token_id == self.id) \
             .delete()
@@ -328,8 +363,8 @@ class Token(MethodsMixin, db.Model):
 
     @log_with(log, hide_args=[1])
     def set_otpkey(self, otpkey, reset_failcount=True):
-        iv = geturandom(16)
-        self.key_enc = encrypt(otpkey, iv)
+        invalidate_key_cache(self.serial)
+        self.key_enc, iv = encrypt_with_random_iv(otpkey)
         length = len(self.key_enc)
         if length > Token.key_enc.property.columns[0].type.length:
             log.error("Key {0!s} exceeds database field {1:d}!".format(self.serial,
@@ -431,7 +466,7 @@ class Token(MethodsMixin, db.Model):
     def get_otpkey(self):
         key = binascii.unhexlify(self.key_enc)
         iv = binascii.unhexlify(self.key_iv)
-        secret = SecretObj(key, iv)
+        secret = SecretObj(key, iv, serial=self.serial)
         return secret
 
     @log_with(log)
@@ -912,6 +947,7 @@ class Config(TimestampMethodsMixin, db.Model):
     Additional configuration for realms, resolvers and machine resolvers is
     stored in specific tables.
     """
+    config_sections = ["config"]
     __tablename__ = "config"
     __table_args__ = {'mysql_row_format': 'DYNAMIC'}
     Key = db.Column(db.Unicode(255),
@@ -933,14 +969,14 @@ class Config(TimestampMethodsMixin, db.Model):
 
     def save(self):
         db.session.add(self)
-        save_config_timestamp()
+        save_config_timestamp(sections=self.config_sections)
         db.session.commit()
         return self.Key
 
     def delete(self):
         ret = self.Key
         db.session.delete(self)
-        save_config_timestamp()
+        save_config_timestamp(sections=self.config_sections)
         db.session.commit()
         return ret
 
@@ -951,6 +987,7 @@ class Realm(TimestampMethodsMixin, db.Model):
     grouped to realms. This very table contains just contains the names of
     the realms. The linking to resolvers is stored in the table "resolverrealm".
     """
+    config_sections = ["realm"]
     __tablename__ = 'realm'
     __table_args__ = {'mysql_row_format': 'DYNAMIC'}
     id = db.Column(db.Integer, Sequence("realm_seq"), primary_key=True,
@@ -980,7 +1017,7 @@ class Realm(TimestampMethodsMixin, db.Model):
             .delete()
         # delete the realm
         db.session.delete(self)
-        save_config_timestamp()
+        save_config_timestamp(sections=self.config_sections)
         db.session.commit()
         return ret
 
@@ -991,6 +1028,7 @@ class CAConnector(TimestampMethodsMixin, db.Model):
     CA connectors. Each connector has a different configuration, that is
     stored in the table "caconnectorconfig".
     """
+    config_sections = ["caconnector"]
     __tablename__ = 'caconnector'
     __table_args__ = {'mysql_row_format': 'DYNAMIC'}
     id = db.Column(db.Integer, Sequence("caconnector_seq"), primary_key=True,
@@ -1015,7 +1053,7 @@ class CAConnector(TimestampMethodsMixin, db.Model):
             .delete()
         # Delete the CA itself
         db.session.delete(self)
-        save_config_timestamp()
+        save_config_timestamp(sections=self.config_sections)
         db.session.commit()
         return ret
 
@@ -1062,7 +1100,7 @@ class CAConnectorConfig(db.Model):
     def save(self):
         c = CAConnectorConfig.query.filter_by(caconnector_id=self.caconnector_id,
                                               Key=self.Key).first()
-        save_config_timestamp()
+        save_config_timestamp(sections=["caconnector"])
         if c is None:
             # create a new one
             db.session.add(self)
@@ -1096,6 +1134,8 @@ class Resolver(TimestampMethodsMixin, db.Model):
     Resolvers. As each Resolver can have different required config values the
     configuration of the resolvers is stored in the table "resolverconfig".
     """
+    # The realm definitions contain the names and types of the resolvers
+    config_sections = ["resolver", "realm"]
     __tablename__ = 'resolver'
     __table_args__ = {'mysql_row_format': 'DYNAMIC'}
     id = db.Column(db.Integer, Sequence("resolver_seq"), primary_key=True,
@@ -1123,7 +1163,7 @@ class Resolver(TimestampMethodsMixin, db.Model):
             .delete()
         # delete the Resolver itself
         db.session.delete(self)
-        save_config_timestamp()
+        save_config_timestamp(sections=self.config_sections)
         db.session.commit()
         return ret
 
@@ -1138,6 +1178,7 @@ class ResolverConfig(TimestampMethodsMixin, db.Model):
 
     The config entries are referenced by the id of the resolver.
     """
+    config_sections = ["resolver"]
     __tablename__ = 'resolverconfig'
     id = db.Column(db.Integer, Sequence("resolverconf_seq"), primary_key=True)
     resolver_id = db.Column(db.Integer,
@@ -1184,7 +1225,7 @@ class ResolverConfig(TimestampMethodsMixin, db.Model):
                                                      'Descrip'
                                                      'tion': self.Description})
             ret = c.id
-        save_config_timestamp()
+        save_config_timestamp(sections=self.config_sections)
         db.session.commit()
         return ret
 
@@ -1194,6 +1235,7 @@ class ResolverRealm(TimestampMethodsMixin, db.Model):
     This table stores which Resolver is located in which realm
     This is a N:M relation
     """
+    config_sections = ["realm"]
     __tablename__ = 'resolverrealm'
     id = db.Column(db.Integer, Sequence("resolverrealm_seq"), primary_key=True)
     resolver_id = db.Column(db.Integer, db.ForeignKey("resolver.id"))
@@ -1565,6 +1607,7 @@ class PolicyDescription(TimestampMethodsMixin, db.Model):
     """
     The description table is used to store the description of policy
     """
+    config_sections = ["policy"]
     __tablename__ = 'description'
     id = db.Column(db.Integer, Sequence("description_seq"), primary_key=True)
     object_id = db.Column(db.Integer, db.ForeignKey('policy.id'), nullable=False)
@@ -1601,6 +1644,7 @@ class Policy(TimestampMethodsMixin, db.Model):
      * user actions
      * webui
     """
+    config_sections = ["policy"]
     __tablename__ = "policy"
     __table_args__ = {'mysql_row_format': 'DYNAMIC'}
     id = db.Column(db.Integer, Sequence("policy_seq"), primary_key=True)
@@ -2035,7 +2079,7 @@ class EventHandler(MethodsMixin, db.Model):
                 "condition": self.condition,
                 "action": self.action
             })
-        save_config_timestamp()
+        save_config_timestamp(sections=["event"])
         db.session.commit()
         return self.id
 
@@ -2051,7 +2095,7 @@ class EventHandler(MethodsMixin, db.Model):
             .delete()
         # delete the event handler itself
         db.session.delete(self)
-        save_config_timestamp()
+        save_config_timestamp(sections=["event"])
         db.session.commit()
         return ret
 
@@ -2695,7 +2739,8 @@ class ClientApplication(MethodsMixin, db.Model):
             ClientApplication.ip == self.ip,
             ClientApplication.clienttype == self.clienttype,
             ClientApplication.node == self.node).first()
-        self.lastseen = datetime.now()
+        if self.lastseen is None:
+            self.lastseen = datetime.now()
         if clientapp is None:
             # create a new one
             db.session.add(self)
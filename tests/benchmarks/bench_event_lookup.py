@@ -0,0 +1,77 @@
+# (c) NetKnights GmbH 2024,  https://netknights.it
+#
+# This code is free software; you can redistribute it and/or
+# modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+# as published by the Free Software Foundation; either
+# version 3 of the License, or any later version.
+#
+# This code is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU AFFERO GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+"""
+Measure the overhead of the event decorator for an API call without matching
+event handler definitions. Compare the former scan over all definitions with
+the EventIndex.
+
+Run it with::
+
+    python -m tests.benchmarks.bench_event_lookup
+"""
+import timeit
+
+from privacyidea.lib.event import event, EventIndex
+
+NUMBER_OF_DEFINITIONS = [10, 150, 500]
+EVENTS = ["token_init", "token_assign", "token_unassign", "token_delete", "token_enable",
+          "token_disable", "token_revoke", "token_set", "token_reset", "token_resync"]
+CALLS = 20000
+
+
+def create_definitions(number):
+    return [{"name": "event{0:d}".format(i),
+             "event": [EVENTS[i % len(EVENTS)], EVENTS[(i + 3) % len(EVENTS)]],
+             "active": i % 5 != 0,
+             "position": "pre" if i % 2 else "post",
+             "handlermodule": "Logging",
+             "action": "logging",
+             "conditions": {},
+             "options": {}} for i in range(number)]
+
+
+class ScanEventConfiguration(object):
+    def __init__(self, events):
+        self.events = events
+
+    def get_handled_events(self, eventname, position="post"):
+        return [e for e in self.events if (
+            eventname in e.get("event") and e.get("active") and e.get("position") == position)]
+
+
+class FakeG(object):
+    def __init__(self, event_config):
+        self.event_config = event_config
+
+
+def measure(event_config):
+    decorated = event("validate_check", None, FakeG(event_config))(lambda: None)
+    return timeit.timeit(decorated, number=CALLS) / CALLS
+
+
+def main():
+    print("{0:>12s} {1:>12s} {2:>12s} {3:>8s}".format("definitions", "scan [us]", "index [us]", "factor"))
+    for number in NUMBER_OF_DEFINITIONS:
+        events = create_definitions(number)
+        scan = measure(ScanEventConfiguration(events))
+        index = measure(EventIndex(events))
+        print("{0:12d} {1:12.2f} {2:12.2f} {3:8.2f}".format(number, scan * 1e6, index * 1e6, scan / index))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,64 @@
+# (c) NetKnights GmbH 2024,  https://netknights.it
+#
+# This code is free software; you can redistribute it and/or
+# modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+# as published by the Free Software Foundation; either
+# version 3 of the License, or any later version.
+#
+# This code is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU AFFERO GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+"""
+Compare the OTP window calculation of HmacOtp.checkOtp with the former
+loop over HmacOtp.generate.
+
+Run it with::
+
+    python -m tests.benchmarks.bench_hotp_window
+"""
+import binascii
+import timeit
+
+from privacyidea.lib.crypto import SecretObj, safe_compare
+from privacyidea.lib.tokens.HMAC import HmacOtp
+
+OTPKEY = binascii.unhexlify("3132333435363738393031323334353637383930")
+WINDOWS = [10, 100, 1000]
+
+
+class PlainSecretObj(SecretObj):
+    """
+    A SecretObj, which does not need an encryption key
+    """
+    def _setupKey_(self):
+        self.bkey = self.val
+
+
+def loop_check(hmac_otp, otp, window):
+    for c in range(hmac_otp.counter, hmac_otp.counter + window):
+        if safe_compare(hmac_otp.generate(c, inc_counter=False), otp):
+            return c
+    return -1
+
+
+def main():
+    print("{0:>8s} {1:>12s} {2:>12s} {3:>8s}".format("window", "loop [ms]", "window [ms]", "factor"))
+    for window in WINDOWS:
+        hmac_otp = HmacOtp(PlainSecretObj(OTPKEY, b""))
+        # The OTP value is not in the window, so the whole window is calculated
+        otp = "x" * hmac_otp.digits
+        number = max(10000 // window, 3)
+        loop = timeit.timeit(lambda: loop_check(hmac_otp, otp, window), number=number) / number
+        batch = timeit.timeit(lambda: hmac_otp.checkOtp(otp, window), number=number) / number
+        print("{0:8d} {1:12.3f} {2:12.3f} {3:8.2f}".format(window, loop * 1000, batch * 1000, loop / batch))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
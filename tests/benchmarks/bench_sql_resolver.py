@@ -0,0 +1,122 @@
+# (c) NetKnights GmbH 2024,  https://netknights.it
+#
+# This code is free software; you can redistribute it and/or
+# modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+# as published by the Free Software Foundation; either
+# version 3 of the License, or any later version.
+#
+# This code is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU AFFERO GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+"""
+Count the queries per request, which are sent to the user database, when
+resolving a user from an SQL resolver with and without the table registry.
+
+Run it with::
+
+    python -m tests.benchmarks.bench_sql_resolver
+"""
+import os
+import sqlite3
+import tempfile
+import timeit
+
+os.environ.setdefault("TEST_DATABASE_URL", "sqlite://")
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+from privacyidea.app import create_app  # noqa: E402
+from privacyidea.lib.framework import get_request_local_store  # noqa: E402
+from privacyidea.lib.lifecycle import call_finalizers  # noqa: E402
+from privacyidea.lib.pooling import get_table_registry  # noqa: E402
+from privacyidea.lib.realm import set_realm  # noqa: E402
+from privacyidea.lib.resolver import save_resolver  # noqa: E402
+from privacyidea.lib.user import User  # noqa: E402
+from privacyidea.models import db, save_config_timestamp  # noqa: E402
+
+REQUESTS = 200
+
+
+class QueryCounter(object):
+    """
+    Count the statements, which are executed in the given SQLite database
+    """
+    def __init__(self, database):
+        self.database = database
+        self.count = 0
+        event.listen(Engine, "before_cursor_execute", self)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if conn.engine.url.database == self.database:
+            self.count += 1
+
+
+def create_user_database(directory):
+    database = os.path.join(directory, "users.sqlite")
+    con = sqlite3.connect(database)
+    con.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(40), "
+                "email VARCHAR(80), givenname VARCHAR(40), surname VARCHAR(40))")
+    con.executemany("INSERT INTO users (username, email, givenname, surname) VALUES (?, ?, ?, ?)",
+                    [("user{0:d}".format(i), "user{0:d}@example.com".format(i), "Given", "Sur")
+                     for i in range(100)])
+    con.commit()
+    con.close()
+    return database
+
+
+def resolve_user():
+    User("user42", "sqlrealm").exist()
+    # emulate the end of a request
+    call_finalizers()
+    get_request_local_store().clear()
+
+
+def run(counter, use_registry):
+    counter.count = 0
+
+    def request():
+        if not use_registry:
+            get_table_registry().invalidate()
+        resolve_user()
+
+    duration = timeit.timeit(request, number=REQUESTS)
+    return counter.count / REQUESTS, duration / REQUESTS
+
+
+def main():
+    app = create_app("testing", "", silent=True)
+    with app.app_context(), tempfile.TemporaryDirectory() as directory:
+        db.create_all()
+        save_config_timestamp()
+        db.session.commit()
+        database = create_user_database(directory)
+        save_resolver({"resolver": "sqlresolver",
+                       "type": "sqlresolver",
+                       "Driver": "sqlite",
+                       "Server": "/",
+                       "Database": database.lstrip("/"),
+                       "Table": "users",
+                       "Map": '{"username": "username", "userid": "id", "email": "email", '
+                              '"givenname": "givenname", "surname": "surname"}'})
+        set_realm("sqlrealm", [{"name": "sqlresolver"}])
+        counter = QueryCounter(database)
+        # warm up
+        resolve_user()
+        print("{0:>16s} {1:>18s} {2:>14s}".format("", "queries/request", "time [ms]"))
+        for name, use_registry in [("reflect always", False), ("table registry", True)]:
+            queries, duration = run(counter, use_registry)
+            print("{0:>16s} {1:18.1f} {2:14.3f}".format(name, queries, duration * 1000))
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -17,15 +17,21 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
+import datetime
+import tempfile
+
+import mock
 import pytest
+import yaml
 from sqlalchemy.orm.session import close_all_sessions
 
 from privacyidea.app import create_app
-from privacyidea.models import db
+from privacyidea.models import db, Audit as LogEntry
 from privacyidea.cli.pimanage import cli as pi_manage
 from privacyidea.lib.lifecycle import call_finalizers
 from privacyidea.lib.resolver import (save_resolver, delete_resolver,
                                       get_resolver_list)
+from privacyidea.lib.token import get_tokens, import_tokens, remove_token
 from .base import CliTestCase
 from ..base import PWFILE
 
@@ -53,6 +59,54 @@ class PIManageAuditTestCase(CliTestCase):
         self.assertIn("Dump the audit log in csv format.", result.output, result)
         self.assertIn("Clean the SQL audit log.", result.output, result)
 
+    def test_02_pimanage_audit_rotate_config(self):
+        now = datetime.datetime.now()
+        old = now - datetime.timedelta(days=20)
+        entries = []
+        for date, action, user in [(old, "POST /validate/check", "nils"),
+                                   (now, "POST /validate/check", "nils"),
+                                   (old, "POST /validate/check", "hans"),
+                                   (old, "GET /token/", None),
+                                   (old, "POST /token/init", "hans"),
+                                   (old, "POST /token/init%", "nils")]:
+            entry = LogEntry(action=action, user=user)
+            entry.date = date
+            entries.append(entry)
+        db.session.add_all(entries)
+        db.session.commit()
+        ids = [entry.id for entry in entries]
+        rules = [{"rotate": 10, "user": "^nils$", "action": "/validate/check"},
+                 {"rotate": 30, "action": r"\/validate\/c.+k"},
+                 {"rotate": 10, "action": "^GET /token", "user": "None"},
+                 {"rotate": 10, "action": "token/init%"},
+                 {"rotate": 1000, "action": ".*"}]
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml") as config:
+            yaml.safe_dump(rules, config)
+            config.flush()
+            runner = self.app.test_cli_runner()
+            result = runner.invoke(pi_manage, ["audit", "rotate", "--config", config.name,
+                                               "--dryrun"])
+            self.assertIn("I would clean up 3 entries!", result.output, result)
+            self.assertEqual(LogEntry.query.filter(LogEntry.id.in_(ids)).count(), 6)
+
+            result = runner.invoke(pi_manage, ["audit", "rotate", "--config", config.name,
+                                               "--chunksize", "2"])
+            self.assertIn("Cleaned up 3 entries.", result.output, result)
+        # The old entry of "nils" for /validate/check, the token listing without a user
+        # and the token init with the percent sign are deleted
+        remaining = [entry.id for entry in LogEntry.query.filter(LogEntry.id.in_(ids))]
+        self.assertEqual(remaining, [ids[1], ids[2], ids[4]])
+        LogEntry.query.filter(LogEntry.id.in_(ids)).delete()
+        db.session.commit()
+
+        # unknown columns are rejected
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml") as config:
+            yaml.safe_dump([{"rotate": 10, "unknown": "value"}], config)
+            config.flush()
+            result = runner.invoke(pi_manage, ["audit", "rotate", "--config", config.name])
+            self.assertNotEqual(result.exit_code, 0, result)
+            self.assertIn("Unknown audit column 'unknown'", result.output, result)
+
 
 class PIManageBackupTestCase(CliTestCase):
     def test_01_pimanage_backup_help(self):
@@ -153,6 +207,22 @@ class PIManageTokenTestCase(CliTestCase):
         self.assertIn("Commands to manage token in privacyIDEA", result.output, result)
         self.assertIn("Import tokens from a file", result.output, result)
 
+    def test_02_pimanage_token_import(self):
+        runner = self.app.test_cli_runner()
+        with mock.patch("privacyidea.cli.pimanage.token.import_token_list",
+                        wraps=import_tokens) as mock_import:
+            result = runner.invoke(pi_manage, ["token", "import", "tests/testdata/import.oath"])
+        self.assertEqual(result.exit_code, 0, result)
+        # All tokens are imported with one call, so that their keys are encrypted at once
+        mock_import.assert_called_once()
+        serials = list(mock_import.call_args[0][0])
+        self.assertIn("Importing {0!s} tokens".format(len(serials)), result.output, result)
+        self.assertIn("{0!s}/{0!s} Imported token {1!s}".format(len(serials), serials[-1]),
+                      result.output, result)
+        for serial in serials:
+            self.assertEqual(get_tokens(serial=serial)[0].token.serial, serial)
+            remove_token(serial)
+
 
 @pytest.fixture(scope="function")
 def create_user_resolver(app):
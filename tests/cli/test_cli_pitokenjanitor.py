@@ -19,6 +19,7 @@
 
 from .base import CliTestCase
 from privacyidea.cli.privacyideatokenjanitor import cli as pi_token_janitor
+from privacyidea.lib.token import init_token
 
 
 class PITokenJanitorLoadTestCase(CliTestCase):
@@ -31,3 +32,32 @@ class PITokenJanitorLoadTestCase(CliTestCase):
                       result.output, result)
         self.assertIn("Finds all tokens which match the conditions.",
                       result.output, result)
+
+
+class PITokenJanitorFindTestCase(CliTestCase):
+    def test_01_find_tokeninfo_key_in_chunks(self):
+        for i in range(5):
+            token = init_token({"type": "hotp", "otpkey": "3132333435363738393031323334353637383930",
+                                "serial": "JANITOR{0:d}".format(i)})
+            if i % 2:
+                token.add_tokeninfo("import_file", "file{0:d}.csv".format(i))
+        runner = self.app.test_cli_runner()
+        for chunksize in [[], ["--chunksize", "2"]]:
+            result = runner.invoke(pi_token_janitor, ["find", "--has-tokeninfo-key", "import_file"] + chunksize)
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertIn("JANITOR1 (hotp)", result.output, result)
+            self.assertIn("JANITOR3 (hotp)", result.output, result)
+            self.assertNotIn("JANITOR0", result.output, result)
+            self.assertNotIn("JANITOR2", result.output, result)
+
+            result = runner.invoke(pi_token_janitor, ["find", "--has-not-tokeninfo-key", "import_file"] + chunksize)
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertIn("JANITOR0 (hotp)", result.output, result)
+            self.assertNotIn("JANITOR1", result.output, result)
+
+            result = runner.invoke(pi_token_janitor, ["find", "--tokeninfo-key", "import_file",
+                                                      "--tokeninfo-value", "file3"] + chunksize)
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertIn("JANITOR3 (hotp)", result.output, result)
+            self.assertNotIn("JANITOR1", result.output, result)
+            self.assertNotIn("JANITOR0", result.output, result)
@@ -122,6 +122,7 @@ class Connection(object):
         import copy
         self.directory = copy.deepcopy(directory)
         self.bound = False
+        self.closed = False
         self.start_tls_called = False
         self.extend = self.Extend(self)
 
@@ -648,6 +649,8 @@ class Connection(object):
         return True
 
     def unbind(self):
+        self.bound = False
+        self.closed = True
         return True
 
 
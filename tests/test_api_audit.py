@@ -1,3 +1,4 @@
+import gzip
 import mock
 from contextlib import contextmanager
 from datetime import datetime, timedelta
@@ -110,6 +111,18 @@ class APIAuditTestCase(MyApiTestCase):
             # result data
             self.assertNotIn(b"'enroll','1','','','','foo'", res.data, res)
 
+        # download the compressed file
+        with self.app.test_request_context('/audit/test.csv.gz',
+                                           method='GET',
+                                           headers={'Authorization': self.at}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 200, res)
+            self.assertEqual(res.mimetype, 'application/gzip', res)
+            self.assertEqual('attachment; filename=test.csv.gz',
+                             res.headers['Content-disposition'], res.headers)
+            data = gzip.decompress(res.data)
+            self.assertIn(b"'enroll','','1','','','','','','foo'", data)
+
     def test_02_get_allowed_audit_realm(self):
         # Check that an administrator is only allowed to see log entries of
         # the defined realms.
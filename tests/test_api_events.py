@@ -1,5 +1,7 @@
 from privacyidea.lib.container import init_container, add_token_to_container
-from privacyidea.lib.event import set_event, delete_event
+from privacyidea.lib.event import set_event, delete_event, get_event_worker_pool
+from privacyidea.lib.error import ParameterError
+from privacyidea.lib.framework import get_app_local_store
 from privacyidea.lib.eventhandler.containerhandler import ContainerEventHandler
 from privacyidea.lib.eventhandler.customuserattributeshandler import ACTION_TYPE, USER_TYPE
 from privacyidea.lib.policy import SCOPE, set_policy, delete_policy
@@ -8,6 +10,7 @@ from privacyidea.lib.user import User
 from .base import MyApiTestCase, FakeFlaskG
 from . import smtpmock
 import mock
+import privacyidea.lib.event
 from privacyidea.lib.config import set_privacyidea_config
 
 # TODO: this should be imported from lib.event when available
@@ -281,6 +284,17 @@ class APIEventsTestCase(MyApiTestCase):
             set_random_pin = result.get("value").get("set random pin")
             # The valid OTP PIN length is returned as list
             self.assertTrue(type(set_random_pin.get("length").get("value")), "list")
+            # The actions can run asynchronously
+            self.assertIn("run_async", set_random_pin)
+
+        with self.app.test_request_context('/event/actions/ResponseMangler',
+                                           method='GET',
+                                           headers={'Authorization': self.at}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 200, res)
+            result = res.json.get("result")
+            for action_options in result.get("value").values():
+                self.assertNotIn("run_async", action_options)
 
     def test_05_get_handler_conditions(self):
         with self.app.test_request_context('/event/conditions/UserNotification',
@@ -845,3 +859,48 @@ class EventWrapperTestCase(MyApiTestCase):
             msg = smtpmock.get_sent_message()
             self.assertIn('To: donut@example.com', msg)
         delete_event(r)
+
+    @smtpmock.activate
+    def test_03_sendmail_post_async(self):
+        # The option can not be used for pre event handlers and handlers
+        # which modify the response
+        self.assertRaises(ParameterError, set_event, "send email", "token_init",
+                          "UserNotification", "sendmail", position="pre",
+                          options={"run_async": "1"})
+        self.assertRaises(ParameterError, set_event, "mangle", "token_init",
+                          "ResponseMangler", "delete", options={"run_async": "1"})
+        r = set_event("send email", "token_init", "UserNotification", "sendmail",
+                      conditions={},
+                      options={"emailconfig": "myserver",
+                               "To": "email",
+                               "To email": "waffle@example.com",
+                               "reply_to": "email",
+                               "reply_to email": "privacyidea@example.com",
+                               "run_async": "1"})
+        self.assertTrue(r > 0)
+
+        smtpmock.setdata(response={"waffle@example.com": (450, "Mailbox not available")},
+                         support_tls=False)
+
+        with mock.patch("privacyidea.lib.event._do_post_event_action",
+                        wraps=privacyidea.lib.event._do_post_event_action) as mock_action:
+            with self.app.test_request_context('/token/init',
+                                               data={"genkey": 1,
+                                                     "serial": self.serial},
+                                               headers={'Authorization': self.at},
+                                               method='POST'):
+                res = self.app.full_dispatch_request()
+                self.assertTrue(res.status_code == 200, res)
+                result = res.json.get("result")
+                self.assertTrue(result.get("value"), result)
+            # wait for the worker threads
+            get_event_worker_pool().shutdown()
+            get_app_local_store().pop("event_worker_pool")
+            mock_action.assert_called_once()
+            # The handler got a copy of the request and the response
+            options = mock_action.call_args[0][2]
+            self.assertEqual(options["request"].all_data.get("serial"), self.serial)
+            self.assertEqual(options["response"].json["detail"]["serial"], self.serial)
+            msg = smtpmock.get_sent_message()
+            self.assertIn('To: waffle@example.com', msg)
+        delete_event(r)
@@ -90,6 +90,8 @@ class APIMachineResolverTestCase(MyApiTestCase):
             self.assertTrue("machineresolver1" in result["value"], result)
             self.assertTrue("filename" in result["value"]["machineresolver1"][
                 "data"])
+            # The hosts resolver does not cache
+            self.assertNotIn("cache", result["value"]["machineresolver1"])
 
         # delete the resolver
         with self.app.test_request_context('/machineresolver/machineresolver1',
@@ -137,6 +139,16 @@ class APIMachineResolverTestCase(MyApiTestCase):
             self.assertTrue("LDAPURI" in result["value"]["machineresolver2"][
                 "data"])
 
+        # The cache statistics of the resolver are returned
+        with self.app.test_request_context('/machineresolver/machineresolver2',
+                                           method='GET',
+                                           headers={'Authorization': self.at}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 200, res)
+            result = res.json.get("result")
+            self.assertEqual(result["value"]["machineresolver2"]["cache"],
+                             {"hits": 0, "misses": 0, "size": 0}, result)
+
         # delete the resolver
         with self.app.test_request_context('/machineresolver/machineresolver2',
                                            method='DELETE',
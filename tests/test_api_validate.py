@@ -1414,6 +1414,58 @@ class ValidateAPITestCase(MyApiTestCase):
         remove_token(serial=serial)
         pol.delete()
 
+    def test_11d_challenge_response_expired(self):
+        # An expired challenge is answered with the same response as a wrong OTP
+        self.setUp_user_realms()
+        serial = "EXP1"
+        pin = "exp1"
+        init_token({'serial': serial,
+                    'type': 'hotp',
+                    'otpkey': self.otpkey,
+                    'pin': pin},
+                   user=User("cornelius", self.realm1))
+        pol = Policy('pol_chal_resp_exp', action='challenge_response=hotp',
+                     scope='authentication', realm='', active=True)
+        pol.save()
+        # The failcounter does not depend on a false PIN
+        set_privacyidea_config("IncFailCountOnFalsePin", False)
+
+        with self.app.test_request_context('/validate/check',
+                                           method='POST',
+                                           data={"user": "cornelius",
+                                                 "pass": pin}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 200, res)
+            self.assertFalse(res.json.get("result").get("value"))
+            transaction_id = res.json.get("detail").get("transaction_id")
+
+        # let the challenge expire
+        Challenge.query.filter_by(serial=serial, transaction_id=transaction_id).update(
+            {"expiration": datetime.datetime.utcnow() - datetime.timedelta(minutes=1)})
+        db.session.commit()
+        fail_count = get_one_token(serial=serial).get_failcount()
+
+        with self.app.test_request_context('/validate/check',
+                                           method='POST',
+                                           data={"user": "cornelius",
+                                                 "transaction_id": transaction_id,
+                                                 "pass": self.valid_otp_values[1]}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 200, res)
+            self.assertFalse(res.json.get("result").get("value"))
+            detail = res.json.get("detail")
+            self.assertEqual(serial, detail.get("serial"))
+            self.assertEqual("hotp", detail.get("type"))
+            self.assertEqual("Response did not match the challenge.", detail.get("message"))
+
+        self.assertEqual(get_one_token(serial=serial).get_failcount(), fail_count + 1)
+        # the expired challenge is removed
+        self.assertFalse(get_challenges(transaction_id=transaction_id))
+
+        delete_privacyidea_config("IncFailCountOnFalsePin")
+        remove_token(serial=serial)
+        pol.delete()
+
     def test_12_challenge_response_sms(self):
         # set a chalresp policy for SMS
         with self.app.test_request_context('/policy/pol_chal_resp',
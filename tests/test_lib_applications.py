@@ -2,7 +2,8 @@
 This test file tests the applications definitions standalone
 lib/applications/*
 """
-from privacyidea.lib.error import ParameterError
+from privacyidea.lib.error import ParameterError, ServerError
+from privacyidea.lib.framework import get_app_local_store
 from .base import MyTestCase
 from privacyidea.lib.applications import MachineApplicationBase
 from privacyidea.lib.applications.ssh import (MachineApplication as
@@ -11,7 +12,10 @@ from privacyidea.lib.applications.luks import (MachineApplication as
                                                LUKSApplication)
 from privacyidea.lib.applications.offline import (MachineApplication as
                                                   OfflineApplication,
-                                                  REFILLTOKEN_LENGTH)
+                                                  REFILLTOKEN_LENGTH,
+                                                  OFFLINE_HASH_WORKERS,
+                                                  OFFLINE_HASH_TIMEOUT,
+                                                  get_offline_hash_pool)
 from privacyidea.lib.applications import (get_auth_item,
                                           is_application_allow_bulk_call,
                                           get_application_types)
@@ -179,6 +183,33 @@ class OfflineApplicationTestCase(MyTestCase):
                                                                "s")
         self.assertEqual(auth_item, {})
 
+    def test_04_hash_offline_otps_in_pool(self):
+        tok = init_token({"serial": "OATH2", "type": "hotp", "otpkey": OTPKEY})
+        self.app.config[OFFLINE_HASH_WORKERS] = 2
+        try:
+            otps = OfflineApplication.get_offline_otps(tok, "pin", 5, rounds=1000)
+            self.assertIsNotNone(get_offline_hash_pool())
+            self.assertEqual(list(otps.keys()), [0, 1, 2, 3, 4])
+            for counter, otp in enumerate(["755224", "287082", "359152", "969429", "338314"]):
+                self.assertTrue(passlib.hash.pbkdf2_sha512.verify("pin" + otp, otps[counter]))
+                self.assertTrue(otps[counter].startswith("$pbkdf2-sha512$1000$"))
+            self.assertEqual(tok.token.count, 5)
+
+            # The hashing must not take longer than the timeout
+            self.app.config[OFFLINE_HASH_TIMEOUT] = 0.001
+            self.assertRaises(ServerError, OfflineApplication.get_offline_otps,
+                              tok, "pin", 10, rounds=100000)
+            # The counter is not increased
+            self.assertEqual(tok.token.count, 5)
+        finally:
+            self.app.config.pop(OFFLINE_HASH_WORKERS)
+            self.app.config.pop(OFFLINE_HASH_TIMEOUT, None)
+            get_app_local_store().pop("offline_hash_pool").shutdown()
+        # Without workers the values are hashed in the request
+        self.assertIsNone(get_offline_hash_pool())
+        otps = OfflineApplication.get_offline_otps(tok, "pin", 2, rounds=1000)
+        self.assertTrue(passlib.hash.pbkdf2_sha512.verify("pin" + "287922", otps[6]))
+
 
 class BaseApplicationTestCase(MyTestCase):
 
@@ -3,6 +3,7 @@ This tests the files
   lib/audit.py and
   lib/auditmodules/sqlaudit.py
 """
+import csv
 import datetime
 import os
 import types
@@ -15,6 +16,7 @@ from privacyidea.lib.audit import getAudit, search
 from privacyidea.lib.auditmodules.containeraudit import Audit as ContainerAudit
 from privacyidea.lib.auditmodules.loggeraudit import Audit as LoggerAudit
 from privacyidea.lib.auditmodules.sqlaudit import column_length
+from privacyidea.models import Audit as LogEntry
 from .base import MyTestCase, OverrideConfigTestCase
 from testfixtures import log_capture
 
@@ -198,6 +200,16 @@ class AuditTestCase(MyTestCase):
             count += 1
         self.assertEqual(count, 5)
 
+        # The entries are read in batches and escaped
+        self.Audit.log({"serial": "oath", "info": "it's, a test"})
+        self.Audit.finalize_log()
+        rows = list(csv.reader(self.Audit.csv_generator(param={"serial": "oath"}, batch_size=2),
+                               quotechar="'"))
+        self.assertEqual(3, len(rows))
+        self.assertEqual("it's, a test", rows[2][16])
+        self.assertEqual(["OK", "OK", "FAIL"], [row[3] for row in rows])
+        self.assertEqual([row[0] for row in rows], sorted(row[0] for row in rows))
+
     def test_06_truncate_data(self):
         long_serial = "This serial is much to long, you know it!"
         token_type = "12345678901234567890"
@@ -345,6 +357,61 @@ class AuditTestCase(MyTestCase):
                          set(self.Audit.available_audit_columns),
                          audit_log.auditdata[0].keys())
 
+    def test_12_buffered_writer(self):
+        with mock.patch.dict(self.app.config, {"PI_AUDIT_SQL_BUFFER_SIZE": 10,
+                                               "PI_AUDIT_SQL_BATCH_SIZE": 3,
+                                               "PI_AUDIT_SQL_FLUSH_INTERVAL": 0.1}):
+            try:
+                audit = getAudit(self.app.config)
+                writer = audit._get_writer()
+                self.assertIs(writer, getAudit(self.app.config)._get_writer())
+                # If the buffer is full, the entry is written synchronously
+                with mock.patch.object(writer, "put", return_value=False):
+                    audit.log({"action": "buffered", "serial": "sync"})
+                    audit.finalize_log()
+                self.assertEqual(1, audit.search({"serial": "sync"}).total)
+
+                for i in range(5):
+                    audit.log({"action": "buffered", "serial": "S{0!s}".format(i)})
+                    audit.finalize_log()
+                # flushes the remaining entries
+                writer.stop()
+                audit_log = audit.search({"action": "buffered"})
+                self.assertEqual(6, audit_log.total)
+                for entry in audit_log.auditdata:
+                    self.assertEqual("OK", entry.get("sig_check"), entry)
+
+                # An invalid entry in a batch does not prevent the other entries from being written
+                batch = [LogEntry(action="batch", serial="B{0!s}".format(i)) for i in range(3)]
+                batch[1].date = "invalid"
+                with mock.patch("privacyidea.lib.auditmodules.sqlaudit.log") as mock_log:
+                    writer.write(batch)
+                    mock_log.error.assert_called_once()
+                audit_log = audit.search({"action": "batch"})
+                self.assertEqual(["B0", "B2"], sorted(entry.get("serial") for entry in audit_log.auditdata))
+                for entry in audit_log.auditdata:
+                    self.assertEqual("OK", entry.get("sig_check"), entry)
+
+                # An entry, which can not be signed, is written without a signature
+                sign = writer.sign_object.sign
+
+                def sign_or_fail(s):
+                    if "U1" in s:
+                        raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+                    return sign(s)
+
+                batch = [LogEntry(action="unsigned", serial="U{0!s}".format(i)) for i in range(3)]
+                with mock.patch.object(writer.sign_object, "sign", side_effect=sign_or_fail):
+                    writer.write(batch)
+                audit_log = audit.search({"action": "unsigned"})
+                sig_checks = {entry.get("serial"): entry.get("sig_check") for entry in audit_log.auditdata}
+                self.assertEqual(["U0", "U1", "U2"], sorted(sig_checks))
+                self.assertEqual("OK", sig_checks["U0"])
+                self.assertNotEqual("OK", sig_checks["U1"])
+                self.assertEqual("OK", sig_checks["U2"])
+            finally:
+                self.app.config["_app_local_store"].pop("audit_writer", None)
+
 
 class AuditColumnLengthTestCase(OverrideConfigTestCase):
     class Config(TestingConfig):
@@ -8,10 +8,13 @@ from .base import MyTestCase
 from privacyidea.lib.authcache import (add_to_cache, delete_from_cache,
                                        update_cache, verify_in_cache,
                                        _hash_password,
-                                       cleanup)
+                                       cleanup, get_authcache_memory,
+                                       AuthCacheMemory)
+from privacyidea.lib.framework import get_app_local_store
 from passlib.hash import argon2
 from privacyidea.models import AuthCache
 import datetime
+import mock
 
 
 class AuthCacheTestCase(MyTestCase):
@@ -181,3 +184,87 @@ class AuthCacheTestCase(MyTestCase):
 
         auth = AuthCache.query.filter(AuthCache.username == self.username).first()
         self.assertEqual(auth, None)
+
+    def test_07_memory_tier(self):
+        cleanup(100000000)
+        with mock.patch.dict(self.app.config, {"PI_AUTHCACHE_MEMORY_SIZE": 2,
+                                               "PI_AUTHCACHE_WRITEBACK_INTERVAL": 3600}):
+            memory = get_authcache_memory()
+            try:
+                r = add_to_cache(self.username, self.realm, self.resolver, self.password)
+                # The first authentications are answered from memory
+                with mock.patch("privacyidea.lib.authcache.argon2.verify") as mock_verify:
+                    self.assertTrue(verify_in_cache(self.username, self.realm, self.resolver,
+                                                    self.password))
+                    self.assertTrue(verify_in_cache(self.username, self.realm, self.resolver,
+                                                    self.password))
+                    mock_verify.assert_not_called()
+                self.assertEqual(2, memory.hits)
+                self.assertFalse(verify_in_cache(self.username, self.realm, self.resolver,
+                                                 "wrong"))
+                # The database is updated in a batch
+                auth = AuthCache.query.filter(AuthCache.id == r).first()
+                self.assertEqual(2, auth.auth_count)
+
+                # With max_auths the database decides
+                self.assertTrue(verify_in_cache(self.username, self.realm, self.resolver,
+                                                self.password, max_auths=3))
+                self.assertEqual(2, memory.hits)
+                # max_auths is reached, the database entry is deleted
+                self.assertFalse(verify_in_cache(self.username, self.realm, self.resolver,
+                                                 self.password, max_auths=3))
+                self.assertIsNone(AuthCache.query.filter(AuthCache.id == r).first())
+
+                # a cache entry in the database is added to memory after verification
+                r = add_to_cache(self.username, self.realm, self.resolver, self.password)
+                memory.clear()
+                self.assertTrue(verify_in_cache(self.username, self.realm, self.resolver,
+                                                self.password))
+                self.assertTrue(verify_in_cache(self.username, self.realm, self.resolver,
+                                                self.password))
+                self.assertEqual(3, memory.hits)
+                memory.stop()
+                auth = AuthCache.query.filter(AuthCache.id == r).first()
+                self.assertEqual(2, auth.auth_count)
+
+                # first_auth and last_auth are respected
+                self.assertFalse(verify_in_cache(self.username, self.realm, self.resolver,
+                                                 self.password,
+                                                 first_auth=datetime.datetime.utcnow()))
+
+                # The memory tier is bounded
+                for user in ["user1", "user2", "user3"]:
+                    add_to_cache(user, self.realm, self.resolver, self.password)
+                self.assertEqual(2, len(memory._entries))
+            finally:
+                memory.stop()
+                get_app_local_store().pop("authcache_memory", None)
+                cleanup(100000000)
+
+    def test_08_memory_tier_in_two_processes(self):
+        cleanup(100000000)
+        # Two processes with their own memory tier use the same database entry
+        memories = [AuthCacheMemory(10), AuthCacheMemory(10)]
+
+        def verify(memory, max_auths=0):
+            with mock.patch("privacyidea.lib.authcache.get_authcache_memory", return_value=memory):
+                return verify_in_cache(self.username, self.realm, self.resolver, self.password,
+                                       max_auths=max_auths)
+
+        r = add_to_cache(self.username, self.realm, self.resolver, self.password)
+        # max_auths is respected across the processes
+        results = [verify(memories[i % 2], max_auths=3) for i in range(6)]
+        self.assertEqual([True, True, True, False, False, False], results)
+        self.assertIsNone(AuthCache.query.filter(AuthCache.id == r).first())
+
+        # An entry deleted by another process is not used from memory
+        r = add_to_cache(self.username, self.realm, self.resolver, self.password)
+        self.assertTrue(verify(memories[0]))
+        self.assertTrue(verify(memories[0]))
+        self.assertEqual(1, memories[0].hits)
+        with mock.patch("privacyidea.lib.authcache.get_authcache_memory", return_value=memories[1]):
+            self.assertEqual(1, delete_from_cache(self.username, self.realm, self.resolver,
+                                                  self.password))
+        self.assertFalse(verify(memories[0]))
+        self.assertEqual(1, memories[0].hits)
+        cleanup(100000000)
@@ -5,12 +5,18 @@ This tests the token functions on an interface level
 """
 from .base import MyTestCase
 from privacyidea.lib.error import (TokenAdminError, ParameterError)
-from privacyidea.lib.challenge import get_challenges, extract_answered_challenges
+from privacyidea.lib.challenge import (get_challenges, extract_answered_challenges,
+                                       get_challenge_notifier, notify_challenge_answer,
+                                       get_challenge_count, delete_expired_challenges)
+from privacyidea.lib.challengenotifiers.local_notifier import LocalChallengeNotifier
+from privacyidea.lib.framework import get_app_local_store
 from privacyidea.lib.policy import (set_policy, delete_policy, SCOPE,
                                     ACTION)
 from privacyidea.models import Challenge, db
 from privacyidea.lib.token import init_token
 from privacyidea.lib import _
+from threading import Timer
+import mock
 
 
 class ChallengeTestCase(MyTestCase):
@@ -71,3 +77,55 @@ class ChallengeTestCase(MyTestCase):
         self.assertEqual(len(challenges), 2)
         self.assertEqual(len(answered), 1)
         self.assertEqual(answered[0].transaction_id, transaction_id1)
+
+    def test_03_challenge_notifier(self):
+        get_app_local_store().pop("challenge_notifier", None)
+        with mock.patch.dict(self.app.config, {"PI_CHALLENGE_NOTIFICATION_CLASS": "unknown.Notifier",
+                                               "PI_CHALLENGE_NOTIFICATION_POLL_INTERVAL": "5"}):
+            notifier = get_challenge_notifier()
+            # fall back to the local notifier
+            self.assertIsInstance(notifier, LocalChallengeNotifier)
+            self.assertEqual(notifier.poll_interval, 5)
+        get_app_local_store().pop("challenge_notifier", None)
+        notifier = get_challenge_notifier()
+        self.assertIs(notifier, get_challenge_notifier())
+        self.assertEqual(notifier.poll_interval, 1)
+
+        with notifier.subscribe("tid1") as subscription:
+            # no notification
+            self.assertFalse(subscription.wait(0.1))
+            # a notification for a different transaction
+            notify_challenge_answer("tid2")
+            self.assertFalse(subscription.wait(0.1))
+            Timer(0.1, notifier.notify, args=["tid1"]).start()
+            self.assertTrue(subscription.wait(10))
+            # the notification is consumed
+            self.assertFalse(subscription.wait(0))
+        # The subscription is removed
+        self.assertEqual(notifier._subscriptions, {})
+        notify_challenge_answer("tid1")
+
+    def test_04_valid_and_expired_challenges(self):
+        Challenge.query.delete()
+        db.session.commit()
+        Challenge("CHAL3", transaction_id="valid1", validitytime=120).save()
+        Challenge("CHAL3", transaction_id="expired1", validitytime=-10).save()
+        Challenge("CHAL4", transaction_id="expired2", validitytime=-10).save()
+        Challenge("CHAL4", transaction_id="expired3", validitytime=-10).save()
+
+        self.assertEqual(2, len(get_challenges(serial="CHAL3")))
+        chals = get_challenges(serial="CHAL3", only_valid=True)
+        self.assertEqual(["valid1"], [c.transaction_id for c in chals])
+        self.assertEqual([], get_challenges(serial="CHAL4", only_valid=True))
+        self.assertEqual([], get_challenges(transaction_id="expired1", only_valid=True))
+
+        self.assertEqual(4, get_challenge_count())
+        self.assertEqual(3, get_challenge_count(expired=True))
+        self.assertEqual(1, get_challenge_count(expired=False))
+
+        # delete the expired challenges in chunks
+        self.assertEqual(3, delete_expired_challenges(chunksize=2))
+        self.assertEqual(["valid1"], [c.transaction_id for c in get_challenges()])
+        self.assertEqual(0, delete_expired_challenges())
+        Challenge.query.delete()
+        db.session.commit()
@@ -4,11 +4,14 @@ This test file tests the lib.clientapplicaton.py
 import mock
 from datetime import datetime, timedelta
 from contextlib import contextmanager
+from sqlalchemy.exc import IntegrityError
 
 from privacyidea.models import ClientApplication
 from .base import MyTestCase
 from privacyidea.lib.clientapplication import (get_clientapplication,
-                                               save_clientapplication)
+                                               save_clientapplication,
+                                               get_clientapplication_buffer)
+from privacyidea.lib.framework import get_app_local_store
 
 
 class ClientApplicationTestCase(MyTestCase):
@@ -125,3 +128,80 @@ class ClientApplicationTestCase(MyTestCase):
         self.assertEqual(apps["2.3.4.5"], [{"clienttype": "PAM", "hostname": None, "lastseen": t1}])
 
 
+    def test_03_buffer(self):
+        ClientApplication.query.delete()
+        save_clientapplication("1.2.3.4", "PAM")
+        row = ClientApplication.query.filter_by(ip="1.2.3.4", clienttype="PAM").one()
+        lastseen = row.lastseen
+        # The buffer is disabled by default
+        self.assertIsNone(get_clientapplication_buffer())
+        with mock.patch.dict(self.app.config, {"PI_CLIENTAPPLICATION_FLUSH_INTERVAL": 3600}):
+            buffer = get_clientapplication_buffer()
+            self.assertIs(buffer, get_clientapplication_buffer())
+            try:
+                for _i in range(10):
+                    save_clientapplication("1.2.3.4", "PAM")
+                    save_clientapplication("1.2.3.4", "RADIUS")
+                    save_clientapplication("10.0.0.1", "RADIUS")
+                # nothing has been written yet
+                self.assertEqual(ClientApplication.query.count(), 1)
+                # every client is written once
+                self.assertEqual(buffer.flush(), 3)
+                self.assertEqual(buffer.flush(), 0)
+                self.assertEqual(ClientApplication.query.count(), 3)
+                row = ClientApplication.query.filter_by(ip="1.2.3.4", clienttype="PAM").one()
+                self.assertGreater(row.lastseen, lastseen)
+                self.assertEqual(len(get_clientapplication(ip="10.0.0.1")["RADIUS"]), 1)
+                # If the bulk write fails, the entries are written one by one
+                # with the buffered timestamp
+                buffered_lastseen = datetime(2020, 1, 2, 3, 4, 5)
+                buffer._pending[("1.2.3.4", "PAM", "pinode1")] = buffered_lastseen
+                with mock.patch.object(buffer, "_write",
+                                       side_effect=IntegrityError("INSERT", {}, Exception("duplicate"))):
+                    self.assertEqual(buffer.flush(), 1)
+                row = ClientApplication.query.filter_by(ip="1.2.3.4", clienttype="PAM", node="pinode1").one()
+                self.assertEqual(row.lastseen, buffered_lastseen)
+                # If writing fails otherwise, the entries are kept for the next flush
+                failed_lastseen = datetime(2020, 2, 3, 4, 5, 6)
+                newer_lastseen = datetime(2020, 3, 4, 5, 6, 7)
+                buffer._pending[("1.2.3.4", "PAM", "pinode1")] = failed_lastseen
+                buffer._pending[("1.2.3.4", "PAM", "pinode2")] = newer_lastseen
+                with mock.patch.object(buffer, "_write", side_effect=Exception("database gone")):
+                    self.assertEqual(buffer.flush(), 0)
+                self.assertEqual(buffer._pending[("1.2.3.4", "PAM", "pinode1")], failed_lastseen)
+                # the client was seen again during the write, the newer timestamp is kept
+                buffer._pending[("1.2.3.4", "PAM", "pinode2")] = datetime(2020, 1, 1)
+
+                def _seen_again(chunk):
+                    buffer._pending[("1.2.3.4", "PAM", "pinode2")] = newer_lastseen
+                    raise Exception("database gone")
+
+                with mock.patch.object(buffer, "_write", side_effect=_seen_again):
+                    self.assertEqual(buffer.flush(), 0)
+                self.assertEqual(buffer._pending[("1.2.3.4", "PAM", "pinode1")], failed_lastseen)
+                self.assertEqual(buffer._pending[("1.2.3.4", "PAM", "pinode2")], newer_lastseen)
+                # a failing entry in the row by row fallback does not drop the other entries
+                save = ClientApplication.save
+
+                def _save(clientapp):
+                    if clientapp.node == "pinode1":
+                        raise Exception("database gone")
+                    save(clientapp)
+
+                with mock.patch.object(buffer, "_write",
+                                       side_effect=IntegrityError("INSERT", {}, Exception("duplicate"))):
+                    with mock.patch.object(ClientApplication, "save", autospec=True, side_effect=_save):
+                        self.assertEqual(buffer.flush(), 1)
+                row = ClientApplication.query.filter_by(ip="1.2.3.4", clienttype="PAM", node="pinode2").one()
+                self.assertEqual(row.lastseen, newer_lastseen)
+                self.assertEqual(list(buffer._pending), [("1.2.3.4", "PAM", "pinode1")])
+                self.assertEqual(buffer.flush(), 1)
+                self.assertEqual(buffer._pending, {})
+                row = ClientApplication.query.filter_by(ip="1.2.3.4", clienttype="PAM", node="pinode1").one()
+                self.assertEqual(row.lastseen, failed_lastseen)
+                # a pending entry is written, when the buffer is stopped
+                save_clientapplication("10.0.0.2", "SAML")
+            finally:
+                buffer.stop()
+                get_app_local_store().pop("clientapplication_buffer")
+        self.assertEqual(len(get_clientapplication(ip="10.0.0.2")["SAML"]), 1)
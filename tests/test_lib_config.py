@@ -3,7 +3,14 @@ This test file tests the lib.config
 
 The lib.config only depends on the database model.
 """
-from privacyidea.models import Config, save_config_timestamp, db, NodeName
+import mock
+import os
+import tempfile
+import threading
+import time
+
+from privacyidea.models import (Config, save_config_timestamp, db, NodeName, CONFIG_SECTIONS,
+                               PRIVACYIDEA_TIMESTAMP, get_config_timestamp_key)
 from .base import MyTestCase
 from privacyidea.lib.config import (get_resolver_list,
                                     get_resolver_classes,
@@ -24,7 +31,12 @@ from privacyidea.lib.config import (get_resolver_list,
                                     this, get_config_object, invalidate_config_object,
                                     get_multichallenge_enrollable_tokentypes,
                                     get_email_validators,
-                                    check_node_uuid_exists)
+                                    check_node_uuid_exists, get_shared_config_object,
+                                    get_config_notifier, SharedConfigClass)
+from privacyidea.lib.confignotifiers.file_notifier import FileConfigNotifier
+from privacyidea.lib.confignotifiers.db_notifier import DBConfigNotifier
+from privacyidea.lib.framework import get_app_local_store, get_request_local_store
+from privacyidea.lib.policy import set_policy, delete_policy, SCOPE
 from privacyidea.lib.resolvers.PasswdIdResolver import IdResolver as PWResolver
 from privacyidea.lib.tokens.hotptoken import HotpTokenClass
 from privacyidea.lib.tokens.totptoken import TotpTokenClass
@@ -287,3 +299,152 @@ class ConfigTestCase(MyTestCase):
         validate_email = get_email_validators().get("privacyidea.lib.utils.emailvalidation")
         self.assertTrue(validate_email("valid@email.com"))
         self.assertFalse(validate_email("invalid@email.k"))
+
+    def test_12_reload_changed_sections(self):
+        shared_config = get_shared_config_object()
+        config_object = get_config_object()
+        # Changing a policy only reloads the policies
+        set_policy(name="reload_section", scope=SCOPE.AUTH, action="otppin=none")
+        new_config_object = get_config_object()
+        self.assertIsNot(config_object, new_config_object)
+        self.assertIn("reload_section", [p.get("name") for p in new_config_object.policies])
+        self.assertIs(config_object.config, new_config_object.config)
+        self.assertIs(config_object.resolver, new_config_object.resolver)
+        self.assertIs(config_object.realm, new_config_object.realm)
+        self.assertIs(config_object.events, new_config_object.events)
+        self.assertNotIn(get_config_timestamp_key("policy"), new_config_object.config)
+        # Changing the system config only reloads the system config
+        set_privacyidea_config("reload_section", "value")
+        config_object = get_config_object()
+        self.assertEqual(config_object.get_config("reload_section"), "value")
+        self.assertIs(config_object.policies, new_config_object.policies)
+        # Nothing has changed
+        db_timestamps = dict(shared_config.db_timestamps)
+        self.assertEqual(shared_config._changed_sections(db_timestamps), [])
+        # Changing the global timestamp without the sections reloads everything
+        db_timestamps[PRIVACYIDEA_TIMESTAMP] = "1"
+        self.assertEqual(shared_config._changed_sections(db_timestamps), CONFIG_SECTIONS)
+        delete_policy("reload_section")
+        delete_privacyidea_config("reload_section")
+
+    def test_13_reload_in_background(self):
+        shared_config = get_shared_config_object()
+        get_config_object()
+        # Change the config without invalidating the request-local config object
+        db.session.add(Config(Key="background_key", Value="background_value"))
+        save_config_timestamp(False, sections=["config"])
+        db.session.commit()
+        # The change was made by another worker
+        get_request_local_store().pop("config_changed")
+        invalidate_config_object()
+        reload_finished = threading.Event()
+        load_config = SharedConfigClass._load_config
+
+        def slow_load_config():
+            reload_finished.wait(10)
+            return load_config()
+
+        with mock.patch.dict(self.app.config, {"PI_CONFIG_RELOAD_BACKGROUND": True}), \
+                mock.patch.object(SharedConfigClass, "_load_config", side_effect=slow_load_config):
+            # The request still gets the old config, while the new one is read in the background
+            self.assertEqual(get_from_config("background_key", "default"), "default")
+            self.assertTrue(shared_config._reload_thread.is_alive())
+            reload_finished.set()
+            shared_config._reload_thread.join()
+        invalidate_config_object()
+        self.assertEqual(get_from_config("background_key", "default"), "background_value")
+
+        # A request, which changes the config itself, reads the new config synchronously
+        with mock.patch.dict(self.app.config, {"PI_CONFIG_RELOAD_BACKGROUND": True}):
+            set_privacyidea_config("background_key", "new_value")
+            self.assertEqual(get_from_config("background_key", "default"), "new_value")
+            self.assertFalse(shared_config._reload_thread.is_alive())
+        delete_privacyidea_config("background_key")
+
+    def test_14_config_notifier(self):
+        notification_file = os.path.join(tempfile.mkdtemp(), "config-notification")
+        store = get_app_local_store()
+        store.pop("config_notifier", None)
+        with mock.patch.dict(self.app.config, {
+                "PI_CONFIG_NOTIFICATION_CLASS": "privacyidea.lib.confignotifiers.file_notifier.FileConfigNotifier",
+                "PI_CONFIG_NOTIFICATION_FILE": notification_file}):
+            notifier = get_config_notifier()
+            self.assertIsInstance(notifier, FileConfigNotifier)
+            self.assertEqual(notifier.filename, notification_file)
+            self.assertTrue(os.path.exists(notification_file))
+
+            set_privacyidea_config("notified_key", "value1")
+            self.assertEqual(get_from_config("notified_key"), "value1")
+            # Change the config in the database without a notification
+            Config.query.filter_by(Key="notified_key").update({"Value": "value2"})
+            Config.query.filter_by(Key=get_config_timestamp_key("config")).update({"Value": "1"})
+            db.session.commit()
+            invalidate_config_object()
+            # The timestamps are not read from the database
+            self.assertEqual(get_from_config("notified_key"), "value1")
+            # ... until the notifier reports a new version
+            version = notifier.get_version()
+            notifier.notify()
+            self.assertNotEqual(version, notifier.get_version())
+            invalidate_config_object()
+            self.assertEqual(get_from_config("notified_key"), "value2")
+
+            # A committed config change notifies the other workers
+            version = notifier.get_version()
+            set_privacyidea_config("notified_key", "value3")
+            self.assertNotEqual(version, notifier.get_version())
+            # A rolled back config change does not
+            version = notifier.get_version()
+            save_config_timestamp()
+            db.session.rollback()
+            db.session.commit()
+            self.assertEqual(version, notifier.get_version())
+
+            delete_privacyidea_config("notified_key")
+        store.pop("config_notifier")
+
+    def test_15_db_config_notifier(self):
+        notifier = DBConfigNotifier({"interval": "0.1"})
+        version = notifier.read_version()
+        self.assertEqual(len(version), len(CONFIG_SECTIONS) + 1)
+        # The first call starts the background thread
+        notifier.get_version()
+        for _i in range(50):
+            if notifier.get_version() is not None:
+                break
+            time.sleep(0.1)
+        self.assertEqual(notifier.get_version(), version)
+        set_privacyidea_config("notified_key", "value")
+        for _i in range(50):
+            if notifier.get_version() != version:
+                break
+            time.sleep(0.1)
+        self.assertNotEqual(notifier.get_version(), version)
+        notifier.stop()
+        delete_privacyidea_config("notified_key")
+
+    def test_16_db_config_notifier_local_change(self):
+        store = get_app_local_store()
+        store.pop("config_notifier", None)
+        with mock.patch.dict(self.app.config, {
+                "PI_CONFIG_NOTIFICATION_CLASS": "privacyidea.lib.confignotifiers.db_notifier.DBConfigNotifier",
+                "PI_CONFIG_NOTIFICATION_INTERVAL": "100"}):
+            notifier = get_config_notifier()
+            self.assertIsInstance(notifier, DBConfigNotifier)
+            set_privacyidea_config("notified_key", "value1")
+            self.assertEqual(get_from_config("notified_key"), "value1")
+            for _i in range(50):
+                if notifier.get_version() is not None:
+                    break
+                time.sleep(0.1)
+            invalidate_config_object()
+            self.assertEqual(get_from_config("notified_key"), "value1")
+            self.assertEqual(get_shared_config_object().notification_version, notifier.get_version())
+            # The worker, which changes the config, reads it back immediately,
+            # although the next poll is far in the future
+            set_privacyidea_config("notified_key", "value2")
+            self.assertIsNone(notifier.get_version())
+            self.assertEqual(get_from_config("notified_key"), "value2")
+            delete_privacyidea_config("notified_key")
+            notifier.stop()
+        store.pop("config_notifier")
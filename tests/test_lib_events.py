@@ -38,7 +38,7 @@ from flask import Request, Response
 from werkzeug.test import EnvironBuilder
 from privacyidea.lib.event import (delete_event, set_event,
                                    EventConfiguration, get_handler_object,
-                                   enable_event)
+                                   enable_event, EventIndex)
 from privacyidea.lib.token import (init_token, remove_token, get_realms_of_token, get_tokens,
                                    add_tokeninfo, unassign_token, get_tokens_paginate)
 from privacyidea.lib.tokenclass import DATE_FORMAT, CHALLENGE_SESSION
@@ -147,6 +147,38 @@ class EventHandlerLibTestCase(MyTestCase):
         h_obj = get_handler_object("Container")
         self.assertEqual(type(h_obj), ContainerEventHandler)
 
+        # Every call returns a new object
+        self.assertIsNot(h_obj, get_handler_object("Container"))
+        self.assertIsNone(get_handler_object("Unknown"))
+
+    def test_03_event_index(self):
+        events = [{"name": "e1", "event": ["token_init", "token_assign"], "active": True,
+                   "position": "post"},
+                  {"name": "e2", "event": ["token_init"], "active": False, "position": "post"},
+                  {"name": "e3", "event": ["token_init", "token_init"], "active": True,
+                   "position": "pre"},
+                  {"name": "e4", "event": ["token_init"], "active": True, "position": "post"}]
+        index = EventIndex(events)
+        # The order of the definitions is kept and inactive definitions are skipped
+        self.assertEqual([e.get("name") for e in index.get_handled_events("token_init")],
+                         ["e1", "e4"])
+        self.assertEqual([e.get("name") for e in index.get_handled_events("token_init", "pre")],
+                         ["e3"])
+        self.assertEqual([e.get("name") for e in index.get_handled_events("token_assign")],
+                         ["e1"])
+        self.assertEqual(index.get_handled_events("token_assign", "pre"), [])
+        # "token" is not an event of the definitions
+        self.assertEqual(index.get_handled_events("token"), [])
+
+        # The shared config object contains the index
+        eid = set_event("name1", "token_init", "UserNotification", "sendmail",
+                        conditions={}, options={"emailconfig": "themis"})
+        event_config = EventConfiguration()
+        self.assertIsInstance(get_config_object().event_index, EventIndex)
+        self.assertEqual([e.get("id") for e in event_config.get_handled_events("token_init")], [eid])
+        delete_event(eid)
+        self.assertEqual(EventConfiguration().get_handled_events("token_init"), [])
+
 
 class BaseEventHandlerTestCase(MyTestCase):
 
@@ -9,6 +9,7 @@ from privacyidea.lib.machines.ldap import LdapMachineResolver
 from privacyidea.lib.machines.base import MachineResolverError
 from . import ldap3mock
 import netaddr
+import mock
 
 LDAPDirectory = [{"dn": "cn=admin,ou=example,o=test",
                   "attributes": {"cn": "admin",
@@ -148,8 +149,9 @@ class LdapMachineTestCase(MyTestCase):
         machines = start_tls_resolver.get_machines()
         self.assertEqual(len(machines), 3)
         # We check two things:
-        # 1) start_tls has actually been called!
-        self.assertTrue(start_tls_resolver.l.start_tls_called)
+        # 1) start_tls has actually been called on the pooled connection!
+        connection, = start_tls_resolver._get_connection_pool()._idle
+        self.assertTrue(connection.start_tls_called)
         # 2) All Server objects were constructed with a non-None TLS context, but use_ssl=False
         for _, kwargs in ldap3mock.get_server_mock().call_args_list:
             self.assertIsNotNone(kwargs['tls'])
@@ -169,4 +171,76 @@ class LdapMachineTestCase(MyTestCase):
         # We check that all Server objects were constructed with a non-None TLS context and use_ssl=True
         for _, kwargs in ldap3mock.get_server_mock().call_args_list:
             self.assertIsNotNone(kwargs['tls'])
-            self.assertTrue(kwargs['use_ssl'])
\ No newline at end of file
+            self.assertTrue(kwargs['use_ssl'])
+
+    @ldap3mock.activate
+    def test_10_connection_pool_and_cache(self):
+        ldap3mock.setLDAPDirectory(LDAPDirectory)
+        config = MYCONFIG.copy()
+        config["CACHE_SIZE"] = "2"
+        reso1 = LdapMachineResolver("cachedResolver", config=config)
+        reso2 = LdapMachineResolver("cachedResolver", config=config)
+        pool = reso1._get_connection_pool()
+        self.assertIs(pool, reso2._get_connection_pool())
+        self.assertEqual(len(reso1.get_machines()), 3)
+        connection, = pool._idle
+        # The second resolver object reuses the bound connection
+        self.assertEqual(len(reso2.get_machines()), 3)
+        self.assertEqual(pool._idle, [connection])
+        # The pooled connection is not kept by the resolver objects
+        self.assertFalse(hasattr(reso1, "l"))
+        self.assertFalse(hasattr(reso2, "l"))
+        # A connection, which has been closed, is not reused
+        connection.unbind()
+        self.assertEqual(len(reso2.get_machines()), 3)
+        self.assertEqual(len(pool._idle), 1)
+        self.assertIsNot(pool._idle[0], connection)
+
+        cache = reso1.get_cache()
+        self.assertIs(cache, reso2.get_cache())
+        self.assertEqual(cache.get_info(), {"hits": 0, "misses": 0, "size": 0})
+        self.assertEqual(reso1.get_machine_id(hostname="machine1.example.test"),
+                         "cn=machine1,ou=example,o=test")
+        self.assertEqual(reso1.get_machine_id(hostname="not existing"), None)
+        self.assertEqual(cache.get_info(), {"hits": 0, "misses": 2, "size": 2})
+        # The machine id is read from the cache
+        with mock.patch.object(LdapMachineResolver, "get_machines") as mock_get:
+            self.assertEqual(reso2.get_machine_id(hostname="machine1.example.test"),
+                             "cn=machine1,ou=example,o=test")
+            self.assertEqual(reso2.get_machine_id(hostname="not existing"), None)
+            mock_get.assert_not_called()
+        self.assertEqual(cache.get_info(), {"hits": 2, "misses": 2, "size": 2})
+        # The least recently used entry is removed
+        self.assertEqual(reso1.get_machine_id(hostname="machine2.example.test"),
+                         "cn=machine2,ou=example,o=test")
+        self.assertEqual(cache.get_info(), {"hits": 2, "misses": 3, "size": 2})
+        self.assertEqual(cache.get(("machine1.example.test", None)), (False, None))
+        self.assertEqual(cache.get(("machine2.example.test", None)),
+                         (True, "cn=machine2,ou=example,o=test"))
+        # Entries expire
+        cache.timeout = 0
+        self.assertEqual(cache.get(("machine2.example.test", None)), (False, None))
+        self.assertEqual(reso1.get_cache_info(), {"hits": 3, "misses": 5, "size": 1})
+
+        # A changed configuration replaces the pool and the cache of the resolver.
+        # The idle connections of the previous pool are closed.
+        idle_connection, = pool._idle
+        self.assertTrue(idle_connection.bound)
+        config["TIMEOUT"] = "10"
+        reso4 = LdapMachineResolver("cachedResolver", config=config)
+        self.assertEqual(len(reso4.get_machines()), 3)
+        self.assertIsNot(reso4._get_connection_pool(), pool)
+        self.assertIsNot(reso4._get_connection_pool()._idle[0], idle_connection)
+        self.assertTrue(idle_connection.closed)
+        self.assertEqual(reso4.get_cache_info(), {"hits": 0, "misses": 0, "size": 0})
+
+        # Without pool and cache
+        config["POOL_SIZE"] = "0"
+        config["CACHE_TIMEOUT"] = "0"
+        reso3 = LdapMachineResolver("cachedResolver", config=config)
+        self.assertIsNone(reso3.get_cache())
+        self.assertEqual(reso3.get_machine_id(hostname="machine1.example.test"),
+                         "cn=machine1,ou=example,o=test")
+        self.assertTrue(reso3.i_am_bound)
+        self.assertIsNotNone(reso3.l)
+        self.assertNotIn(reso3.l, reso4._get_connection_pool()._idle)
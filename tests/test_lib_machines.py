@@ -8,9 +8,12 @@ lib.machines.hosts
 """
 
 HOSTSFILE = "tests/testdata/hosts"
+import os
+import shutil
+import tempfile
 from .base import MyTestCase
 from privacyidea.lib.machines import BaseMachineResolver
-from privacyidea.lib.machines.hosts import HostsMachineResolver
+from privacyidea.lib.machines.hosts import HostsMachineResolver, get_hosts_file
 from privacyidea.lib.machines.base import Machine, MachineResolverError
 import netaddr
 from privacyidea.lib.machineresolver import (get_resolver_list, save_resolver,
@@ -225,3 +228,33 @@ class HostsMachineTestCase(MyTestCase):
         self.assertRaises(MachineResolverError,
                           self.mreso.load_config,
                           {"name": "nothing"})
+
+    def test_06_cached_hosts_file(self):
+        tmpdir = tempfile.mkdtemp()
+        hostsfile = os.path.join(tmpdir, "hosts")
+        shutil.copyfile(HOSTSFILE, hostsfile)
+        try:
+            mreso = HostsMachineResolver("tmpResolver", config={"filename": hostsfile})
+            hosts = get_hosts_file(hostsfile)
+            # The file is only parsed once
+            self.assertIs(get_hosts_file(hostsfile), hosts)
+            self.assertEqual([e.id for e in hosts.by_hostname.get("whitewizard")],
+                             ["192.168.0.1"])
+            self.assertEqual(mreso.get_machine_id(hostname="pippin"), "192.168.0.2")
+            self.assertEqual(mreso.get_machine_id(hostname="pippin", ip="192.168.0.1"), None)
+            # "any" is not case sensitive
+            self.assertEqual(len(mreso.get_machines(any="GANDALF")), 2)
+            # an unknown machine id does not match any machine
+            self.assertEqual(mreso.get_machines(machine_id="10.0.0.1"), [])
+            machines = mreso.get_machines(ip="192.168.0.1", hostname="gandalf")
+            self.assertEqual([m.id for m in machines], ["192.168.0.1"])
+
+            # Changing the file causes the file to be read again
+            with open(hostsfile, "a") as f:
+                f.write("10.0.0.1\tfrodo\n")
+            self.assertIsNot(get_hosts_file(hostsfile), hosts)
+            self.assertEqual(mreso.get_machine_id(hostname="frodo"), "10.0.0.1")
+            machine = mreso.get_machines(machine_id="10.0.0.1")[0]
+            self.assertTrue(machine.has_hostname("frodo"))
+        finally:
+            shutil.rmtree(tmpdir)
@@ -17,7 +17,8 @@ from privacyidea.lib.policy import (set_policy, delete_policy,
                                     PolicyError, ACTION, MAIN_MENU,
                                     delete_all_policies,
                                     get_action_values_from_options, Match, MatchingError,
-                                    get_allowed_custom_attributes)
+                                    get_allowed_custom_attributes, PolicyIndex,
+                                    get_policy_match_cache)
 from privacyidea.lib.realm import (set_realm, delete_realm, get_realms)
 from privacyidea.lib.resolver import (save_resolver, get_resolver_list,
                                       delete_resolver)
@@ -25,6 +26,7 @@ from privacyidea.lib.error import ParameterError
 from privacyidea.lib.user import User
 from .base import PWFILE as FILE_PASSWORDS
 from .base import PWFILE2 as FILE_PASSWD
+from netaddr import IPAddress, AddrFormatError
 
 
 
@@ -1562,6 +1564,72 @@ class PolicyTestCase(MyTestCase):
         # clean up
         delete_policy(pname)
 
+    def test_41_policy_index(self):
+        policies = [
+            {"name": "pol1", "scope": SCOPE.AUTH, "active": True, "action": {"otppin": "none"},
+             "client": ["10.0.0.0/8", "-10.0.0.1"], "realm": ["realm.*"]},
+            {"name": "pol2", "scope": SCOPE.AUTH, "active": True, "action": {"otppin.*": True},
+             "client": []},
+            {"name": "pol3", "scope": SCOPE.AUTH, "active": False, "action": {"passthru": True},
+             "client": ["2001:db8::/32"]},
+            {"name": "pol4", "scope": SCOPE.ADMIN, "active": True, "action": {"*": True},
+             "client": ["not an ip"], "user": ["Admin[", "hans"], "user_case_insensitive": True}]
+        index = PolicyIndex(policies)
+        # candidates are filtered by scope and action and keep their order
+        self.assertEqual([p.get("name") for p in index.candidates(scope=SCOPE.AUTH, action="otppin")],
+                         ["pol1", "pol2"])
+        self.assertEqual([p.get("name") for p in index.candidates(scope=SCOPE.AUTH, action="passthru")],
+                         ["pol2", "pol3"])
+        self.assertEqual([p.get("name") for p in index.candidates(action="passthru")],
+                         ["pol2", "pol3", "pol4"])
+        self.assertEqual([p.get("name") for p in index.candidates(active=True)],
+                         ["pol1", "pol2", "pol4"])
+        self.assertEqual([p.get("name") for p in index.candidates(name="pol3", scope=SCOPE.AUTH)],
+                         ["pol3"])
+        self.assertEqual(index.candidates(name="pol3", scope=SCOPE.ADMIN), [])
+        # regular expressions are precompiled, invalid ones are left out
+        self.assertIn("realm.*", index.patterns)
+        self.assertIn("hans", index.patterns)
+        self.assertNotIn("Admin[", index.patterns)
+        self.assertNotIn("admin[", index.patterns)
+        # client definitions are parsed
+        self.assertEqual(index.check_client(lambda: IPAddress("10.1.2.3"), "10.1.2.3", policies[0]),
+                         (True, False))
+        self.assertEqual(index.check_client(lambda: IPAddress("10.0.0.1"), "10.0.0.1", policies[0]),
+                         (True, True))
+        self.assertEqual(index.check_client(lambda: IPAddress("192.168.0.1"), "192.168.0.1", policies[0]),
+                         (False, False))
+        self.assertEqual(index.check_client(lambda: IPAddress("10.1.2.3"), "10.1.2.3", policies[2]),
+                         (False, False))
+        self.assertEqual(index.check_client(lambda: IPAddress("2001:db8::1"), "2001:db8::1", policies[2]),
+                         (True, False))
+        # an invalid client definition still fails at matching time
+        self.assertRaises(AddrFormatError, index.check_client, lambda: IPAddress("10.1.2.3"), "10.1.2.3",
+                          policies[3])
+
+    def test_42_list_policies_with_index(self):
+        set_policy("pol_index1", scope=SCOPE.AUTH, action="otppin=none", realm="r.*", client="10.0.0.0/8",
+                   priority=2)
+        set_policy("pol_index2", scope=SCOPE.AUTH, action="passthru", user="cornelius", priority=2)
+        set_policy("pol_index3", scope=SCOPE.AUTH, action="*", priority=1)
+        P = PolicyClass()
+        self.assertEqual([p.get("name") for p in P.list_policies(scope=SCOPE.AUTH, action="otppin",
+                                                                 realm="realm1", client="10.1.1.1")],
+                         ["pol_index3", "pol_index1"])
+        self.assertEqual([p.get("name") for p in P.list_policies(scope=SCOPE.AUTH, action="otppin",
+                                                                 realm="realm1", client="192.168.1.1")],
+                         ["pol_index3"])
+        self.assertEqual([p.get("name") for p in P.list_policies(scope=SCOPE.AUTH, action="passthru",
+                                                                 user="cornelius")],
+                         ["pol_index3", "pol_index2"])
+        # The index is rebuilt, if the policies change
+        delete_policy("pol_index3")
+        P = PolicyClass()
+        self.assertEqual([p.get("name") for p in P.list_policies(scope=SCOPE.AUTH, action="passthru",
+                                                                 user="hans")], [])
+        delete_policy("pol_index1")
+        delete_policy("pol_index2")
+
 
 class PolicyMatchTestCase(MyTestCase):
     @classmethod
@@ -1733,6 +1801,35 @@ class PolicyMatchTestCase(MyTestCase):
             self.check_names(Match.admin_or_user(g, "enable", User("cornelius", "realm1")).policies(),
                              {"pol4"})
 
+    def test_06_match_cache(self):
+        g = FakeFlaskG()
+        g.client_ip = "127.0.0.1"
+        g.audit_object = mock.Mock()
+        g.policy_object = PolicyClass()
+        g.serial = None
+
+        cache = get_policy_match_cache()
+        g.audit_object.audit_data = {}
+        self.check_names(Match.action_only(g, SCOPE.AUTHZ, "tokentype").policies(), {"pol2", "pol2a"})
+        hits = cache.hits
+        # The second identical match is taken from the cache, but still written to the audit log
+        g.audit_object.audit_data = {}
+        self.check_names(Match.action_only(g, SCOPE.AUTHZ, "tokentype").policies(), {"pol2", "pol2a"})
+        self.assertEqual(cache.hits, hits + 1)
+        self.assertEqual(set(g.audit_object.audit_data["policies"]), {"pol2", "pol2a"})
+
+        # Policies with a time are not cached
+        set_policy(name="pol_time", action="tokentype=SPASS", scope=SCOPE.AUTHZ,
+                   time="Mon-Sun: 00:00-23:59")
+        cache = get_policy_match_cache()
+        self.assertEqual(cache.statistics(), {"hits": 0, "misses": 0, "bypassed": 0})
+        self.check_names(Match.action_only(g, SCOPE.AUTHZ, "tokentype").policies(),
+                         {"pol2", "pol2a", "pol_time"})
+        self.check_names(Match.action_only(g, SCOPE.AUTHZ, "tokentype").policies(),
+                         {"pol2", "pol2a", "pol_time"})
+        self.assertEqual(cache.statistics(), {"hits": 0, "misses": 0, "bypassed": 2})
+        delete_policy("pol_time")
+
     @classmethod
     def tearDownClass(cls):
         delete_all_policies()
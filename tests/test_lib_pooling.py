@@ -4,11 +4,12 @@ This file contains the tests for the pooling module.
 In particular, this tests
 lib/pooling.py
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, Column, Integer, MetaData, Table
 
 from privacyidea.app import create_app
 from privacyidea.lib.auth import create_db_admin
-from privacyidea.lib.pooling import get_engine, get_registry, SharedEngineRegistry, NullEngineRegistry
+from privacyidea.lib.pooling import (get_engine, get_registry, SharedEngineRegistry, NullEngineRegistry,
+                                     get_table, get_table_registry)
 from privacyidea.models import db, save_config_timestamp
 from .base import MyTestCase
 
@@ -68,3 +69,27 @@ class NullPoolingTestCase(MyTestCase):
         self.assertIsNot(engine1, engine2)
         self.assertIsNot(engine1, engine3)
         self.assertIsNot(engine2, engine3)
+
+
+class TableRegistryTestCase(MyTestCase):
+    def _create_table(self):
+        return Table("users", MetaData(), Column("id", Integer, primary_key=True))
+
+    def test_01_table(self):
+        registry = get_table_registry()
+        self.assertIs(registry, get_table_registry())
+        table1 = get_table(("my table", "v1"), self._create_table)
+        table2 = get_table(("my table", "v1"), self._create_table)
+        self.assertIs(table1, table2)
+        # a new key creates a new table
+        table3 = get_table(("my table", "v2"), self._create_table)
+        self.assertIsNot(table1, table3)
+        self.assertIs(table3, get_table(("my table", "v2"), self._create_table))
+        # the tables with different keys do not replace each other
+        self.assertIs(table1, get_table(("my table", "v1"), self._create_table))
+        # invalidate the table
+        registry.invalidate(("my table", "v2"))
+        self.assertIsNot(table3, get_table(("my table", "v2"), self._create_table))
+        table4 = get_table(("my other table", "v2"), self._create_table)
+        registry.invalidate()
+        self.assertIsNot(table4, get_table(("my other table", "v2"), self._create_table))
@@ -11,7 +11,7 @@ The lib.resolver.py only depends on the database model.
 PWFILE = "tests/testdata/passwords"
 from .base import MyTestCase
 from . import ldap3mock
-from ldap3.core.exceptions import LDAPOperationResult
+from ldap3.core.exceptions import LDAPOperationResult, LDAPSocketReceiveError
 from ldap3.core.results import RESULT_SIZE_LIMIT_EXCEEDED
 import mock
 import ldap3
@@ -21,8 +21,12 @@ import uuid
 import pytest
 import json
 import ssl
+import os
+import shutil
+import tempfile
 from privacyidea.lib.resolvers.LDAPIdResolver import IdResolver as LDAPResolver, LockingServerPool
 from privacyidea.lib.resolvers.SQLIdResolver import IdResolver as SQLResolver
+from privacyidea.lib.resolvers.PasswdIdResolver import IdResolver as PasswdResolver
 from privacyidea.lib.resolvers.SCIMIdResolver import IdResolver as SCIMResolver
 from privacyidea.lib.resolvers.UserIdResolver import UserIdResolver
 from privacyidea.lib.resolvers.LDAPIdResolver import (SERVERPOOL_ROUNDS, SERVERPOOL_SKIP)
@@ -33,8 +37,12 @@ from privacyidea.lib.resolver import (save_resolver,
                                       get_resolver_config,
                                       get_resolver_list,
                                       get_resolver_object, pretestresolver,
+                                      get_resolver_pool,
                                       CENSORED)
 from privacyidea.lib.realm import (set_realm, delete_realm)
+from privacyidea.lib.pooling import get_table_registry
+from privacyidea.lib.framework import get_request_local_store
+from privacyidea.lib.lifecycle import call_finalizers
 from privacyidea.models import ResolverConfig
 from privacyidea.lib.utils import to_bytes, to_unicode
 from requests import HTTPError
@@ -207,6 +215,18 @@ class SQLResolverTestCase(MyTestCase):
         username = y.getUsername(user_id)
         self.assertEqual(username, "cornelius", username)
 
+        # look up several usernames at once
+        usernames = y.getUsernames([user_id, y.getUserId("fred"), "999"])
+        self.assertEqual({user_id: "cornelius", y.getUserId("fred"): "fred"}, usernames)
+        # the userids are looked up in chunks
+        all_userids = [u.get("userid") for u in y.getUserList()]
+        with mock.patch("privacyidea.lib.resolvers.SQLIdResolver.USERNAMES_CHUNK_SIZE", 2):
+            with mock.patch.object(y.session, "execute", wraps=y.session.execute) as mock_execute:
+                usernames = y.getUsernames(all_userids)
+        self.assertEqual((len(all_userids) + 1) // 2, mock_execute.call_count)
+        self.assertEqual(len(all_userids), len(usernames))
+        self.assertEqual("cornelius", usernames[user_id])
+
     def test_01a_where_tests(self):
         y = SQLResolver()
         d = self.parameters.copy()
@@ -228,6 +248,8 @@ class SQLResolverTestCase(MyTestCase):
         y.loadConfig(d)
         userlist = y.getUserList()
         self.assertEqual(len(userlist), self.num_users - 2)
+        # the where clause is also used for a list of users
+        self.assertEqual({"3": "cornelius"}, y.getUsernames(["1", "3"]))
 
         y = SQLResolver()
         d = self.parameters.copy()
@@ -560,6 +582,44 @@ class SQLResolverTestCase(MyTestCase):
         user_info = y.getUserInfo(user)
         self.assertEqual(user_info.get("userid"), "cornelius")
 
+    def test_09_reflected_table(self):
+        y1 = SQLResolver()
+        y1.loadConfig(self.parameters)
+        # The reflected table is reused
+        y2 = SQLResolver()
+        y2.loadConfig(self.parameters)
+        self.assertIs(y1.TABLE, y2.TABLE)
+        # If the configuration changes, the table is reflected again
+        y3 = SQLResolver()
+        param2 = self.parameters.copy()
+        param2["Where"] = "1 = 1"
+        y3.loadConfig(param2)
+        self.assertIsNot(y1.TABLE, y3.TABLE)
+        self.assertEqual(y1.getUserId("cornelius"), y3.getUserId("cornelius"))
+        # Both configurations keep their table
+        y4 = SQLResolver()
+        y4.loadConfig(self.parameters)
+        self.assertIs(y1.TABLE, y4.TABLE)
+        y5 = SQLResolver()
+        y5.loadConfig(param2)
+        self.assertIs(y3.TABLE, y5.TABLE)
+
+        # Changing or deleting a resolver removes the previous table from the registry
+        registry = get_table_registry()
+        params = self.parameters.copy()
+        params.update({"resolver": "reflected", "type": "sqlresolver"})
+        save_resolver(params)
+        table_key = SQLResolver._get_table_key(get_resolver_config("reflected"))
+        self.assertIs(get_resolver_object("reflected").TABLE, registry._tables[table_key])
+        params["Where"] = "1 = 1"
+        save_resolver(params)
+        self.assertNotIn(table_key, registry._tables)
+        table_key = SQLResolver._get_table_key(get_resolver_config("reflected"))
+        get_resolver_object("reflected")
+        self.assertIn(table_key, registry._tables)
+        delete_resolver("reflected")
+        self.assertNotIn(table_key, registry._tables)
+
     def test_99_testconnection_fail(self):
         y = SQLResolver()
         self.parameters['Database'] = "does_not_exist"
@@ -2221,6 +2281,109 @@ class LDAPResolverTestCase(MyTestCase):
             pool.get_current_server(None)
             mock_method.assert_called_once()
 
+    @ldap3mock.activate
+    def test_37_resolver_pool(self):
+        ldap3mock.setLDAPDirectory(LDAPDirectory)
+        params = {'LDAPURI': 'ldap://localhost',
+                  'LDAPBASE': 'o=test',
+                  'BINDDN': 'cn=manager,ou=example,o=test',
+                  'BINDPW': 'ldaptest',
+                  'LOGINNAMEATTRIBUTE': 'cn',
+                  'LDAPSEARCHFILTER': '(cn=*)',
+                  'USERINFO': '{ "username": "cn", "email" : "mail"}',
+                  'UIDTYPE': 'DN',
+                  'CACHE_TIMEOUT': 0,
+                  'resolver': 'pooled',
+                  'type': 'ldapresolver'}
+        save_resolver(params)
+        with mock.patch.dict(self.app.config, {"PI_RESOLVER_POOL_SIZE": 2}):
+            try:
+                pool = get_resolver_pool()
+                get_request_local_store().pop("resolver_objects", None)
+                y1 = get_resolver_object("pooled")
+                self.assertEqual('cn=bob,ou=example,o=test', y1.getUserId("bob"))
+                self.assertTrue(y1.i_am_bound)
+                # At the end of the request, the object is returned to the pool
+                call_finalizers()
+                get_request_local_store().pop("resolver_objects")
+                y2 = get_resolver_object("pooled")
+                self.assertIs(y1, y2)
+                # The connection is still bound
+                self.assertTrue(y2.i_am_bound)
+                call_finalizers()
+                get_request_local_store().pop("resolver_objects")
+
+                # An unhealthy object is not used
+                y2.l.unbind()
+                y3 = get_resolver_object("pooled")
+                self.assertIsNot(y2, y3)
+                call_finalizers()
+                get_request_local_store().pop("resolver_objects")
+
+                # A changed configuration invalidates the pooled objects
+                params["LDAPSEARCHFILTER"] = '(cn=b*)'
+                save_resolver(params)
+                y4 = get_resolver_object("pooled")
+                self.assertIsNot(y3, y4)
+                self.assertEqual('(cn=b*)', y4.searchfilter)
+                self.assertEqual('cn=bob,ou=example,o=test', y4.getUserId("bob"))
+                call_finalizers()
+                get_request_local_store().pop("resolver_objects")
+
+                # idle objects expire
+                pool.idle_timeout = -1
+                y5 = get_resolver_object("pooled")
+                self.assertIsNot(y4, y5)
+                self.assertTrue(y4.l.closed)
+                call_finalizers()
+            finally:
+                get_request_local_store().pop("resolver_objects", None)
+                self.app.config["_app_local_store"].pop("resolver_pool", None)
+                delete_resolver("pooled")
+
+    @ldap3mock.activate
+    def test_38_resolver_pool_closed_connection(self):
+        ldap3mock.setLDAPDirectory(LDAPDirectory)
+        params = {'LDAPURI': 'ldap://localhost',
+                  'LDAPBASE': 'o=test',
+                  'BINDDN': 'cn=manager,ou=example,o=test',
+                  'BINDPW': 'ldaptest',
+                  'LOGINNAMEATTRIBUTE': 'cn',
+                  'LDAPSEARCHFILTER': '(cn=*)',
+                  'USERINFO': '{ "username": "cn", "email" : "mail"}',
+                  'UIDTYPE': 'DN',
+                  'CACHE_TIMEOUT': 0,
+                  'resolver': 'pooled',
+                  'type': 'ldapresolver'}
+        save_resolver(params)
+        with mock.patch.dict(self.app.config, {"PI_RESOLVER_POOL_SIZE": 2}):
+            try:
+                get_request_local_store().pop("resolver_objects", None)
+                y1 = get_resolver_object("pooled")
+                self.assertEqual('cn=bob,ou=example,o=test', y1.getUserId("bob"))
+                call_finalizers()
+                get_request_local_store().pop("resolver_objects")
+
+                # The server has closed the connection without notice
+                closed_connection = y1.l
+                with mock.patch.object(closed_connection, "search",
+                                       side_effect=LDAPSocketReceiveError("connection closed")):
+                    y2 = get_resolver_object("pooled")
+                    self.assertIs(y1, y2)
+                    # The first operation is retried with a new connection
+                    self.assertEqual('bob', y2.getUserInfo('cn=bob,ou=example,o=test').get("username"))
+                    self.assertIsNot(closed_connection, y2.l)
+                    self.assertTrue(closed_connection.closed)
+                # Only the first operation is retried
+                with mock.patch.object(y2.l, "search", side_effect=LDAPSocketReceiveError("connection closed")):
+                    self.assertRaises(LDAPSocketReceiveError, y2.getUserInfo, 'cn=bob,ou=example,o=test')
+                call_finalizers()
+            finally:
+                get_request_local_store().pop("resolver_objects", None)
+                self.app.config["_app_local_store"].pop("resolver_pool", None)
+                delete_resolver("pooled")
+
+
 class BaseResolverTestCase(MyTestCase):
 
     def test_00_basefunctions(self):
@@ -2568,6 +2731,47 @@ class ResolverTestCase(MyTestCase):
         delete_realm("myrealm")
         delete_resolver(self.resolvername1)
 
+    def test_16_passwdresolver_file_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        pwfile = os.path.join(tmpdir, "passwords")
+        shutil.copyfile(PWFILE, pwfile)
+        try:
+            y1 = PasswdResolver()
+            y1.loadConfig({"fileName": pwfile})
+            y2 = PasswdResolver()
+            y2.loadConfig({"fileName": pwfile})
+            # Both resolvers share the parsed file
+            self.assertIs(y1.passwd_file, y2.passwd_file)
+            self.assertEqual(y1.getUsername("1000"), "cornelius")
+
+            # search for usernames using the username index
+            self.assertEqual(y1.passwd_file.find_usernames("Corn*"), ["1000"])
+            self.assertEqual(y1.passwd_file.find_usernames("cornelius"), ["1000"])
+            self.assertEqual(y1.passwd_file.find_usernames("corn"), [])
+            self.assertIsNone(y1.passwd_file.find_usernames("*lius"))
+            r = y1.getUserList({"username": "corn*"})
+            self.assertEqual([u.get("userid") for u in r], ["1000"])
+            r = y1.getUserList({"username": "corn*", "userid": ">1000"})
+            self.assertEqual(r, [])
+            self.assertEqual(len(y1.getUserList({"username": "*"})),
+                             len(y1.getUserList()))
+
+            self.assertEqual(y1.getUsernames(["1000", "1116", "9999"]),
+                             {"1000": "cornelius", "1116": "nönäscii"})
+
+            # Changing the file causes the file to be read again
+            with open(pwfile, "a") as f:
+                f.write("newuser:x:4711:4711:New User,,,,:/home/newuser:/bin/bash\n")
+            y3 = PasswdResolver()
+            y3.loadConfig({"fileName": pwfile})
+            self.assertIsNot(y1.passwd_file, y3.passwd_file)
+            self.assertEqual(y3.getUserId("newuser"), "4711")
+            self.assertEqual(y3.getUserInfo("4711").get("surname"), "User")
+            # The old resolver object still uses the old data
+            self.assertEqual(y1.getUserId("newuser"), "")
+        finally:
+            shutil.rmtree(tmpdir)
+
 
 class HTTPResolverTestCase(MyTestCase):
 
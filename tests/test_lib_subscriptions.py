@@ -9,10 +9,13 @@ from privacyidea.lib.subscriptions import (save_subscription,
                                            raise_exception_probability,
                                            check_subscription,
                                            SubscriptionError,
-                                           subscription_status)
+                                           subscription_status,
+                                           get_subscription_cache,
+                                           get_users_with_active_tokens)
 from privacyidea.lib.token import init_token
 from privacyidea.lib.user import User
 import mock
+import time
 
 # 100 users
 SUBSCRIPTION1 = {'by_address': 'provider-address', 'for_email': 'customer@example.com', 'num_tokens': 100, 'num_users': 100, 'level': 'Gold', 'for_comment': 'comment', 'date_from': '2016-10-24', 'for_address': 'customer-address', 'signature': '24287419543134291932335914280232067571967865893672677932354574121521748844689122490399903572722627692437421759860332653860825381771420923865100775095168810778157750122430333094307912014590689769228979527735405954705615614505247995506136338010930079794077541100403759754392432809967862978004604278914337052409517895998984832947211907032852653171723886377329563223486623362230032551555536271158219094006763746441282022250783412321241299993657761512776112262708235357995055119379697774465205945934356687189514600830870353192115780195534680601265109038104466390286558785622582056183085321696667197925775161589029048460315', 'for_phone': '12345', 'by_email': 'provider@example.com', 'date_till': '2026-10-22', 'by_name': 'NetKnights GmbH', 'application': 'demo_application', 'by_url': 'http://provider', 'for_name': 'customer', 'by_phone': '12345', 'for_url': 'http://customer', 'num_clients': 100}
@@ -142,3 +145,38 @@ class SubscriptionApplicationTestCase(MyTestCase):
         res = subscription_status()
         # Token count < 50
         self.assertEqual(0, res)
+
+    def test_05_subscription_cache(self):
+        self.setUp_user_realms()
+        save_subscription(SUBSCRIPTION1)
+        # The cache is disabled by default
+        self.assertIsNone(get_subscription_cache())
+        with mock.patch.dict(self.app.config, {"PI_SUBSCRIPTION_REFRESH_INTERVAL": 3600}):
+            cache = get_subscription_cache()
+            self.assertIs(cache, get_subscription_cache())
+            token_users = get_users_with_active_tokens()
+            self.assertEqual(cache.get_users_with_active_tokens(), token_users)
+            with mock.patch("privacyidea.lib.subscriptions.check_signature",
+                            return_value=True) as mock_check:
+                self.assertTrue(check_subscription("demo_application"))
+                self.assertTrue(check_subscription("demo_application"))
+                # The signature is only verified once
+                mock_check.assert_called_once()
+
+            # A new user with a token is not counted yet
+            init_token({"type": "spass"}, user=User("usernotoken", self.realm1))
+            self.assertEqual(get_users_with_active_tokens(), token_users + 1)
+            self.assertEqual(cache.get_users_with_active_tokens(), token_users)
+            # After the refresh interval the old number is returned, while
+            # the users are counted in the background
+            cache._timestamp = 0
+            self.assertEqual(cache.get_users_with_active_tokens(), token_users)
+            for _i in range(100):
+                if not cache._refreshing:
+                    break
+                time.sleep(0.1)
+            self.assertEqual(cache.get_users_with_active_tokens(), token_users + 1)
+
+            # A changed interval creates a new cache
+            with mock.patch.dict(self.app.config, {"PI_SUBSCRIPTION_REFRESH_INTERVAL": 60}):
+                self.assertIsNot(cache, get_subscription_cache())
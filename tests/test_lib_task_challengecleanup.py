@@ -0,0 +1,40 @@
+"""
+This tests the files
+  lib/task/challengecleanup.py
+"""
+from .base import MyTestCase
+from privacyidea.lib.error import ParameterError
+from privacyidea.lib.monitoringstats import get_values, delete_stats
+from privacyidea.lib.task.challengecleanup import ChallengeCleanupTask
+from privacyidea.models import Challenge, db
+from flask import current_app
+
+
+class TaskChallengeCleanupTestCase(MyTestCase):
+
+    def test_01_delete_expired_challenges(self):
+        for i in range(5):
+            Challenge("CLEAN1", transaction_id="expired{0:d}".format(i), validitytime=-10).save()
+        Challenge("CLEAN1", transaction_id="valid", validitytime=120).save()
+
+        task = ChallengeCleanupTask(current_app.config)
+        self.assertIn("chunksize", task.options)
+        self.assertIn("write_stats", task.options)
+        self.assertTrue(task.do({"chunksize": "2"}))
+        self.assertEqual(["valid"], [c.transaction_id for c in Challenge.query.all()])
+        # no statistics were written
+        self.assertEqual([], get_values("challenges_total"))
+
+        Challenge("CLEAN1", transaction_id="expired", validitytime=-10).save()
+        self.assertTrue(task.do({"write_stats": "True"}))
+        self.assertEqual(1, get_values("challenges_deleted")[0][1])
+        self.assertEqual(1, get_values("challenges_total")[0][1])
+
+        # invalid chunk sizes
+        self.assertRaises(ParameterError, task.do, {"chunksize": "many"})
+        self.assertRaises(ParameterError, task.do, {"chunksize": "0"})
+
+        delete_stats("challenges_deleted")
+        delete_stats("challenges_total")
+        Challenge.query.delete()
+        db.session.commit()
@@ -22,12 +22,13 @@ from privacyidea.lib.tokenclass import (TokenClass, TOKENKIND,
                                         FAILCOUNTER_CLEAR_TIMEOUT)
 from privacyidea.lib.token import weigh_token_type
 from privacyidea.lib.tokens.totptoken import TotpTokenClass
-from privacyidea.models import (db, Token, Challenge, TokenRealm)
+from privacyidea.models import (db, Token, Challenge, TokenRealm, TokenOwner)
 from privacyidea.lib.config import (set_privacyidea_config, get_token_types,
                                     delete_privacyidea_config, SYSCONF)
 from privacyidea.lib.policy import (set_policy, SCOPE, ACTION, PolicyClass,
                                     delete_policy)
 from privacyidea.lib.utils import b32encode_and_unicode, hexlify_and_unicode
+from privacyidea.lib.crypto import encrypt, encrypt_many
 from privacyidea.lib.error import PolicyError
 import datetime
 from dateutil import parser
@@ -35,6 +36,7 @@ import hashlib
 import binascii
 import warnings
 import mock
+from sqlalchemy import event
 from privacyidea.lib.token import (create_tokenclass_object,
                                    get_tokens, list_tokengroups,
                                    get_token_type, check_serial,
@@ -62,9 +64,10 @@ from privacyidea.lib.token import (create_tokenclass_object,
                                    get_tokens_paginate,
                                    set_validity_period_end,
                                    set_validity_period_start, delete_tokeninfo,
-                                   import_token, get_one_token,
+                                   import_token, import_tokens, get_one_token,
                                    get_tokens_from_serial_or_user,
                                    get_tokens_paginated_generator,
+                                   convert_token_objects_to_dicts,
                                    assign_tokengroup, unassign_tokengroup)
 from privacyidea.lib.tokengroup import set_tokengroup, delete_tokengroup
 from privacyidea.lib.error import (TokenAdminError, ParameterError,
@@ -1617,6 +1620,21 @@ class TokenTestCase(MyTestCase):
         lists6 = list(get_tokens_paginated_generator(serial_wildcard="*DOESNOTEXIST*"))
         self.assertEqual(lists6, [])
 
+        # filter for the existence of a tokeninfo key in the database
+        all_matching_tokens[1].add_tokeninfo("janitor", "1")
+        all_matching_tokens[4].add_tokeninfo("janitor", "2")
+        lists7 = list(get_tokens_paginated_generator(serial_wildcard="S*", psize=1,
+                                                     has_tokeninfo_key="janitor"))
+        self.assertEqual(sorted([all_matching_tokens[1].token.id, all_matching_tokens[4].token.id]),
+                         flatten_tokens(lists7))
+        self.assertEqual({"1", "2"}, set(t.get_tokeninfo("janitor") for l in lists7 for t in l))
+        lists8 = list(get_tokens_paginated_generator(serial_wildcard="S*",
+                                                     has_not_tokeninfo_key="janitor"))
+        self.assertEqual(4, len(flatten_tokens(lists8)))
+        self.assertNotIn(all_matching_tokens[1].token.id, flatten_tokens(lists8))
+        for token in all_matching_tokens:
+            token.del_tokeninfo("janitor")
+
     def test_56_get_tokens_paginated_generator_removal(self):
         all_serials = set(t.token.serial for t in get_tokens(serial_wildcard="S*"))
         # Test proper behavior if a matching token is deleted while paginating
@@ -1674,6 +1692,30 @@ class TokenTestCase(MyTestCase):
         self.assertTrue(weigh_token_type(dummy_token("push")) > weigh_token_type(dummy_token("HOTP")))
         self.assertTrue(weigh_token_type(dummy_token("PUSH")) > weigh_token_type(dummy_token("hotp")))
 
+    def test_60_import_tokens(self):
+        tokens = {"IMP003": {"type": "hotp", "otpkey": self.otpkey},
+                  "IMP004": {"type": "totp", "otpkey": self.otpkey, "timeStep": "60"},
+                  "IMP005": {"type": "hotp", "otpkey": "31323334"}}
+        with mock.patch("privacyidea.lib.crypto.encrypt_many", wraps=encrypt_many) as mock_many, \
+                mock.patch("privacyidea.lib.crypto.encrypt", wraps=encrypt) as mock_encrypt:
+            toks = import_tokens(tokens, tokenrealms=[self.realm1])
+        # The keys of all tokens are encrypted at once
+        mock_many.assert_called_once()
+        # The three keys and the empty keys of the new tokens
+        self.assertEqual(6, len(mock_many.call_args[0][0]))
+        mock_encrypt.assert_not_called()
+        self.assertEqual(["IMP003", "IMP004", "IMP005"], [tok.token.serial for tok in toks])
+        self.assertEqual(self.otpkey, toks[0].token.get_otpkey().getKey().decode())
+        self.assertEqual("31323334", toks[2].token.get_otpkey().getKey().decode())
+        self.assertEqual(0, toks[0].check_otp("755224"))
+        self.assertEqual("60", toks[1].get_tokeninfo("timeStep"))
+        self.assertEqual([self.realm1], toks[1].get_realms())
+        # Outside of the import the keys are encrypted one by one
+        toks[2].token.set_otpkey(self.otpkey)
+        self.assertEqual(self.otpkey, toks[2].token.get_otpkey().getKey().decode())
+        for serial in tokens:
+            remove_token(serial)
+
 
 class TokenOutOfBandTestCase(MyTestCase):
 
@@ -2514,3 +2556,106 @@ class TestMultipleUserToken(MyTestCase):
         delete_policy("force_chalresp")
         remove_token("s1")
         remove_token("s2")
+
+
+class TokenListTestCase(MyTestCase):
+
+    def _count_queries(self, func, *args, **kwargs):
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        db.session.expire_all()
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+        return len(statements), result
+
+    def test_01_convert_token_objects_to_dicts(self):
+        self.setUp_user_realms()
+        set_tokengroup("group1")
+        container_serial = init_container({"type": "generic"})
+        for i, login in enumerate(["cornelius", "usernotoken", "nönäscii", "cornelius"] * 5):
+            token = init_token({"type": "hotp", "otpkey": OTPKEY, "serial": "list{0:02d}".format(i)},
+                               user=User(login, self.realm1))
+            token.add_tokeninfo("key", "value{0:d}".format(i))
+            token.set_tokengroups(["group1"])
+            if i % 2:
+                add_token_to_container(container_serial, token.get_serial(), user_role="admin")
+        init_token({"type": "hotp", "otpkey": OTPKEY, "serial": "list99"})
+        # warm up the resolver objects and the config
+        convert_token_objects_to_dicts(get_tokens(serial_wildcard="list*"), User(), user_role="admin")
+
+        queries5, token_dicts = self._count_queries(
+            lambda: convert_token_objects_to_dicts(get_tokens(serial_wildcard="list0*"),
+                                                   User(), user_role="admin"))
+        self.assertEqual(10, len(token_dicts))
+        queries21, token_dicts = self._count_queries(
+            lambda: convert_token_objects_to_dicts(get_tokens(serial_wildcard="list*"),
+                                                   User(), user_role="admin"))
+        self.assertEqual(21, len(token_dicts))
+        # The number of queries does not depend on the number of tokens
+        self.assertEqual(queries5, queries21)
+
+        token_dicts = {d["serial"]: d for d in token_dicts}
+        list02 = token_dicts["list02"]
+        self.assertEqual("nönäscii", list02["username"])
+        self.assertEqual(self.realm1, list02["user_realm"])
+        self.assertEqual(self.resolvername1, list02["resolver"])
+        self.assertEqual("1116", list02["user_id"])
+        self.assertFalse(list02["user_editable"])
+        self.assertEqual([self.realm1], list02["realms"])
+        self.assertEqual(["group1"], list02["tokengroup"])
+        self.assertEqual("value2", list02["info"]["key"])
+        self.assertEqual("", list02["container_serial"])
+        self.assertEqual(container_serial, token_dicts["list03"]["container_serial"])
+        self.assertEqual("cornelius", token_dicts["list03"]["username"])
+        self.assertEqual("", token_dicts["list99"]["username"])
+        self.assertEqual("", token_dicts["list99"]["user_realm"])
+        self.assertNotIn("user_editable", token_dicts["list99"])
+        # The owners of the tokens are not kept after the conversion
+        token = get_one_token(serial="list02")
+        self.assertIsNone(token.token.prefetched_owners)
+        self.assertEqual("nönäscii", token.user.login)
+
+        # A user only sees the details of their own tokens
+        token_dicts = convert_token_objects_to_dicts(get_tokens(serial_wildcard="list*"),
+                                                     User("cornelius", self.realm1))
+        self.assertEqual(10, len([d for d in token_dicts if "username" in d]))
+        self.assertEqual(11, len([d for d in token_dicts if list(d) == ["serial"]]))
+
+        # The paginated token list uses the same bulk loading
+        tokens = get_tokens_paginate(serial="list*", psize=25)
+        self.assertEqual(21, len(tokens["tokens"]))
+        self.assertEqual("nönäscii", tokens["tokens"][2]["username"])
+
+        # If the users can not be resolved at once, they are resolved per token
+        with mock.patch("privacyidea.lib.token.get_usernames", side_effect=Exception("unreachable")):
+            token_dicts = convert_token_objects_to_dicts(get_tokens(serial_wildcard="list*"),
+                                                         User(), user_role="admin")
+            self.assertEqual("nönäscii", {d["serial"]: d for d in token_dicts}["list02"]["username"])
+            # A failing resolver does not break the token list
+            with mock.patch("privacyidea.lib.tokenclass.get_username", side_effect=Exception("unreachable")):
+                token_dicts = convert_token_objects_to_dicts(get_tokens(serial_wildcard="list*"),
+                                                             User(), user_role="admin")
+        token_dicts = {d["serial"]: d for d in token_dicts}
+        self.assertEqual("**resolver error**", token_dicts["list02"]["username"])
+        self.assertEqual("", token_dicts["list02"]["user_realm"])
+        self.assertEqual("", token_dicts["list99"]["username"])
+
+        # The owner of an orphaned token is resolved per token like in a single token listing
+        TokenOwner.query.filter_by(token_id=get_one_token(serial="list01").token.id).update({"user_id": "99999"})
+        db.session.commit()
+        token_dicts = {d["serial"]: d for d in convert_token_objects_to_dicts(
+            get_tokens(serial_wildcard="list*"), User(), user_role="admin")}
+        self.assertEqual("**resolver error**", token_dicts["list01"]["username"])
+        self.assertEqual("", token_dicts["list01"]["user_realm"])
+        self.assertNotIn("user_editable", token_dicts["list01"])
+        self.assertEqual("cornelius", token_dicts["list00"]["username"])
+
+        for token in get_tokens(serial_wildcard="list*"):
+            token.delete_token()
+        delete_tokengroup("group1")
@@ -854,3 +854,26 @@ class HOTPTokenTestCase(MyTestCase):
             _detail = token.get_init_detail(user=User("cornelius",
                                                       self.realm1), params=params)
             mock_log.assert_any_call("Unknown Tag 'real' in one of your policy definition")
+
+    def test_32_otp_window(self):
+        from privacyidea.lib.tokens.HMAC import HmacOtp
+        db_token = Token("WINDOW001", tokentype="hotp")
+        db_token.set_otpkey(self.otpkey)
+        db_token.save()
+        for hashfunc, digits in [(hashlib.sha1, 6), (hashlib.sha1, 8), (hashlib.sha256, 6)]:
+            hmac_otp = HmacOtp(db_token.get_otpkey(), digits=digits, hashfunc=hashfunc)
+            expected = [hmac_otp.generate(c, inc_counter=False) for c in range(0, 50)]
+            self.assertEqual(expected, list(hmac_otp.generate_window(0, 50)))
+            key = binascii.unhexlify(self.otpkey)
+            self.assertEqual(expected, list(hmac_otp.generate_window(0, 50, key=key)))
+            self.assertEqual(37, hmac_otp.checkOtp(expected[37], 50))
+            self.assertEqual(38, hmac_otp.counter)
+            hmac_otp.counter = 10
+            self.assertEqual(-1, hmac_otp.checkOtp(expected[5], 20))
+            hmac_otp.counter = 10
+            self.assertEqual(5, hmac_otp.checkOtp(expected[5], 20, symetric=True))
+        # RFC 4226 test values
+        hmac_otp = HmacOtp(db_token.get_otpkey())
+        self.assertEqual(["755224", "287082", "359152", "969429"],
+                         list(hmac_otp.generate_window(0, 4)))
+        db_token.delete()
@@ -16,7 +16,7 @@ from privacyidea.lib.tokens.pushtoken import (PushTokenClass, PUSH_ACTION,
 from privacyidea.lib.tokenclass import CHALLENGE_SESSION
 from privacyidea.lib.smsprovider.FirebaseProvider import FIREBASE_CONFIG
 from privacyidea.lib.token import get_tokens, remove_token, init_token
-from privacyidea.lib.challenge import get_challenges
+from privacyidea.lib.challenge import get_challenges, get_challenge_notifier, notify_challenge_answer
 from privacyidea.lib.crypto import geturandom
 from privacyidea.models import Token, Challenge
 from privacyidea.lib.policy import (SCOPE, set_policy, delete_policy, ACTION,
@@ -1344,6 +1344,41 @@ class PushTokenTestCase(MyTestCase):
                                    PushTokenClass._check_timestamp_in_range,
                                    timestamp.isoformat(), 8)
 
+    def test_08_push_wait_notification(self):
+        tokenobj = self._create_push_token()
+        tokenobj.set_pin("pushpin")
+        serial = tokenobj.get_serial()
+        transaction_id = "01234567890123456789"
+
+        def create_challenge(options=None):
+            Challenge(serial, transaction_id=transaction_id, challenge="nonce",
+                      validitytime=120).save()
+            return True, "", transaction_id, {}
+
+        def answer_challenge():
+            with self.app.test_request_context():
+                for chal in get_challenges(transaction_id=transaction_id):
+                    chal.set_otp_status(True)
+                    chal.save()
+                notify_challenge_answer(transaction_id)
+
+        notifier = get_challenge_notifier()
+        poll_interval = notifier.poll_interval
+        # Do not read the challenge table periodically, so only the notification
+        # ends the waiting
+        notifier.poll_interval = 0
+        try:
+            with mock.patch.object(tokenobj, "create_challenge", side_effect=create_challenge):
+                Timer(1, answer_challenge).start()
+                starttime = time.time()
+                r = tokenobj.authenticate("pushpin", options={PUSH_ACTION.WAIT: 20})
+                self.assertTrue(r[0])
+                self.assertEqual(r[1], 1)
+                self.assertLess(time.time() - starttime, 10)
+        finally:
+            notifier.poll_interval = poll_interval
+        remove_token(serial)
+
     def test_10_api_endpoint(self):
         # first check for unused request methods
         g = FakeFlaskG()